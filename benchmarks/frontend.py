@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+
+"""Benchmarks of the audio front-end and of the VAD annotators.
+
+Measures the real-time factor (processing time divided by the duration of the
+signal) and the peak memory allocated by each stage, on synthetic signals, and
+writes the results as JSON::
+
+    python benchmarks/frontend.py -o results.json
+
+Two result files (e.g. of two commits) are compared with::
+
+    python benchmarks/frontend.py --compare before.json results.json
+
+The peak memory is measured with :py:mod:`tracemalloc`, which sees the NumPy
+allocations but not the ones made inside torch. The time of the ``read`` stages
+on the shortest signals shows the overhead of decoding a file.
+"""
+
+import json
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+
+from pathlib import Path
+
+import click
+import numpy
+import soundfile
+
+import bob.bio.spear
+
+from bob.bio.spear import audio_processing as ap
+
+DURATIONS = (3, 30, 600)
+RATES = (8000, 16000)
+
+
+def synthetic_signal(duration, rate, seed=0):
+    """Returns a speech-like signal in int16 range.
+
+    Bursts of harmonic sounds modulated around 4 Hz alternate with silences
+    of low noise, so the VAD annotators find both speech and non-speech.
+    """
+    rng = numpy.random.default_rng(seed)
+    n_samples = int(duration * rate)
+    t = numpy.arange(n_samples) / rate
+    f0 = 120 + 30 * numpy.sin(2 * numpy.pi * 0.5 * t)
+    phase = 2 * numpy.pi * numpy.cumsum(f0) / rate
+    voiced = sum(numpy.sin(k * phase) / k for k in range(1, 10))
+    envelope = 0.5 * (1 + numpy.sin(2 * numpy.pi * 4 * t))
+    # 1.5 s of speech every 2 s
+    envelope *= (t % 2.0) < 1.5
+    signal = 8000 * envelope * voiced + 30 * rng.standard_normal(n_samples)
+    return numpy.clip(signal, -32768, 32767).astype(numpy.float32)
+
+
+class Stages:
+    """The benchmarked stages on a signal of a given rate.
+
+    Each stage is a method taking the signal and returning a callable that runs
+    the stage once (the setup is not measured).
+    """
+
+    def __init__(self, rate, tmp_dir):
+        self.rate = rate
+        self.tmp_dir = Path(tmp_dir)
+
+    def read(self, signal):
+        path = self.tmp_dir / f"signal_{self.rate}_{len(signal)}.wav"
+        soundfile.write(path, signal.astype(numpy.int16), self.rate)
+        return lambda: ap.read(path)
+
+    def read_torchaudio(self, signal):
+        path = self.tmp_dir / f"signal_{self.rate}_{len(signal)}.wav"
+        soundfile.write(path, signal.astype(numpy.int16), self.rate)
+        return lambda: ap.read(path, backend="torchaudio")
+
+    def resample(self, signal):
+        target = 16000 if self.rate == 8000 else 8000
+        return lambda: ap.resample(signal, self.rate, target)
+
+    def energy(self, signal):
+        return lambda: ap.energy(signal, self.rate)
+
+    def spectrogram(self, signal):
+        return lambda: ap.spectrogram(signal, self.rate)
+
+    def cepstral(self, signal):
+        return lambda: ap.cepstral(signal, self.rate)
+
+    def Energy_Thr(self, signal):
+        annotator = bob.bio.spear.annotator.Energy_Thr()
+        return lambda: annotator.transform_one(signal, self.rate)
+
+    def Energy_2Gauss(self, signal):
+        annotator = bob.bio.spear.annotator.Energy_2Gauss()
+        return lambda: annotator.transform_one(signal, self.rate)
+
+    def Mod_4Hz(self, signal):
+        annotator = bob.bio.spear.annotator.Mod_4Hz()
+        return lambda: annotator.transform_one(signal, self.rate)
+
+    def Cepstral(self, signal):
+        labels = bob.bio.spear.annotator.Energy_Thr().transform_one(
+            signal, self.rate
+        )
+        extractor = bob.bio.spear.extractor.Cepstral()
+        return lambda: extractor.transform_one(signal, self.rate, labels)
+
+
+STAGES = (
+    "read",
+    "read_torchaudio",
+    "resample",
+    "energy",
+    "spectrogram",
+    "cepstral",
+    "Energy_Thr",
+    "Energy_2Gauss",
+    "Mod_4Hz",
+    "Cepstral",
+)
+
+
+def measure(function, repeat):
+    """Returns the run times of ``function`` and its peak memory in bytes."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    try:
+        function()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return times, peak
+
+
+def environment():
+    """Describes the code and machine the benchmarks ran on."""
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def run(stages, durations, rates, repeat):
+    """Runs the benchmarks and returns the results."""
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rate in rates:
+            benchmarks = Stages(rate, tmp_dir)
+            for duration in durations:
+                signal = synthetic_signal(duration, rate)
+                for stage in stages:
+                    function = getattr(benchmarks, stage)(signal)
+                    function()  # warm-up (caches, JIT compilation)
+                    times, peak = measure(function, repeat)
+                    result = {
+                        "stage": stage,
+                        "rate": rate,
+                        "duration": duration,
+                        "times": times,
+                        "rtf": min(times) / duration,
+                        "peak_memory": peak,
+                    }
+                    click.echo(
+                        f"{stage:>15} {rate:>6} Hz {duration:>5} s: "
+                        f"RTF {result['rtf']:.5f}, "
+                        f"{min(times) * 1000:.2f} ms/run, "
+                        f"peak {peak / 2**20:.1f} MiB"
+                    )
+                    results.append(result)
+    return results
+
+
+def compare(baseline, results):
+    """Prints the ratios of the RTF and peak memory of two result files."""
+    reference = {
+        (r["stage"], r["rate"], r["duration"]): r for r in baseline["results"]
+    }
+    click.echo(
+        f"baseline {baseline['environment']['commit']}, "
+        f"new {results['environment']['commit']}"
+    )
+    for result in results["results"]:
+        key = (result["stage"], result["rate"], result["duration"])
+        if key not in reference:
+            continue
+        old = reference[key]
+        click.echo(
+            f"{key[0]:>15} {key[1]:>6} Hz {key[2]:>5} s: "
+            f"RTF x{result['rtf'] / old['rtf']:.2f}, "
+            f"peak x{result['peak_memory'] / max(old['peak_memory'], 1):.2f}"
+        )
+
+
+@click.command()
+@click.option(
+    "--stage",
+    "-s",
+    "stages",
+    multiple=True,
+    type=click.Choice(STAGES),
+    help="Stage to benchmark (all by default). Can be repeated.",
+)
+@click.option(
+    "--duration",
+    "-d",
+    "durations",
+    multiple=True,
+    type=float,
+    help=f"Duration of the signals in seconds (default: {DURATIONS}).",
+)
+@click.option(
+    "--rate",
+    "-r",
+    "rates",
+    multiple=True,
+    type=int,
+    help=f"Sample rate of the signals in Hz (default: {RATES}).",
+)
+@click.option(
+    "--repeat", default=3, show_default=True, help="Runs of each stage."
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False),
+    help="JSON file to write the results to.",
+)
+@click.option(
+    "--compare",
+    "compare_files",
+    nargs=2,
+    type=click.Path(exists=True, dir_okay=False),
+    help="Compares two result files instead of running the benchmarks.",
+)
+def main(stages, durations, rates, repeat, output, compare_files):
+    """Benchmarks the audio front-end and the VAD annotators."""
+    if compare_files:
+        with open(compare_files[0]) as old, open(compare_files[1]) as new:
+            compare(json.load(old), json.load(new))
+        return
+
+    results = {
+        "environment": environment(),
+        "results": run(
+            stages or STAGES, durations or DURATIONS, rates or RATES, repeat
+        ),
+    }
+    if output is not None:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
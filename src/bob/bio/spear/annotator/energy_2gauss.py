@@ -28,7 +28,7 @@ from bob.bio.base.annotator import Annotator
 from bob.learn.em import GMMMachine, KMeansMachine
 
 from .. import audio_processing as ap
-from .. import utils
+from .. import codec, instrumentation, utils
 
 logger = logging.getLogger(__name__)
 
@@ -44,6 +44,10 @@ class Energy_2Gauss(Annotator):
         win_length_ms=20.0,  # 20 ms
         win_shift_ms=10.0,  # 10 ms
         smoothing_window=10,  # 10 frames (i.e. 100 ms)
+        share_analysis=False,  # attach the frame energies to the labels
+        # attach the frames too (implies share_analysis); large, see VADLabels
+        share_frames=False,
+        storage_codec=None,  # e.g. "bits" to pack the checkpointed labels
         **kwargs,
     ):
         super().__init__(**kwargs)
@@ -53,6 +57,9 @@ class Energy_2Gauss(Annotator):
         self.win_length_ms = win_length_ms
         self.win_shift_ms = win_shift_ms
         self.smoothing_window = smoothing_window
+        self.share_analysis = share_analysis
+        self.share_frames = share_frames
+        self.storage_codec = storage_codec
 
     def _voice_activity_detection(self, energy_array: np.ndarray) -> np.ndarray:
         """Fits a 2 Gaussian GMM on the energy that splits between voice and silence."""
@@ -106,17 +113,29 @@ class Energy_2Gauss(Annotator):
 
         return labels
 
-    def _compute_energy(
+    def _frame_analysis(
         self, audio_signal: np.ndarray, sample_rate: int
-    ) -> np.ndarray:
-        """Retrieves the speech / non speech labels for the speech sample in ``audio_signal``"""
-
-        energy_array = ap.energy(
+    ) -> ap.FrameAnalysis:
+        """Computes the frame energies (and keeps the frames if shared)"""
+        return ap.frame_analysis(
             audio_signal,
             sample_rate,
             win_length_ms=self.win_length_ms,
             win_shift_ms=self.win_shift_ms,
+            keep_frames=self.share_frames,
         )
+
+    def _compute_energy(
+        self,
+        audio_signal: np.ndarray,
+        sample_rate: int,
+        analysis: "ap.FrameAnalysis | None" = None,
+    ) -> np.ndarray:
+        """Retrieves the speech / non speech labels for the speech sample in ``audio_signal``"""
+
+        if analysis is None:
+            analysis = self._frame_analysis(audio_signal, sample_rate)
+        energy_array = analysis.log_energy
         labels = self._voice_activity_detection(energy_array)
 
         # discard isolated speech a number of frames defined in smoothing_window
@@ -137,14 +156,21 @@ class Energy_2Gauss(Annotator):
            sample_rate: int
                The sample rate in Hertz
         """
-        labels = self._compute_energy(
-            audio_signal=audio_signal, sample_rate=sample_rate
-        )
+        with instrumentation.measure(type(self).__name__) as stage:
+            analysis = self._frame_analysis(audio_signal, sample_rate)
+            labels = self._compute_energy(
+                audio_signal=audio_signal,
+                sample_rate=sample_rate,
+                analysis=analysis,
+            )
+            stage.set_labels(labels, len(audio_signal) / sample_rate)
         if (labels == 0).all():
             logger.warning(
                 "Could not annotate: No audio was detected in the sample!"
             )
             return None
+        if self.share_analysis or self.share_frames:
+            return utils.VADLabels(labels, analysis)
         return labels.tolist()
 
     def transform(
@@ -164,4 +190,5 @@ class Energy_2Gauss(Annotator):
             "requires_fit": False,
             "bob_transform_extra_input": (("sample_rates", "rate"),),
             "bob_output": "annotations",
+            **codec.checkpoint_tags(self.storage_codec),
         }
@@ -26,7 +26,7 @@ import numpy
 from bob.bio.base.annotator import Annotator
 
 from .. import audio_processing as ap
-from .. import utils
+from .. import codec, instrumentation, utils
 
 logger = logging.getLogger(__name__)
 
@@ -40,6 +40,10 @@ class Energy_Thr(Annotator):
         win_shift_ms=10.0,  # 10 ms
         smoothing_window=10,  # 10 frames (i.e. 100 ms)
         ratio_threshold=0.15,  # 0.1 of the maximum energy
+        share_analysis=False,  # attach the frame energies to the labels
+        # attach the frames too (implies share_analysis); large, see VADLabels
+        share_frames=False,
+        storage_codec=None,  # e.g. "bits" to pack the checkpointed labels
         **kwargs
     ):
         super().__init__(**kwargs)
@@ -47,6 +51,9 @@ class Energy_Thr(Annotator):
         self.win_shift_ms = win_shift_ms
         self.smoothing_window = smoothing_window
         self.ratio_threshold = ratio_threshold
+        self.share_analysis = share_analysis
+        self.share_frames = share_frames
+        self.storage_codec = storage_codec
 
     def _voice_activity_detection(self, energy):
 
@@ -67,15 +74,22 @@ class Energy_Thr(Annotator):
                 label[i] = 0
         return label
 
-    def _compute_energy(self, data, sample_rate):
-        """retrieve the speech / non speech labels for the speech sample given by the tuple (rate, wave signal)"""
-
-        energy_array = ap.energy(
+    def _frame_analysis(self, data, sample_rate):
+        """Computes the frame energies (and keeps the frames if shared)"""
+        return ap.frame_analysis(
             data,
             sample_rate,
             win_length_ms=self.win_length_ms,
             win_shift_ms=self.win_shift_ms,
+            keep_frames=self.share_frames,
         )
+
+    def _compute_energy(self, data, sample_rate, analysis=None):
+        """retrieve the speech / non speech labels for the speech sample given by the tuple (rate, wave signal)"""
+
+        if analysis is None:
+            analysis = self._frame_analysis(data, sample_rate)
+        energy_array = analysis.log_energy
         labels = self._voice_activity_detection(energy_array)
         # discard isolated speech a number of frames defined in smoothing_window
         labels = utils.smoothing(labels, self.smoothing_window)
@@ -93,11 +107,16 @@ class Energy_Thr(Annotator):
            * input_signal[1] --> signal TODO doc
         """
 
-        labels = self._compute_energy(data, sample_rate)
+        with instrumentation.measure(type(self).__name__) as stage:
+            analysis = self._frame_analysis(data, sample_rate)
+            labels = self._compute_energy(data, sample_rate, analysis)
+            stage.set_labels(labels, len(data) / sample_rate)
         if (labels == 0).all():
             logger.warning("No Audio was detected in the sample!")
             return None
 
+        if self.share_analysis or self.share_frames:
+            return utils.VADLabels(labels, analysis)
         return labels
 
     def transform(
@@ -113,4 +132,5 @@ class Energy_Thr(Annotator):
             "requires_fit": False,
             "bob_transform_extra_input": (("sample_rates", "rate"),),
             "bob_output": "annotations",
+            **codec.checkpoint_tags(self.storage_codec),
         }
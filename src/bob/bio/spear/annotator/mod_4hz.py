@@ -27,7 +27,7 @@ import scipy.signal
 from bob.bio.base.annotator import Annotator
 
 from .. import audio_processing as ap
-from .. import utils
+from .. import codec, instrumentation, jit, utils
 
 logger = logging.getLogger(__name__)
 
@@ -48,6 +48,10 @@ class Mod_4Hz(Annotator):
         f_max=4000,  # 4 KHz
         pre_emphasis_coef=1.0,
         ratio_threshold=0.1,  # 0.1 of the maximum energy
+        share_analysis=False,  # attach the frame energies to the labels
+        # attach the frames too (implies share_analysis); large, see VADLabels
+        share_frames=False,
+        storage_codec=None,  # e.g. "bits" to pack the checkpointed labels
         **kwargs
     ):
         super().__init__(**kwargs)
@@ -62,6 +66,9 @@ class Mod_4Hz(Annotator):
         self.f_max = f_max
         self.pre_emphasis_coef = pre_emphasis_coef
         self.ratio_threshold = ratio_threshold
+        self.share_analysis = share_analysis
+        self.share_frames = share_frames
+        self.storage_codec = storage_codec
 
     def _voice_activity_detection(self, energy, mod_4hz):
 
@@ -113,6 +120,9 @@ class Mod_4Hz(Annotator):
         return labels
 
     def averaging(self, list_1s_shift):
+        if jit.use_numba("averaging") and len(list_1s_shift) > 0:
+            return jit.averaging(list_1s_shift)
+
         len_list = len(list_1s_shift)
         sample_level_value = numpy.array(numpy.zeros(len_list, dtype=float))
         sample_level_value[0] = numpy.array(list_1s_shift[0])
@@ -180,7 +190,17 @@ class Mod_4Hz(Annotator):
         ]
         return res
 
-    def mod_4hz(self, data, sample_rate):
+    def _frame_analysis(self, data, sample_rate):
+        """Computes the frame energies (and keeps the frames if shared)"""
+        return ap.frame_analysis(
+            data,
+            sample_rate,
+            win_length_ms=self.win_length_ms,
+            win_shift_ms=self.win_shift_ms,
+            keep_frames=self.share_frames,
+        )
+
+    def mod_4hz(self, data, sample_rate, analysis=None):
         """Computes and returns the 4Hz modulation energy features for the given input wave file"""
 
         energy_bands = ap.spectrogram(
@@ -199,12 +219,9 @@ class Mod_4Hz(Annotator):
         filtering_res = self.pass_band_filtering(energy_bands, sample_rate)
         mod_4hz = self.modulation_4hz(filtering_res, data, sample_rate)
         mod_4hz = self.averaging(mod_4hz)
-        energy_array = ap.energy(
-            data,
-            sample_rate,
-            win_length_ms=self.win_length_ms,
-            win_shift_ms=self.win_shift_ms,
-        )
+        if analysis is None:
+            analysis = self._frame_analysis(data, sample_rate)
+        energy_array = analysis.log_energy
         labels = self._voice_activity_detection(energy_array, mod_4hz)
         labels = utils.smoothing(
             labels, self.smoothing_window
@@ -222,11 +239,18 @@ class Mod_4Hz(Annotator):
            * input_signal[0] --> rate
            * input_signal[1] --> signal TODO doc
         """
-        [labels, energy_array, mod_4hz] = self.mod_4hz(data, sample_rate)
+        with instrumentation.measure(type(self).__name__) as stage:
+            analysis = self._frame_analysis(data, sample_rate)
+            [labels, energy_array, mod_4hz] = self.mod_4hz(
+                data, sample_rate, analysis
+            )
+            stage.set_labels(labels, len(data) / sample_rate)
         if (labels == 0).all():
             logger.warning("No Audio was detected in the sample!")
             return None
 
+        if self.share_analysis or self.share_frames:
+            return utils.VADLabels(labels, analysis)
         return labels
 
     def transform(
@@ -242,4 +266,5 @@ class Mod_4Hz(Annotator):
             "requires_fit": False,
             "bob_transform_extra_input": (("sample_rates", "rate"),),
             "bob_output": "annotations",
+            **codec.checkpoint_tags(self.storage_codec),
         }
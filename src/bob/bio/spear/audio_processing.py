@@ -5,16 +5,20 @@
 # Pavel Korshunov <Pavel.Korshunov@idiap.ch>
 # Amir Mohammadi <amir.mohammadi@idiap.ch>
 
-import importlib
+import functools
 import logging
 import math
 import sys
+import zlib
 
-from typing import Optional, Tuple, Union
+from typing import NamedTuple, Optional, Tuple, Union
 
 import numpy
+import scipy.fft
 import torch
 
+from . import jit
+
 logger = logging.getLogger(__name__)
 
 
@@ -57,6 +61,55 @@ def init_freqfilter(rate, win_size, mel_scale, n_filters, f_min, f_max):
     return p_index
 
 
+def init_filterbank_matrix(p_index, n_filters, n_bins):
+    """Returns the triangular filter bank as a weight matrix.
+
+    The triangles are defined by the cut-off indices of
+    :py:func:`init_freqfilter` exactly as in :py:func:`log_triangular_bank`, so
+    that ``spectrum @ matrix`` gives the filter bank outputs (before the log)
+    of every frame of ``spectrum`` at once.
+
+    Parameters
+    ----------
+    p_index:
+        The cut-off frequencies (as FFT bin indices) of the filters.
+    n_filters:
+        The number of filters.
+    n_bins:
+        The number of bins of the spectrum (``win_size // 2 + 1``).
+
+    Returns
+    -------
+    filterbank: numpy.ndarray
+        The weights of each filter, of shape ``(n_bins, n_filters)``.
+    """
+    filterbank = numpy.zeros((n_bins, n_filters), dtype=numpy.float64)
+
+    denominator = 1.0 / (
+        p_index[1 : n_filters + 2] - p_index[0 : n_filters + 1]
+    )
+
+    for i in range(0, n_filters):
+        li = int(math.floor(p_index[i] + 1))
+        mi = int(math.floor(p_index[i + 1]))
+        ri = int(math.floor(p_index[i + 2]))
+        if i == 0 or li == ri:
+            li -= 1
+
+        vec_left = numpy.arange(li, mi + 1)
+        vec_right = numpy.arange(mi + 1, ri + 1)
+        numpy.add.at(
+            filterbank[:, i], vec_left, denominator[i] * (vec_left - p_index[i])
+        )
+        numpy.add.at(
+            filterbank[:, i],
+            vec_right,
+            denominator[i + 1] * (p_index[i + 2] - vec_right),
+        )
+
+    return filterbank
+
+
 def init_dct_kernel(n_filters, n_ceps, dct_norm):
     dct_kernel = numpy.zeros([n_ceps, n_filters], dtype=numpy.float64)
 
@@ -81,6 +134,232 @@ def init_dct_kernel(n_filters, n_ceps, dct_norm):
     return dct_kernel
 
 
+class AnalysisKernels(NamedTuple):
+    """The precomputed kernels of a front-end configuration (read-only)."""
+
+    hamming_kernel: numpy.ndarray
+    p_index: Optional[numpy.ndarray]
+    filterbank: Optional[numpy.ndarray]
+    dct_kernel: Optional[numpy.ndarray]
+
+
+# Maximum number of configurations kept by `analysis_kernels`
+KERNEL_CACHE_SIZE = 32
+
+
+def _read_only(array):
+    if array is not None:
+        array.setflags(write=False)
+    return array
+
+
+@functools.lru_cache(maxsize=KERNEL_CACHE_SIZE)
+def _cached_analysis_kernels(
+    rate,
+    win_length,
+    win_size,
+    n_filters,
+    f_min,
+    f_max,
+    mel_scale,
+    n_ceps,
+    dct_norm,
+):
+    hamming_kernel = init_hamming_kernel(win_length)
+
+    p_index, filterbank, dct_kernel = None, None, None
+    if n_filters is not None:
+        p_index = init_freqfilter(
+            rate, win_size, mel_scale, n_filters, f_min, f_max
+        )
+        filterbank = init_filterbank_matrix(
+            p_index, n_filters, int(win_size / 2) + 1
+        )
+        if n_ceps is not None:
+            dct_kernel = init_dct_kernel(n_filters, n_ceps, dct_norm)
+
+    return AnalysisKernels(
+        _read_only(hamming_kernel),
+        _read_only(p_index),
+        _read_only(filterbank),
+        _read_only(dct_kernel),
+    )
+
+
+def analysis_kernels(
+    rate,
+    win_length,
+    win_size,
+    n_filters=None,
+    f_min=0.0,
+    f_max=4000.0,
+    mel_scale=True,
+    n_ceps=None,
+    dct_norm=True,
+) -> AnalysisKernels:
+    """Returns the Hamming, filter bank and DCT kernels of a configuration.
+
+    The kernels are computed once per configuration and kept in a bounded,
+    thread-safe LRU cache (of :py:data:`KERNEL_CACHE_SIZE` entries) shared by
+    all the front-end functions of this module, so e.g. a corpus mixing 8 kHz
+    and 16 kHz audio keeps one entry per rate. The returned arrays are
+    read-only.
+
+    Parameters
+    ----------
+    rate:
+        The sample rate in Hz.
+    win_length:
+        The length of a frame in samples.
+    win_size:
+        The size of the FFT.
+    n_filters, f_min, f_max, mel_scale:
+        The filter bank configuration (see :py:func:`init_freqfilter`). If
+        ``n_filters`` is None, no filter bank is computed.
+    n_ceps, dct_norm:
+        The DCT configuration (see :py:func:`init_dct_kernel`). If ``n_ceps`` is
+        None, no DCT kernel is computed.
+    """
+    return _cached_analysis_kernels(
+        rate,
+        win_length,
+        win_size,
+        n_filters,
+        f_min,
+        f_max,
+        mel_scale,
+        n_ceps,
+        dct_norm,
+    )
+
+
+def kernel_cache_info():
+    """Returns the hits, misses and size of the :py:func:`analysis_kernels` cache."""
+    return _cached_analysis_kernels.cache_info()
+
+
+def clear_kernel_cache():
+    """Empties the :py:func:`analysis_kernels` cache and resets its counters."""
+    _cached_analysis_kernels.cache_clear()
+
+
+class AnalysisWorkspace:
+    """Reusable buffers for the intermediate arrays of the front-end.
+
+    The front-end functions accepting a ``workspace`` argument put their
+    frames, spectra and filter outputs in its buffers instead of allocating
+    new arrays. A buffer only grows when a larger signal is processed, so a
+    worker processing many files reaches a steady memory use after the
+    longest one.
+
+    The arrays taken from a workspace are overwritten by the next call using
+    it; a workspace must not be shared between threads.
+
+    Parameters
+    ----------
+    max_frames:
+        If given, preallocates the buffers for signals of up to ``max_frames``
+        frames of ``win_size`` samples, with ``n_filters`` filters and
+        ``n_ceps`` cepstral coefficients.
+    dtype:
+        The floating point type of the preallocated buffers.
+    """
+
+    def __init__(
+        self,
+        max_frames=None,
+        win_size=512,
+        n_filters=24,
+        n_ceps=19,
+        dtype=numpy.float64,
+    ):
+        self._buffers = {}
+        if max_frames is not None:
+            for name, shape in (
+                ("frames", (max_frames, win_size)),
+                ("energy", (max_frames,)),
+                ("spectrum", (max_frames, win_size // 2 + 1)),
+                ("filters", (max_frames, n_filters)),
+                ("ceps", (max_frames, n_ceps)),
+            ):
+                self.array(name, shape, dtype)
+
+    def array(self, name, shape, dtype=numpy.float64):
+        """Returns an uninitialized array of ``shape`` using the ``name`` buffer.
+
+        Parameters
+        ----------
+        name:
+            The name of the buffer (e.g. ``"frames"``).
+        shape:
+            The shape of the returned array.
+        dtype:
+            The type of the returned array (one buffer is kept per type).
+        """
+        dtype = numpy.dtype(dtype)
+        size = math.prod(shape)
+        buffer = self._buffers.get((name, dtype))
+        if buffer is None or buffer.size < size:
+            logger.debug("Growing the %s buffer to %d elements.", name, size)
+            buffer = numpy.empty(size, dtype=dtype)
+            self._buffers[(name, dtype)] = buffer
+        return buffer[:size].reshape(shape)
+
+    @property
+    def nbytes(self):
+        """The memory used by all the buffers, in bytes."""
+        return sum(buffer.nbytes for buffer in self._buffers.values())
+
+    def clear(self):
+        """Releases all the buffers."""
+        self._buffers.clear()
+
+
+def _workspace_array(workspace, name, shape, dtype):
+    """Returns an array from ``workspace``, or a new array without one."""
+    if workspace is None:
+        return numpy.empty(shape, dtype=dtype)
+    return workspace.array(name, shape, dtype)
+
+
+# Maximum number of resamplers kept by `resample`
+RESAMPLER_CACHE_SIZE = 16
+
+
+@functools.lru_cache(maxsize=RESAMPLER_CACHE_SIZE)
+def _cached_resampler(rate, new_rate, kwargs):
+    import torchaudio
+
+    return torchaudio.transforms.Resample(
+        rate, new_rate, dtype=torch.float32, **dict(kwargs)
+    )
+
+
+def resampler(rate: int, new_rate: int, **kwargs):
+    """Returns the :py:class:`torchaudio.transforms.Resample` of a conversion.
+
+    The resamplers (and their sinc kernels) are built once per ``rate``,
+    ``new_rate`` and ``kwargs``, and kept in a bounded LRU cache (of
+    :py:data:`RESAMPLER_CACHE_SIZE` entries).
+    """
+    return _cached_resampler(rate, new_rate, tuple(sorted(kwargs.items())))
+
+
+def resampler_cache_info():
+    """Returns the hits, misses and size of the :py:func:`resampler` cache."""
+    return _cached_resampler.cache_info()
+
+
+def clear_resampler_cache():
+    """Empties the :py:func:`resampler` cache and resets its counters."""
+    _cached_resampler.cache_clear()
+
+
+def _to_tensor(audio):
+    # torch tensors can not share read-only arrays (e.g. shared signals)
+    return torch.from_numpy(audio if audio.flags.writeable else audio.copy())
+
+
 def resample(
     audio: Union[numpy.ndarray, torch.Tensor],
     rate: int,
@@ -101,28 +380,195 @@ def resample(
         Arguments passed to :py:class:``torchaudio.transforms.Resample``.
     """
 
-    import torchaudio
-
     if rate == new_rate:
         return audio
 
     was_numpy = False
     if isinstance(audio, numpy.ndarray):
-        audio = torch.from_numpy(audio)
+        audio = _to_tensor(audio)
         was_numpy = True
 
-    resampler = torchaudio.transforms.Resample(
-        rate, new_rate, dtype=torch.float32, **kwargs
-    )
-    audio = resampler(audio)
+    audio = resampler(rate, new_rate, **kwargs)(audio)
 
     return audio.numpy() if was_numpy else audio
 
 
+def resample_batch(
+    audios: "list[numpy.ndarray]",
+    rate: int,
+    new_rate: int,
+    max_batch_samples: int = 2**24,
+    **kwargs,
+) -> "list[numpy.ndarray]":
+    """Resamples utterances of a same rate, several at a time.
+
+    The utterances are sorted by length and zero-padded in batches of at most
+    ``max_batch_samples`` samples, each resampled in one convolution. The
+    results are those of :py:func:`resample` on each utterance (up to the
+    rounding), as the sinc filter sees zeros after the end of an utterance in
+    both cases.
+
+    Parameters
+    ----------
+    audios:
+        The signals to resample. Only the 1D signals are batched.
+    rate, new_rate, kwargs:
+        See :py:func:`resample`.
+    max_batch_samples:
+        The maximum size of a (padded) batch, in samples.
+    """
+    if rate == new_rate:
+        return list(audios)
+
+    gcd = math.gcd(int(rate), int(new_rate))
+    output = [None] * len(audios)
+    order = []
+    for i, audio in enumerate(audios):
+        if numpy.ndim(audio) == 1 and len(audio) == 0:
+            output[i] = numpy.empty(0, dtype=numpy.float32)
+        elif numpy.ndim(audio) == 1:
+            order.append(i)
+        else:  # e.g. multi-channel signals
+            output[i] = resample(numpy.asarray(audio), rate, new_rate, **kwargs)
+    order.sort(key=lambda i: len(audios[i]))
+    while order:
+        # The longest remaining utterances that fit in a batch
+        batch = [order.pop()]
+        length = len(audios[batch[0]])
+        while order and (len(batch) + 1) * length <= max_batch_samples:
+            batch.append(order.pop())
+
+        padded = torch.zeros((len(batch), length), dtype=torch.float32)
+        for row, i in enumerate(batch):
+            padded[row, : len(audios[i])] = _to_tensor(audios[i])
+        resampled = resampler(rate, new_rate, **kwargs)(padded).numpy()
+        for row, i in enumerate(batch):
+            n = -(-(new_rate // gcd) * len(audios[i]) // (rate // gcd))
+            output[i] = resampled[row, :n].copy()
+    return output
+
+
+@functools.lru_cache(maxsize=None)
+def _soundfile():
+    """Returns the soundfile module if it can be used (checked once)."""
+    try:
+        import soundfile
+    except (ImportError, OSError) as e:  # OSError if libsndfile is missing
+        logger.warning(
+            "'soundfile' could not be imported. torchaudio may have trouble "
+            "loading '.sph' files."
+        )
+        logger.info("error was %s", e)
+        return None
+    return soundfile
+
+
+@functools.lru_cache(maxsize=None)
+def _torchaudio():
+    """Returns torchaudio, with the soundfile backend if possible (set once)."""
+    import torchaudio
+
+    if _soundfile() is not None:
+        try:
+            torchaudio.set_audio_backend(
+                "soundfile"
+            )  # May throw a RuntimeError.
+        except RuntimeError as e:
+            logger.warning(
+                "'soundfile' could not be specified as torchaudio backend. "
+                "torchaudio may have trouble loading '.sph' files."
+            )
+            logger.info("error was %s", e)
+    return torchaudio
+
+
+def _frame_range(rate, offset, duration, unit):
+    """Returns the first frame and number of frames (or None) of a segment."""
+    if unit not in ("seconds", "samples"):
+        raise ValueError(
+            f"Unknown unit '{unit}', expected 'seconds' or 'samples'."
+        )
+    scale = rate if unit == "seconds" else 1
+    start = 0 if offset is None else int(round(offset * scale))
+    n_frames = None if duration is None else int(round(duration * scale))
+    if start < 0 or (n_frames is not None and n_frames < 0):
+        raise ValueError(
+            f"Invalid segment of offset {offset} and duration {duration}."
+        )
+    return start, n_frames
+
+
+def _read_soundfile(
+    filename,
+    channel,
+    offset=None,
+    duration=None,
+    unit="seconds",
+    block_frames=2**16,
+):
+    """Reads a channel of a file in a float32 buffer, in [-1, 1].
+
+    The frames of multi-channel files are read by blocks, so only the wanted
+    channel is kept in memory. Only the frames of the segment starting at
+    ``offset`` are decoded.
+    """
+    with _soundfile().SoundFile(str(filename)) as f:
+        rate = f.samplerate
+        n_channels = f.channels
+        if not -n_channels <= channel < n_channels:
+            raise IndexError(
+                f"Channel {channel} requested in a file of {n_channels} "
+                "channels."
+            )
+        start, n_frames = _frame_range(rate, offset, duration, unit)
+        if start:
+            if not f.seekable():
+                raise ValueError(f"Can not read a segment of {filename}.")
+            f.seek(min(start, f.frames))
+        n_frames = f.frames - f.tell() if n_frames is None else n_frames
+        n_frames = max(0, min(n_frames, f.frames - f.tell()))
+        if n_channels == 1:
+            data = f.read(n_frames, dtype="float32", always_2d=False)
+        else:
+            data = numpy.empty(n_frames, dtype=numpy.float32)
+            block = numpy.empty((block_frames, n_channels), dtype=numpy.float32)
+            start = 0
+            while start < len(data):
+                n = len(f.read(out=block[: len(data) - start]))
+                if n == 0:  # The header over-estimated the number of frames
+                    break
+                data[start : start + n] = block[:n, channel]
+                start += n
+            data = data[:start]
+    return data, rate
+
+
+def _read_torchaudio(
+    filename, channel, offset=None, duration=None, unit="seconds"
+):
+    """Reads a channel of a file (or of a segment) with torchaudio, in [-1, 1]."""
+    kwargs = {}
+    if offset is not None or duration is not None:
+        rate = audio_info(filename).sample_rate
+        start, n_frames = _frame_range(rate, offset, duration, unit)
+        if n_frames == 0:
+            return numpy.empty(0, dtype=numpy.float32), rate
+        kwargs = dict(
+            frame_offset=start, num_frames=-1 if n_frames is None else n_frames
+        )
+    data, rate = _torchaudio().load(str(filename), **kwargs)
+    return data[channel].numpy(), rate
+
+
 def read(
     filename: str,
     channel: Optional[int] = None,
     force_sample_rate: Optional[int] = None,
+    backend: Optional[str] = None,
+    offset: Optional[float] = None,
+    duration: Optional[float] = None,
+    unit: str = "seconds",
+    cache=None,
 ) -> Tuple[numpy.ndarray, int]:
     """Reads audio file and returns the signal and the sampling rate
 
@@ -131,11 +577,27 @@ def read(
     filename:
         The full path to the audio file to load.
     channel:
-        The channel to load. If None, all channels will be loaded and returned in a 2D
-        array in the shape (n_channels, n_samples).
+        The channel to load. If None, the first channel is loaded.
     force_sample_rate:
         If specified, the audio will be resampled to the specified rate. Otherwise, the
         sample rate of the file will be used.
+    backend:
+        ``"soundfile"`` to decode the file directly in the returned array, or
+        ``"torchaudio"``. By default, soundfile is used if it is installed and
+        supports the file format (e.g. WAV, FLAC or SPH), and torchaudio
+        otherwise.
+    offset:
+        The start of the segment to read, in ``unit`` (from the start of the
+        file by default). Only the frames of the segment are decoded.
+    duration:
+        The length of the segment to read, in ``unit`` (up to the end of the
+        file by default). The segment is cropped at the end of the file.
+    unit:
+        ``"seconds"``, or ``"samples"`` at the sample rate of the file (before
+        resampling).
+    cache:
+        A :py:class:`bob.bio.spear.cache.AudioCache` storing the decoded
+        signals, to decode each file (and channel and rate) only once.
 
     Returns
     -------
@@ -144,35 +606,37 @@ def read(
         sampling rate in Hz.
     """
 
-    import torchaudio
-
-    try:
-        importlib.__import__(
-            "soundfile"
-        )  # Try to import missing soundfile may throw an OSError.
-        torchaudio.set_audio_backend("soundfile")  # May throw a RuntimeError.
-    except (RuntimeError, OSError) as e:
-        logger.warning(
-            "'soundfile' could not be imported or specified as torchaudio "
-            "backend. torchaudio may have trouble loading '.sph' files."
+    if backend not in (None, "soundfile", "torchaudio"):
+        raise ValueError(
+            f"Unknown backend '{backend}', expected 'soundfile' or 'torchaudio'."
         )
-        logger.info("error was %s", e)
-
-    data, rate = torchaudio.load(str(filename))
-
-    if channel is not None:
-        data = data[channel]
-    else:
-        if data.ndim > 1:
-            data = data[0]
+    segment = dict(offset=offset, duration=duration, unit=unit)
+    if cache is not None:
+        return cache.read(
+            filename, channel, force_sample_rate, backend, **segment
+        )
+    channel = 0 if channel is None else channel
+
+    data = None
+    if backend != "torchaudio" and _soundfile() is not None:
+        try:
+            data, rate = _read_soundfile(filename, channel, **segment)
+        except RuntimeError:  # soundfile.LibsndfileError (unsupported format)
+            if backend == "soundfile":
+                raise
+            logger.debug("Reading %s with torchaudio.", filename)
+    elif backend == "soundfile":
+        raise ValueError("The soundfile backend requires soundfile.")
+    if data is None:
+        data, rate = _read_torchaudio(filename, channel, **segment)
 
     if force_sample_rate is not None:
         data = resample(data, rate, force_sample_rate)
         rate = force_sample_rate
 
     # Expected data is in float32 format and int16 range (-32768. to 32767.)
-    data = data.numpy().astype(numpy.float32) * 32768
-
+    data = data.astype(numpy.float32, copy=False)
+    data *= 32768
     return data, rate
 
 
@@ -190,9 +654,31 @@ def audio_info(filename: str):
         A dictionary containing the audio information.
     """
 
-    import torchaudio
+    return _torchaudio().info(str(filename))
+
+
+class AudioHeader(NamedTuple):
+    """The properties of an audio file read from its header."""
+
+    sample_rate: int
+    n_frames: int
+    n_channels: int
 
-    return torchaudio.info(str(filename))
+
+def audio_header(filename: str) -> AudioHeader:
+    """Returns the sample rate, length and channels of a file, without decoding it.
+
+    Only the header of the file is read (with soundfile if it supports the
+    format, or with :py:func:`audio_info` otherwise).
+    """
+    if _soundfile() is not None:
+        try:
+            info = _soundfile().info(str(filename))
+            return AudioHeader(info.samplerate, info.frames, info.channels)
+        except RuntimeError:  # soundfile.LibsndfileError (unsupported format)
+            pass
+    info = audio_info(filename)
+    return AudioHeader(info.sample_rate, info.num_frames, info.num_channels)
 
 
 def compare(v1, v2, width):
@@ -208,9 +694,7 @@ def mel_inv_python(value):
 
 
 def sig_norm(win_length, frame, flag):
-    gain = 0.0
-    for i in range(win_length):
-        gain = gain + frame[i] * frame[i]
+    gain = float(numpy.dot(frame[:win_length], frame[:win_length]))
 
     ENERGY_FLOOR = 1.0
     if gain < ENERGY_FLOOR:
@@ -219,49 +703,373 @@ def sig_norm(win_length, frame, flag):
         gain = math.log(gain)
 
     if flag and gain != 0.0:
-        for i in range(win_length):
-            frame[i] = frame[i] / gain
+        frame[:win_length] /= gain
     return gain
 
 
-def pre_emphasis(frame, win_shift, coef, last_frame_elem):
+def pre_emphasis(frame, win_shift, coef, last_frame_elem, out=None):
+    """Applies the pre-emphasis filter on a frame.
+
+    The result is written in ``out`` if given (which can be ``frame`` itself).
+    """
 
     if (coef <= 0.0) or (coef > 1.0):
         print("Error: The emphasis coeff. should be between 0 and 1")
         return None
 
     last_element = frame[win_shift - 1]
-    return (
-        numpy.append(
-            frame[0] - coef * last_frame_elem, frame[1:] - coef * frame[:-1]
-        ),
-        last_element,
-    )
+    if out is None:
+        out = numpy.empty(len(frame), dtype=numpy.result_type(frame, 1.0))
+    numpy.subtract(frame[1:], coef * frame[:-1], out=out[1:])
+    out[0] = frame[0] - coef * last_frame_elem
+    return out, last_element
 
 
 def hamming_window(vector, hamming_kernel, win_length):
-    for i in range(win_length):
-        vector[i] = vector[i] * hamming_kernel[i]
+    numpy.multiply(
+        vector[:win_length],
+        hamming_kernel[:win_length],
+        out=vector[:win_length],
+    )
     return vector
 
 
-def log_filter_bank(frame, n_filters, p_index, win_size, energy_filter):
-    x1 = numpy.array(frame, dtype=numpy.complex128)
-    complex_ = fft(x1)
-    abscomplex = numpy.absolute(complex_)
-    half_frame = abscomplex[0 : int(win_size / 2) + 1]
+def frame_parameters(rate, win_length_ms, win_shift_ms):
+    """Returns the window length, shift and FFT size (in samples) for a rate.
+
+    Parameters
+    ----------
+    rate:
+        The sample rate of the signal in Hz.
+    win_length_ms:
+        The length of a frame in milliseconds.
+    win_shift_ms:
+        The shift between two consecutive frames in milliseconds.
+
+    Returns
+    -------
+    win_length, win_shift, win_size
+        The frame length, the frame shift, and the frame length rounded up to
+        the next power of two (used as FFT size), all in samples.
+    """
+    win_length = int(rate * win_length_ms / 1000)
+    win_shift = int(rate * win_shift_ms / 1000)
+    win_size = int(2.0 ** math.ceil(math.log(win_length) / math.log(2)))
+    return win_length, win_shift, win_size
+
+
+def frame_signal(data, win_length, win_shift):
+    """Splits a signal in overlapping frames without copying it.
+
+    Parameters
+    ----------
+    data:
+        1D signal.
+    win_length:
+        The length of a frame in samples.
+    win_shift:
+        The shift between two consecutive frames in samples.
+
+    Returns
+    -------
+    frames: numpy.ndarray
+        A read-only strided view on ``data`` of shape ``(n_frames, win_length)``.
+        Trailing samples that do not fill a whole frame are dropped.
+    """
+    data = numpy.asarray(data)
+    n_frames = int(1 + (data.shape[0] - win_length) / win_shift)
+    if n_frames <= 0:
+        return numpy.empty((0, win_length), dtype=data.dtype)
+    return numpy.lib.stride_tricks.sliding_window_view(data, win_length)[
+        ::win_shift
+    ][:n_frames]
+
+
+def normalized_frames(
+    data,
+    win_length,
+    win_shift,
+    win_size,
+    dtype=numpy.float64,
+    out=None,
+    workspace=None,
+):
+    """Returns the frames of a signal with their mean removed.
+
+    The frames are zero-padded to ``win_size`` samples. The mean is computed
+    over the padded frame (the sum of the samples divided by ``win_size``) and
+    removed from the ``win_length`` signal samples only.
+
+    Returns
+    -------
+    frames: numpy.ndarray
+        An array of type ``dtype`` and shape ``(n_frames, win_size)``, or
+        ``out`` if given. With a :py:class:`AnalysisWorkspace`, the array is
+        its ``"frames"`` buffer.
+    """
+    view = frame_signal(data, win_length, win_shift)
+    if out is None and workspace is None:
+        frames = numpy.zeros((view.shape[0], win_size), dtype=dtype)
+    else:
+        frames = (
+            _workspace_array(
+                workspace, "frames", (view.shape[0], win_size), dtype
+            )
+            if out is None
+            else out
+        )
+        frames[:, win_length:] = 0
+    frames[:, :win_length] = view
+    frames[:, :win_length] -= (
+        frames[:, :win_length].sum(axis=1, keepdims=True) / win_size
+    )
+    return frames
+
+
+def frames_log_energy(frames, out=None):
+    """Returns the log energy of each frame (see :py:func:`sig_norm`)."""
+    ENERGY_FLOOR = 1.0
+    gain = numpy.einsum("ij,ij->i", frames, frames, out=out)
+    numpy.maximum(gain, ENERGY_FLOOR, out=gain)
+    return numpy.log(gain, out=gain)
+
+
+class FrameAnalysis(NamedTuple):
+    """The frame-level analysis of a signal, to share between transformers.
+
+    Annotators can attach it to their labels (see :py:class:`utils.VADLabels`)
+    so the extractors reuse the log energy (and the frames) of the signal
+    instead of computing them again. The analysis holds a checksum of the
+    signal (see :py:func:`signal_checksum`), so it is not reused for another
+    signal of the same length.
+    """
+
+    rate: float
+    win_length: int
+    win_shift: int
+    log_energy: numpy.ndarray
+    """The log energy of each frame (see :py:func:`frames_log_energy`)."""
+    frames: Optional[numpy.ndarray] = None
+    """The frames of :py:func:`normalized_frames`, if kept (``n_frames`` by the
+    FFT size, much larger than the signal, see :py:class:`utils.VADLabels`)."""
+    checksum: Optional[tuple] = None
+    """The :py:func:`signal_checksum` of the analyzed signal."""
+
+    def matches(self, rate, win_length, win_shift, n_frames, data=None):
+        """Tells if this analysis is valid for the given framing (and signal)."""
+        return (
+            self.rate == rate
+            and self.win_length == win_length
+            and self.win_shift == win_shift
+            and len(self.log_energy) == n_frames
+            and (
+                data is None
+                or self.checksum is None
+                or self.checksum == signal_checksum(data)
+            )
+        )
+
+
+def signal_checksum(data, n_points=4096) -> tuple:
+    """Returns a cheap fingerprint of a signal.
+
+    The fingerprint is the length of the signal and a CRC of (at most)
+    ``n_points`` evenly spaced samples, so it is computed in constant time.
+    """
+    data = numpy.asarray(data)
+    step = max(1, len(data) // n_points)
+    points = numpy.ascontiguousarray(data[::step], dtype=numpy.float64)
+    return len(data), zlib.crc32(points)
+
+
+def frame_analysis(
+    data,
+    rate,
+    *,
+    win_length_ms=20.0,
+    win_shift_ms=10.0,
+    keep_frames=False,
+    dtype=numpy.float64,
+):
+    """Frames a signal and computes the log energy of each frame.
+
+    Parameters
+    ----------
+    data:
+        The 1D audio signal (in int16 range).
+    rate:
+        The sample rate of the signal in Hz.
+    keep_frames:
+        Keeps the mean-normalized frames in the result, so they can be reused
+        by :py:func:`cepstral`.
+
+    Returns
+    -------
+    analysis: FrameAnalysis
+        The log energies of :py:func:`energy` with the framing parameters.
+    """
+    win_length, win_shift, win_size = frame_parameters(
+        rate, win_length_ms, win_shift_ms
+    )
+    frames = normalized_frames(data, win_length, win_shift, win_size, dtype)
+    return FrameAnalysis(
+        rate,
+        win_length,
+        win_shift,
+        frames_log_energy(frames),
+        frames if keep_frames else None,
+        signal_checksum(data),
+    )
+
+
+def _shared_analysis(analysis, data, rate, win_length, win_shift, n_frames):
+    """Returns ``analysis`` if it can be reused for this signal, or None."""
+    if analysis is None:
+        return None
+    if not analysis.matches(rate, win_length, win_shift, n_frames, data):
+        logger.debug("The shared frame analysis does not match; recomputing.")
+        return None
+    return analysis
+
+
+def _analysis_frames(
+    data,
+    analysis,
+    win_length,
+    win_shift,
+    win_size,
+    dtype,
+    out=None,
+    workspace=None,
+):
+    """Returns the normalized frames of ``data``, copied from ``analysis`` if
+    it kept them (the frames are modified by :py:func:`frames_cepstral`)."""
+    if (
+        analysis is None
+        or analysis.frames is None
+        or analysis.frames.shape[1] != win_size
+    ):
+        return normalized_frames(
+            data, win_length, win_shift, win_size, dtype, out, workspace
+        )
+    if out is None and workspace is None:
+        return analysis.frames.astype(dtype, copy=True)
+    if out is None:
+        out = workspace.array("frames", analysis.frames.shape, dtype)
+    out[...] = analysis.frames
+    return out
+
+
+def pre_emphasis_frames(
+    frames, win_shift, coef, last_frame_elem=0.0, starts=None
+):
+    """Applies the pre-emphasis filter on each frame, in-place.
+
+    Every frame is filtered as in :py:func:`pre_emphasis`: the first sample of a
+    frame uses the sample at ``win_shift - 1`` of the previous (unfiltered)
+    frame, and the first frame uses ``last_frame_elem``.
+
+    Parameters
+    ----------
+    frames:
+        2D float array of shape ``(n_frames, win_length)``, modified in-place.
+    win_shift:
+        The shift between two consecutive frames in samples.
+    coef:
+        The pre-emphasis coefficient, in ]0, 1].
+    last_frame_elem:
+        The element preceding the first frame.
+    starts:
+        Indices of the frames starting a new signal, when the frames of several
+        signals are packed together. Their first sample uses a previous element
+        of 0.
+
+    Returns
+    -------
+    frames, last_element
+        The filtered frames and the element to use as ``last_frame_elem`` for
+        the next frame.
+    """
+    if (coef <= 0.0) or (coef > 1.0):
+        raise ValueError("The emphasis coeff. should be between 0 and 1")
+
+    if len(frames) == 0:
+        return frames, last_frame_elem
+
+    previous = numpy.empty(len(frames), dtype=frames.dtype)
+    previous[0] = last_frame_elem
+    previous[1:] = frames[:-1, win_shift - 1]
+    if starts is not None:
+        previous[starts[starts < len(frames)]] = 0.0
+    last_element = frames[-1, win_shift - 1]
+
+    frames[:, 1:] -= coef * frames[:, :-1]
+    frames[:, 0] -= coef * previous
+    return frames, last_element
+
+
+def frames_spectrum(
+    frames, win_size, energy_filter=False, dtype=None, out=None
+):
+    """Returns the magnitude (or power) spectrum of each frame.
+
+    The spectrum of all the frames is computed at once with a real FFT, so only
+    the ``win_size // 2 + 1`` non-redundant bins are computed.
+
+    Parameters
+    ----------
+    frames:
+        2D array of windowed frames of shape ``(n_frames, n)``. Frames shorter
+        than ``win_size`` are zero-padded.
+    win_size:
+        The size of the FFT.
+    energy_filter:
+        If True, returns the power spectrum (squared magnitude) instead of the
+        magnitude.
+    dtype:
+        The floating point type used for the computation (e.g.
+        ``numpy.float32`` to halve the memory used). Defaults to the type of
+        ``frames``.
+    out:
+        An array of shape ``(n_frames, win_size // 2 + 1)`` to fill.
+
+    Returns
+    -------
+    spectrum: numpy.ndarray
+        The spectrum of shape ``(n_frames, win_size // 2 + 1)``.
+    """
+    if dtype is not None:
+        frames = numpy.asarray(frames, dtype=dtype)
+    spectrum = numpy.absolute(
+        scipy.fft.rfft(frames, n=win_size, axis=-1), out=out
+    )
+
+    if energy_filter:
+        # Energy is basically magnitude in power of 2
+        numpy.square(spectrum, out=spectrum)
+
+    return spectrum
+
+
+def log_filter_bank(
+    frame, n_filters, p_index, win_size, energy_filter, out=None
+):
+    half_frame = frame[0 : int(win_size / 2) + 1]
+    numpy.absolute(numpy.fft.rfft(frame, n=win_size), out=half_frame)
 
     if energy_filter:
         # Energy is basically magnitude in power of 2
-        half_frame = half_frame**2
+        numpy.square(half_frame, out=half_frame)
 
-    frame[0 : int(win_size / 2) + 1] = half_frame
-    filters = log_triangular_bank(frame, n_filters, p_index)
+    filters = log_triangular_bank(frame, n_filters, p_index, out=out)
     return filters, frame
 
 
-def log_triangular_bank(data, n_filters, p_index):
-    res_ = numpy.zeros(n_filters, dtype=numpy.float64)
+def log_triangular_bank(data, n_filters, p_index, out=None):
+    if out is None:
+        res_ = numpy.zeros(n_filters, dtype=numpy.float64)
+    else:
+        res_ = out
 
     denominator = 1.0 / (
         p_index[1 : n_filters + 2] - p_index[0 : n_filters + 1]
@@ -290,12 +1098,36 @@ def log_triangular_bank(data, n_filters, p_index):
         # res_[i] = numpy.sum(data[vect_full] * filt)
 
     FBANK_OUT_FLOOR = sys.float_info.epsilon
-    return numpy.log(numpy.where(res_ < FBANK_OUT_FLOOR, FBANK_OUT_FLOOR, res_))
+    numpy.maximum(res_, FBANK_OUT_FLOOR, out=res_)
+    return numpy.log(res_, out=res_)
+
+
+def frames_log_filter_bank(spectrum, filterbank, out=None):
+    """Applies a filter bank on every frame of a spectrum and returns its log.
+
+    Parameters
+    ----------
+    spectrum:
+        The spectrum of each frame, of shape ``(n_frames, n_bins)``.
+    filterbank:
+        The filter bank weights of :py:func:`init_filterbank_matrix`.
+    out:
+        An array of shape ``(n_frames, n_filters)`` to fill.
+
+    Returns
+    -------
+    filters: numpy.ndarray
+        The log outputs of the filters, of shape ``(n_frames, n_filters)``.
+    """
+    FBANK_OUT_FLOOR = sys.float_info.epsilon
+    res_ = numpy.matmul(spectrum, filterbank, out=out)
+    numpy.maximum(res_, FBANK_OUT_FLOOR, out=res_)
+    return numpy.log(res_, out=res_)
 
 
-def dct_transform(filters, n_filters, dct_kernel, n_ceps):
+def dct_transform(filters, n_filters, dct_kernel, n_ceps, out=None):
 
-    ceps = numpy.zeros(n_ceps)
+    ceps = numpy.zeros(n_ceps) if out is None else out
     vec = numpy.array(range(0, n_filters))
     for i in range(0, n_ceps):
         ceps[i] = numpy.sum(filters[vec] * dct_kernel[i])
@@ -303,15 +1135,310 @@ def dct_transform(filters, n_filters, dct_kernel, n_ceps):
     return ceps
 
 
-def energy(data, rate, *, win_length_ms=20.0, win_shift_ms=10.0):
+def frames_cepstral(
+    frames,
+    win_shift,
+    kernels,
+    pre_emphasis_coef,
+    with_energy,
+    last_frame_elem=0.0,
+    out=None,
+    starts=None,
+    log_energy=None,
+    workspace=None,
+):
+    """Computes the cepstral coefficients (and log energy) of each frame.
+
+    Parameters
+    ----------
+    frames:
+        The frames of :py:func:`normalized_frames`, modified in-place.
+    win_shift:
+        The shift between two consecutive frames in samples.
+    kernels:
+        The kernels of :py:func:`analysis_kernels` for this configuration.
+    pre_emphasis_coef:
+        The pre-emphasis coefficient.
+    with_energy:
+        Appends the log energy of the frames after the cepstral coefficients.
+    last_frame_elem:
+        The element preceding the first frame for the pre-emphasis.
+    out:
+        An array of shape ``(n_frames, n_ceps + with_energy)`` to fill.
+    starts:
+        Indices of the first frame of each signal, for frames of several signals
+        packed together (see :py:func:`pre_emphasis_frames`).
+    log_energy:
+        The log energy of the frames, if already computed (see
+        :py:class:`FrameAnalysis`).
+    workspace:
+        An :py:class:`AnalysisWorkspace` holding the spectrum and filter
+        outputs.
+
+    Returns
+    -------
+    features, last_element
+        The features of each frame, and the element to use as
+        ``last_frame_elem`` for the next frame.
+    """
+    hamming_kernel, _, filterbank, dct_kernel = kernels
+    win_length = len(hamming_kernel)
+    n, win_size = frames.shape
+    n_ceps = dct_kernel.shape[0]
+    if out is None:
+        out = numpy.empty(
+            (frames.shape[0], n_ceps + int(with_energy)), dtype=frames.dtype
+        )
+
+    if with_energy:
+        if log_energy is None:
+            log_energy = frames_log_energy(
+                frames,
+                _workspace_array(workspace, "energy", (n,), frames.dtype),
+            )
+        out[:, n_ceps] = log_energy
+
+    # pre-emphasis filtering
+    _, last_element = pre_emphasis_frames(
+        frames[:, :win_length],
+        win_shift,
+        pre_emphasis_coef,
+        last_frame_elem,
+        starts,
+    )
+
+    # Hamming windowing
+    frames[:, :win_length] *= hamming_kernel
+
+    # FFT
+    spectrum = frames_spectrum(
+        frames,
+        win_size,
+        energy_filter=False,
+        out=_workspace_array(
+            workspace, "spectrum", (n, win_size // 2 + 1), frames.dtype
+        ),
+    )
+
+    # filters
+    filters = frames_log_filter_bank(
+        spectrum,
+        filterbank.astype(frames.dtype, copy=False),
+        out=_workspace_array(
+            workspace, "filters", (n, filterbank.shape[1]), frames.dtype
+        ),
+    )
+
+    # apply DCT
+    out[:, 0:n_ceps] = numpy.matmul(
+        filters,
+        dct_kernel.T.astype(frames.dtype, copy=False),
+        out=_workspace_array(workspace, "ceps", (n, n_ceps), frames.dtype),
+    )
+
+    return out, last_element
+
+
+def delta_features(features, delta_win, offsets=None, out=None):
+    """Computes the (unnormalized) regression deltas of features over time.
+
+    For each frame ``t``, the delta is ``sum(l * (x[t + l] - x[t - l]))`` for
+    ``l`` in ``1..delta_win``, where frames outside of the signal are replaced
+    by the first or last frame.
+
+    Parameters
+    ----------
+    features:
+        The features of shape ``(..., n_frames, dim)``. Leading dimensions are
+        treated as a batch of utterances of the same length.
+    delta_win:
+        The number of frames on each side used to compute the deltas.
+    offsets:
+        For 2D ``features`` of utterances of different lengths packed together,
+        the index of the first frame of each utterance followed by the total
+        number of frames. The deltas are computed for each utterance.
+    out:
+        An array with the shape of ``features`` to fill.
+
+    Returns
+    -------
+    deltas: numpy.ndarray
+        The deltas, with the same shape as ``features``.
+    """
+    features = numpy.asarray(features)
+    n_frames = features.shape[-2]
+    if out is None:
+        deltas = numpy.zeros_like(features)
+    else:
+        deltas = out
+        deltas[...] = 0
+    if n_frames == 0:
+        return deltas
+
+    if offsets is not None:
+        offsets = numpy.asarray(offsets)
+        lengths = numpy.diff(offsets)
+        first = numpy.repeat(offsets[:-1], lengths)
+        last = numpy.repeat(offsets[1:] - 1, lengths)
+    else:
+        first = numpy.zeros(n_frames, dtype=int)
+        last = numpy.full(n_frames, n_frames - 1)
+
+    if jit.use_numba("delta_features") and (
+        deltas.ndim == 2 or deltas.flags.c_contiguous
+    ):
+        # (the reshaped deltas must be a view of ``deltas``)
+        jit.delta_features(
+            features.reshape((-1,) + features.shape[-2:]),
+            delta_win,
+            first,
+            last,
+            deltas.reshape((-1,) + deltas.shape[-2:]),
+        )
+        return deltas
+
+    if offsets is not None:
+        index = numpy.arange(n_frames)
+        for ll in range(1, delta_win + 1):
+            deltas += ll * (
+                features[numpy.minimum(index + ll, last)]
+                - features[numpy.maximum(index - ll, first)]
+            )
+        return deltas
+
+    pad_width = [(0, 0)] * features.ndim
+    pad_width[-2] = (delta_win, delta_win)
+    padded = numpy.pad(features, pad_width, mode="edge")
+
+    for ll in range(1, delta_win + 1):
+        deltas += ll * (
+            padded[..., delta_win + ll : delta_win + ll + n_frames, :]
+            - padded[..., delta_win - ll : delta_win - ll + n_frames, :]
+        )
+    return deltas
+
+
+BACKENDS = ("numpy", "torch")
+
+
+def _check_backend(backend):
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown backend '{backend}', should be one of {BACKENDS}."
+        )
+
+
+def _torch_normalized_frames(data, win_length, win_shift, win_size, dtype):
+    """Torch version of :py:func:`normalized_frames` (without the padding)."""
+    signal = torch.from_numpy(numpy.ascontiguousarray(data, dtype=dtype))
+    n_frames = int(1 + (signal.shape[0] - win_length) / win_shift)
+    if n_frames <= 0:
+        return signal.new_zeros((0, win_length))
+    frames = signal.unfold(0, win_length, win_shift)[:n_frames]
+    return frames - frames.sum(dim=1, keepdim=True) / win_size
+
+
+def _torch_log_energy(frames):
+    """Torch version of :py:func:`frames_log_energy`."""
+    ENERGY_FLOOR = 1.0
+    return (frames * frames).sum(dim=1).clamp(min=ENERGY_FLOOR).log()
+
+
+def _torch_windowed_frames(frames, win_shift, coef, hamming_kernel):
+    """Torch version of :py:func:`pre_emphasis_frames` and Hamming windowing."""
+    if (coef <= 0.0) or (coef > 1.0):
+        raise ValueError("The emphasis coeff. should be between 0 and 1")
+
+    previous = torch.cat([frames.new_zeros(1), frames[:-1, win_shift - 1]])
+    emphasized = torch.empty_like(frames)
+    emphasized[:, 1:] = frames[:, 1:] - coef * frames[:, :-1]
+    emphasized[:, 0] = frames[:, 0] - coef * previous
+    return emphasized * torch.tensor(hamming_kernel, dtype=frames.dtype)
+
+
+def _torch_spectrum(frames, win_size, energy_filter):
+    """Torch version of :py:func:`frames_spectrum`."""
+    if frames.shape[0] == 0:
+        return frames.new_zeros((0, int(win_size / 2) + 1))
+    spectrum = torch.fft.rfft(frames, n=win_size, dim=1).abs()
+    if energy_filter:
+        spectrum = spectrum.square()
+    return spectrum
+
+
+def _torch_delta_features(features, delta_win):
+    """Torch version of :py:func:`delta_features` (for one utterance)."""
+    n_frames = features.shape[0]
+    deltas = torch.zeros_like(features)
+    index = torch.arange(n_frames)
+    for ll in range(1, delta_win + 1):
+        deltas += ll * (
+            features[(index + ll).clamp(max=n_frames - 1)]
+            - features[(index - ll).clamp(min=0)]
+        )
+    return deltas
+
+
+def _torch_cepstral(
+    data,
+    win_length,
+    win_shift,
+    win_size,
+    kernels,
+    pre_emphasis_coef,
+    delta_win,
+    with_energy,
+    with_delta,
+    with_delta_delta,
+    dtype,
+):
+    """Torch version of the core of :py:func:`cepstral`."""
+    FBANK_OUT_FLOOR = sys.float_info.epsilon
+    frames = _torch_normalized_frames(
+        data, win_length, win_shift, win_size, dtype
+    )
+    windowed = _torch_windowed_frames(
+        frames, win_shift, pre_emphasis_coef, kernels.hamming_kernel
+    )
+    spectrum = _torch_spectrum(windowed, win_size, energy_filter=False)
+
+    # filters and DCT
+    filterbank = torch.tensor(kernels.filterbank, dtype=frames.dtype)
+    dct_kernel = torch.tensor(kernels.dct_kernel, dtype=frames.dtype)
+    filters = (spectrum @ filterbank).clamp(min=FBANK_OUT_FLOOR).log()
+    features = [filters @ dct_kernel.T]
+
+    if with_energy:
+        features.append(_torch_log_energy(frames)[:, None])
+    features = [torch.cat(features, dim=1)]
+
+    # deltas and delta-deltas
+    if with_delta:
+        features.append(_torch_delta_features(features[-1], delta_win))
+        if with_delta_delta:
+            features.append(_torch_delta_features(features[-1], delta_win))
+
+    return torch.cat(features, dim=1).numpy()
+
+
+def energy(
+    data,
+    rate,
+    *,
+    win_length_ms=20.0,
+    win_shift_ms=10.0,
+    dtype=numpy.float64,
+    backend="numpy",
+    workspace=None,
+):
 
     #########################
     # Initialisation part ##
     #########################
 
-    win_length = int(rate * win_length_ms / 1000)
-    win_shift = int(rate * win_shift_ms / 1000)
-    win_size = int(2.0 ** math.ceil(math.log(win_length) / math.log(2)))
+    win_length, win_shift, win_size = frame_parameters(
+        rate, win_length_ms, win_shift_ms
+    )
 
     ######################################
     # End of the Initialisation part ###
@@ -321,27 +1448,19 @@ def energy(data, rate, *, win_length_ms=20.0, win_shift_ms=10.0):
     #          Core code             ###
     ######################################
 
-    data_size = data.shape[0]
-    n_frames = int(1 + (data_size - win_length) / win_shift)
-
-    # create features set
-
-    features = [0 for j in range(n_frames)]
-
-    # compute cepstral coefficients
-    for i in range(n_frames):
-        # create a frame
-        frame = numpy.zeros(win_size, dtype=numpy.float64)
-        vec = numpy.arange(win_length)
-        frame[vec] = data[vec + i * win_shift]
-        som = numpy.sum(frame)
-        som = som / win_size
-        frame[vec] -= som  # normalization by mean here
+    _check_backend(backend)
+    if backend == "torch":
+        frames = _torch_normalized_frames(
+            data, win_length, win_shift, win_size, dtype
+        )
+        return _torch_log_energy(frames).numpy()
 
-        energy = sig_norm(win_length, frame, False)
-        features[i] = energy
+    # create the frames, normalized by their mean
+    frames = normalized_frames(
+        data, win_length, win_shift, win_size, dtype, workspace=workspace
+    )
 
-    return numpy.array(features)
+    return frames_log_energy(frames)
 
 
 def spectrogram(
@@ -358,22 +1477,21 @@ def spectrogram(
     energy_filter=False,
     log_filter=True,
     energy_bands=False,
+    dtype=numpy.float64,
+    backend="numpy",
+    out=None,
+    workspace=None,
 ):
     #########################
     # Initialisation part ##
     #########################
 
-    win_length = int(rate * win_length_ms / 1000)
-    win_shift = int(rate * win_shift_ms / 1000)
-    win_size = int(2.0 ** math.ceil(math.log(win_length) / math.log(2)))
+    win_length, win_shift, win_size = frame_parameters(
+        rate, win_length_ms, win_shift_ms
+    )
 
     # Hamming initialisation
-    hamming_kernel = init_hamming_kernel(win_length)
-
-    # Compute cut-off frequencies
-    p_index = init_freqfilter(
-        rate, win_size, mel_scale, n_filters, f_min, f_max
-    )
+    hamming_kernel = analysis_kernels(rate, win_length, win_size).hamming_kernel
 
     ######################################
     # End of the Initialisation part ###
@@ -383,40 +1501,29 @@ def spectrogram(
     #          Core code             ###
     ######################################
 
-    data_size = data.shape[0]
-    n_frames = int(1 + (data_size - win_length) / win_shift)
-
-    # create features set
-    features = numpy.zeros(
-        [n_frames, int(win_size / 2) + 1], dtype=numpy.float64
-    )
-
-    last_frame_elem = 0
-    # compute cepstral coefficients
-    for i in range(n_frames):
-        # create a frame
-        frame = numpy.zeros(win_size, dtype=numpy.float64)
-        vec = numpy.arange(win_length)
-        frame[vec] = data[vec + i * win_shift]
-        som = numpy.sum(frame)
-        som = som / win_size
-        frame[vec] -= som  # normalization by mean here
-
-        frame_, last_frame_elem = pre_emphasis(
-            frame[vec], win_shift, pre_emphasis_coef, last_frame_elem
+    _check_backend(backend)
+    if backend == "torch":
+        frames = _torch_normalized_frames(
+            data, win_length, win_shift, win_size, dtype
+        )
+        frames = _torch_windowed_frames(
+            frames, win_shift, pre_emphasis_coef, hamming_kernel
         )
-        frame[vec] = frame_
+        return _torch_spectrum(frames, win_size, energy_filter).numpy()
 
-        # Hamming windowing
-        frame = hamming_window(frame, hamming_kernel, win_length)
+    # create the frames, normalized by their mean
+    frames = normalized_frames(
+        data, win_length, win_shift, win_size, dtype, workspace=workspace
+    )
 
-        _, spec_row = log_filter_bank(
-            frame, n_filters, p_index, win_size, energy_filter
-        )
+    # pre-emphasis filtering
+    pre_emphasis_frames(frames[:, :win_length], win_shift, pre_emphasis_coef)
 
-        features[i] = spec_row[0 : int(win_size / 2) + 1]
+    # Hamming windowing
+    frames[:, :win_length] *= hamming_kernel
 
-    return numpy.array(features)
+    # FFT
+    return frames_spectrum(frames, win_size, energy_filter, out=out)
 
 
 def cepstral(
@@ -436,32 +1543,71 @@ def cepstral(
     with_energy=True,
     with_delta=True,
     with_delta_delta=True,
+    dtype=numpy.float64,
+    backend="numpy",
+    analysis=None,
+    out=None,
+    workspace=None,
 ):
+    """Computes the cepstral coefficients (e.g. MFCC) of an audio signal.
+
+    Parameters
+    ----------
+    data:
+        The 1D audio signal (in int16 range).
+    rate:
+        The sample rate of the signal in Hz.
+    dtype:
+        The floating point type of the whole computation and of the output.
+        With ``numpy.float32``, the memory used is halved and the features
+        match the float64 ones within ``rtol=1e-4`` and ``atol=1e-3``.
+    backend:
+        ``"numpy"``, or ``"torch"`` to compute the features with batched torch
+        CPU tensor operations (using the torch intra-op threads, see
+        :py:func:`torch.set_num_threads`).
+    analysis:
+        A :py:class:`FrameAnalysis` of the signal (e.g. attached by an
+        annotator). Its log energies (and frames) are reused when its framing
+        matches, with the numpy backend.
+    out:
+        An array of shape ``(n_frames, n_features)`` to fill with the features.
+    workspace:
+        An :py:class:`AnalysisWorkspace` holding the intermediate arrays, so
+        repeated calls do not allocate them again (numpy backend only).
+
+    The other parameters configure the framing (``win_length_ms``,
+    ``win_shift_ms``, ``pre_emphasis_coef``), the filter bank (``n_filters``,
+    ``f_min``, ``f_max``, ``mel_scale``), the DCT (``n_ceps``, ``dct_norm``)
+    and the appended features (``with_energy``, ``with_delta``,
+    ``with_delta_delta``, computed over ``delta_win`` frames on each side).
+
+    Returns
+    -------
+    features: numpy.ndarray
+        The features of each frame, of shape ``(n_frames, n_features)``.
+    """
 
     #########################
     # Initialisation part ##
     #########################
 
-    win_length = int(rate * win_length_ms / 1000)
-    win_shift = int(rate * win_shift_ms / 1000)
-    win_size = int(2.0 ** math.ceil(math.log(win_length) / math.log(2)))
-
-    # Hamming initialisation
-    hamming_kernel = init_hamming_kernel(win_length)
+    win_length, win_shift, win_size = frame_parameters(
+        rate, win_length_ms, win_shift_ms
+    )
 
-    # Compute cut-off frequencies
-    p_index = init_freqfilter(
+    # Hamming, filter bank and cosine transform initialisation
+    kernels = analysis_kernels(
         rate,
+        win_length,
         win_size,
-        mel_scale,
         n_filters,
         f_min,
         f_max,
+        mel_scale,
+        n_ceps,
+        dct_norm,
     )
 
-    # Cosine transform initialisation
-    dct_kernel = init_dct_kernel(n_filters, n_ceps, dct_norm)
-
     ######################################
     # End of the Initialisation part ###
     ######################################
@@ -470,8 +1616,41 @@ def cepstral(
     #          Core code             ###
     ######################################
 
-    data_size = data.shape[0]
-    n_frames = int(1 + (data_size - win_length) / win_shift)
+    _check_backend(backend)
+    if backend == "torch":
+        return _torch_cepstral(
+            data,
+            win_length,
+            win_shift,
+            win_size,
+            kernels,
+            pre_emphasis_coef,
+            delta_win,
+            with_energy,
+            with_delta,
+            with_delta_delta,
+            dtype,
+        )
+
+    # create the frames, normalized by their mean (or reuse the shared ones)
+    analysis = _shared_analysis(
+        analysis,
+        data,
+        rate,
+        win_length,
+        win_shift,
+        len(frame_signal(data, win_length, win_shift)),
+    )
+    frames = _analysis_frames(
+        data,
+        analysis,
+        win_length,
+        win_shift,
+        win_size,
+        dtype,
+        workspace=workspace,
+    )
+    n_frames = frames.shape[0]
 
     # create features set
     dim0 = n_ceps
@@ -485,144 +1664,331 @@ def cepstral(
     else:
         with_delta_delta = False
 
-    features = numpy.zeros([n_frames, dim], dtype=numpy.float64)
+    features = numpy.zeros([n_frames, dim], dtype=dtype) if out is None else out
+
+    # compute the cepstral coefficients and energy
+    d1 = dim0
+    frames_cepstral(
+        frames,
+        win_shift,
+        kernels,
+        pre_emphasis_coef,
+        with_energy,
+        out=features[:, 0:d1],
+        log_energy=None if analysis is None else analysis.log_energy,
+        workspace=workspace,
+    )
 
-    last_frame_elem = 0
-    # compute cepstral coefficients
-    for i in range(n_frames):
-        # create a frame
-        frame = numpy.zeros(win_size, dtype=numpy.float64)
-        vec = numpy.arange(win_length)
-        frame[vec] = data[vec + i * win_shift]
-        som = numpy.sum(frame)
-        som = som / win_size
-        frame[vec] -= som  # normalization by mean here
+    ######################################
+    #     Deltas and Delta-Deltas    ###
+    ######################################
 
-        if with_energy:
-            energy = sig_norm(win_length, frame, False)
+    # compute Delta coefficients (cepstra and energy)
+    if with_delta:
+        delta_features(
+            features[:, 0:d1], delta_win, out=features[:, d1 : 2 * d1]
+        )
 
-        # pre-emphasis filtering
-        frame_, last_frame_elem = pre_emphasis(
-            frame[vec], win_shift, pre_emphasis_coef, last_frame_elem
+    # compute Delta Delta coefficients (cepstra and energy)
+    if with_delta_delta:
+        delta_features(
+            features[:, d1 : 2 * d1],
+            delta_win,
+            out=features[:, 2 * d1 : 3 * d1],
         )
-        frame[vec] = frame_
 
-        # Hamming windowing
-        frame = hamming_window(frame, hamming_kernel, win_length)
+    return features
 
-        # FFT and filters
-        filters, _ = log_filter_bank(
-            frame, n_filters, p_index, win_size, energy_filter=False
-        )
 
-        # apply DCT
-        ceps = dct_transform(filters, n_filters, dct_kernel, n_ceps)
+def cepstral_batch(
+    signals,
+    rate,
+    *,
+    win_length_ms=20,
+    win_shift_ms=10,
+    n_filters=20,
+    f_min=0.0,
+    f_max=4000.0,
+    pre_emphasis_coef=1.0,
+    mel_scale=True,
+    n_ceps=19,
+    delta_win=2,
+    dct_norm=True,
+    with_energy=True,
+    with_delta=True,
+    with_delta_delta=True,
+    dtype=numpy.float64,
+    analyses=None,
+    workspace=None,
+):
+    """Computes the features of :py:func:`cepstral` for several signals at once.
+
+    The frames of all the signals are packed in one matrix, so the FFT, filter
+    bank and DCT run once for the whole batch. The pre-emphasis and the deltas
+    are computed for each signal separately, so each result is equal to the
+    output of :py:func:`cepstral` for that signal.
+
+    Parameters
+    ----------
+    signals:
+        A list of 1D audio signals, all with the sample rate ``rate``.
+    rate:
+        The sample rate of the signals in Hz.
+    analyses:
+        A :py:class:`FrameAnalysis` (or None) for each signal, reused as in
+        :py:func:`cepstral`.
+    workspace:
+        An :py:class:`AnalysisWorkspace` holding the packed frames and the
+        intermediate arrays.
+    kwargs:
+        The parameters of :py:func:`cepstral` (except ``backend``).
+
+    Returns
+    -------
+    features: list of numpy.ndarray
+        The features of each signal.
+    """
+    if len(signals) == 0:
+        return []
 
-        ######################################
-        #     Deltas and Delta-Deltas    ###
-        ######################################
+    win_length, win_shift, win_size = frame_parameters(
+        rate, win_length_ms, win_shift_ms
+    )
+    kernels = analysis_kernels(
+        rate,
+        win_length,
+        win_size,
+        n_filters,
+        f_min,
+        f_max,
+        mel_scale,
+        n_ceps,
+        dct_norm,
+    )
 
-        d1 = n_ceps
+    # pack the frames (and log energies) of all the signals
+    n_frames = [len(frame_signal(s, win_length, win_shift)) for s in signals]
+    offsets = numpy.concatenate([[0], numpy.cumsum(n_frames, dtype=int)])
+    if analyses is None:
+        analyses = [None] * len(signals)
+    frames = _workspace_array(
+        workspace, "frames", (offsets[-1], win_size), dtype
+    )
+    log_energy = numpy.empty(offsets[-1], dtype=dtype) if with_energy else None
+    for signal, analysis, start, end in zip(
+        signals, analyses, offsets[:-1], offsets[1:]
+    ):
+        analysis = _shared_analysis(
+            analysis, signal, rate, win_length, win_shift, end - start
+        )
+        _analysis_frames(
+            signal,
+            analysis,
+            win_length,
+            win_shift,
+            win_size,
+            dtype,
+            out=frames[start:end],
+        )
         if with_energy:
-            d1 = n_ceps + 1
-            ceps = numpy.append(ceps, energy)
+            log_energy[start:end] = (
+                frames_log_energy(frames[start:end])
+                if analysis is None
+                else analysis.log_energy
+            )
 
-        # stock the results in features matrix
-        vec = numpy.arange(d1)
-        features[i][0:d1] = ceps[vec]
+    dim0 = n_ceps + int(with_energy)
+    n_levels = (1 + int(with_delta_delta)) if with_delta else 0
+    features = numpy.zeros((offsets[-1], dim0 * (1 + n_levels)), dtype=dtype)
+
+    # compute the cepstral coefficients and energy
+    frames_cepstral(
+        frames,
+        win_shift,
+        kernels,
+        pre_emphasis_coef,
+        with_energy,
+        out=features[:, 0:dim0],
+        starts=offsets[:-1],
+        log_energy=log_energy,
+        workspace=workspace,
+    )
 
-    # compute Delta coefficient
-    if with_delta:
-        som = 0.0
-        for i in range(1, delta_win + 1):
-            som = som + i * i
-        som = som * 2
-
-        for i in range(n_frames):
-            for k in range(n_ceps):
-                features[i][d1 + k] = 0.0
-                for ll in range(1, delta_win + 1):
-                    if i + ll < n_frames:
-                        p_ind = i + ll
-                    else:
-                        p_ind = n_frames - 1
-                    if i - ll > 0:
-                        n_ind = i - ll
-                    else:
-                        n_ind = 0
-                    features[i][d1 + k] = features[i][d1 + k] + ll * (
-                        features[p_ind][k] - features[n_ind][k]
-                    )
-                # features[i][d1+k] = features[i][d1+k] / som  # do not normalize anymore
-
-    # compute Delta of the Energy
-    if with_delta and with_energy:
-        som = 0.0
-
-        vec = numpy.arange(1, delta_win + 1)
-        som = 2.0 * numpy.sum(vec * vec)
-
-        for i in range(n_frames):
-            k = n_ceps
-            features[i][d1 + k] = 0.0
-            for ll in range(1, delta_win + 1):
-                if i + ll < n_frames:
-                    p_ind = i + ll
-                else:
-                    p_ind = n_frames - 1
-                if i - ll > 0:
-                    n_ind = i - ll
-                else:
-                    n_ind = 0
-                features[i][d1 + k] = features[i][d1 + k] + ll * (
-                    features[p_ind][k] - features[n_ind][k]
-                )
-            # features[i][d1+k] = features[i][d1+k] / som  # do not normalize anymore
-
-    # compute Delta Delta of the coefficients
-    if with_delta_delta:
-        som = 0.0
-        for i in range(1, delta_win + 1):
-            som = som + i * i
-        som = som * 2
-        for i in range(n_frames):
-            for k in range(n_ceps):
-                features[i][2 * d1 + k] = 0.0
-                for ll in range(1, delta_win + 1):
-                    if i + ll < n_frames:
-                        p_ind = i + ll
-                    else:
-                        p_ind = n_frames - 1
-                    if i - ll > 0:
-                        n_ind = i - ll
-                    else:
-                        n_ind = 0
-                    features[i][2 * d1 + k] = features[i][2 * d1 + k] + ll * (
-                        features[p_ind][d1 + k] - features[n_ind][d1 + k]
-                    )
-                # features[i][2*d1+k] = features[i][2*d1+k] / som  # do not normalize anymore
-
-    # compute Delta Delta of the energy
-    if with_delta_delta and with_energy:
-        som = 0.0
-        for i in range(1, delta_win + 1):
-            som = som + i * i
-        som = som * 2
-        for i in range(n_frames):
-            k = n_ceps
-            features[i][2 * d1 + k] = 0.0
-            for ll in range(1, delta_win + 1):
-                if i + ll < n_frames:
-                    p_ind = i + ll
-                else:
-                    p_ind = n_frames - 1
-                if i - ll > 0:
-                    n_ind = i - ll
-                else:
-                    n_ind = 0
-                features[i][2 * d1 + k] = features[i][2 * d1 + k] + ll * (
-                    features[p_ind][d1 + k] - features[n_ind][d1 + k]
-                )
-            # features[i][2*d1+k] = features[i][2*d1+k] / som  # do not normalize anymore
-
-    return numpy.array(features)
+    # compute the deltas and delta-deltas of each signal
+    for level in range(1, n_levels + 1):
+        delta_features(
+            features[:, (level - 1) * dim0 : level * dim0],
+            delta_win,
+            offsets,
+            out=features[:, level * dim0 : (level + 1) * dim0],
+        )
+
+    return numpy.split(features, offsets[1:-1])
+
+
+class CepstralStream:
+    """Computes the features of :py:func:`cepstral` on a signal given in chunks.
+
+    The samples of an incomplete frame, the pre-emphasis state and the frames
+    needed as context for the deltas are kept between the chunks, so that the
+    concatenation of the returned blocks is equal to the features of
+    :py:func:`cepstral` on the whole signal, while only one chunk (and its
+    features) is in memory at a time.
+
+    The frames of a block are returned once their delta context is known
+    (``delta_win`` frames later, or ``2 * delta_win`` with the delta-deltas);
+    the remaining frames are returned by :py:meth:`flush` at the end of the
+    signal.
+
+    Example
+    -------
+    >>> stream = CepstralStream(16000)
+    >>> for chunk in soundfile.blocks(path, blocksize=160000, dtype="int16"):
+    ...     process_block(stream.process(chunk))
+    >>> process_block(stream.flush())
+
+    Parameters
+    ----------
+    rate:
+        The sample rate of the signal in Hz.
+    kwargs:
+        The parameters of :py:func:`cepstral` (except ``backend``).
+    """
+
+    def __init__(
+        self,
+        rate,
+        *,
+        win_length_ms=20,
+        win_shift_ms=10,
+        n_filters=20,
+        f_min=0.0,
+        f_max=4000.0,
+        pre_emphasis_coef=1.0,
+        mel_scale=True,
+        n_ceps=19,
+        delta_win=2,
+        dct_norm=True,
+        with_energy=True,
+        with_delta=True,
+        with_delta_delta=True,
+        dtype=numpy.float64,
+    ):
+        self.rate = rate
+        self.win_length, self.win_shift, self.win_size = frame_parameters(
+            rate, win_length_ms, win_shift_ms
+        )
+        self.kernels = analysis_kernels(
+            rate,
+            self.win_length,
+            self.win_size,
+            n_filters,
+            f_min,
+            f_max,
+            mel_scale,
+            n_ceps,
+            dct_norm,
+        )
+        self.pre_emphasis_coef = pre_emphasis_coef
+        self.delta_win = delta_win
+        self.with_energy = with_energy
+        self.n_deltas = (1 + int(with_delta_delta)) if with_delta else 0
+        self.dtype = dtype
+        # The frames and spectra of each chunk reuse the same buffers
+        self.workspace = AnalysisWorkspace()
+        self.reset()
+
+    def reset(self):
+        """Prepares the stream for a new signal."""
+        self._samples = numpy.zeros(0, dtype=self.dtype)
+        self._last_frame_elem = 0.0
+        # Cepstral coefficients (and energy) of the frames kept as context
+        self._static = numpy.zeros(
+            (0, self.kernels.dct_kernel.shape[0] + int(self.with_energy)),
+            dtype=self.dtype,
+        )
+        # Index of the first frame in `_static` and of the next frame to output
+        self._first_frame = 0
+        self._next_frame = 0
+
+    def _valid_deltas(self, features, first_frame, last_chunk):
+        """Returns the deltas of the frames having their whole context.
+
+        The first frames of the signal and, for the last chunk, the last frames
+        are padded like in :py:func:`delta_features`.
+        """
+        delta_win = self.delta_win
+        pad = (
+            delta_win if first_frame == 0 else 0,
+            delta_win if last_chunk else 0,
+        )
+        if len(features) == 0 or len(features) + sum(pad) <= 2 * delta_win:
+            return features[:0], first_frame + delta_win - pad[0]
+        padded = numpy.pad(features, (pad, (0, 0)), mode="edge")
+        deltas = delta_features(padded, delta_win)[delta_win:-delta_win]
+        return deltas, first_frame + delta_win - pad[0]
+
+    def _features(self, last_chunk):
+        levels = [(self._static, self._first_frame)]
+        for _ in range(self.n_deltas):
+            levels.append(self._valid_deltas(*levels[-1], last_chunk))
+
+        # Frames for which all the levels are available
+        start = self._next_frame
+        end = max(levels[-1][1] + len(levels[-1][0]), start)
+        features = numpy.concatenate(
+            [level[start - first : end - first] for level, first in levels],
+            axis=1,
+        )
+
+        # Keep the context needed by the next frames
+        self._next_frame = end
+        keep_from = max(self._next_frame - self.n_deltas * self.delta_win, 0)
+        self._static = self._static[keep_from - self._first_frame :].copy()
+        self._first_frame = keep_from
+        return features
+
+    def process(self, chunk):
+        """Adds a chunk of the signal and returns the features of new frames.
+
+        Parameters
+        ----------
+        chunk:
+            The next 1D samples of the signal.
+
+        Returns
+        -------
+        features: numpy.ndarray
+            The features of the frames completed by this chunk (possibly none).
+        """
+        samples = numpy.concatenate(
+            [self._samples, numpy.asarray(chunk, dtype=self.dtype)]
+        )
+        frames = normalized_frames(
+            samples,
+            self.win_length,
+            self.win_shift,
+            self.win_size,
+            self.dtype,
+            workspace=self.workspace,
+        )
+        # Copy, to not keep the whole chunk in memory
+        self._samples = samples[len(frames) * self.win_shift :].copy()
+
+        static, self._last_frame_elem = frames_cepstral(
+            frames,
+            self.win_shift,
+            self.kernels,
+            self.pre_emphasis_coef,
+            self.with_energy,
+            self._last_frame_elem,
+            workspace=self.workspace,
+        )
+        self._static = numpy.concatenate([self._static, static])
+        return self._features(last_chunk=False)
+
+    def flush(self):
+        """Returns the features of the last frames and resets the stream."""
+        features = self._features(last_chunk=True)
+        self.reset()
+        return features
@@ -0,0 +1,611 @@
+"""Content-addressed on-disk cache of the features of the front-end.
+
+The features computed by a front-end (e.g. the VAD annotator followed by the
+:py:class:`~bob.bio.spear.extractor.Cepstral` extractor) are stored in a
+directory, under a key derived from the audio file, the parameters of the
+front-end and the version of this package. Experiments using the same front-end
+on the same files (e.g. the GMM, ISV and i-vector pipelines on the same
+database) share the features.
+
+The cache is used in a pipeline with :py:class:`CachedFeatures`, or in the
+default pipelines by setting its directory in the configuration::
+
+    $ bob config set bob.bio.spear.feature_cache.directory /idiap/temp/features
+    $ bob config set bob.bio.spear.feature_cache.max_size 200G
+    $ bob config set bob.bio.spear.feature_cache.codec int8
+
+The cached features are served memory-mapped, or decoded if they are stored
+with a codec (see :py:mod:`bob.bio.spear.codec`). When the size of the cache goes
+over its limit, the least recently used features are removed. The cache is
+inspected and pruned with the ``bob bio feature-cache`` command.
+
+The decoded audio of compressed files (e.g. shorten or u-law SPHERE, FLAC) can
+be cached too, in an :py:class:`AudioCache` used by the sample loaders of the
+databases when its directory is set::
+
+    $ bob config set bob.bio.spear.audio_cache.directory /idiap/temp/audio
+    $ bob config set bob.bio.spear.audio_cache.max_size 500G
+
+The audio cache is pruned with the same command, giving its directory.
+"""
+
+import functools
+import hashlib
+import importlib.metadata
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+
+import click
+import joblib
+import numpy
+
+from clapper.click import verbosity_option
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline
+
+from bob.pipelines import Sample
+from bob.pipelines.wrappers import estimator_requires_fit
+
+from .audio_processing import _frame_range, audio_header
+from .audio_processing import read as read_audio
+from .codec import get_codec
+
+logger = logging.getLogger(__name__)
+
+RC_DIRECTORY = "bob.bio.spear.feature_cache.directory"
+RC_MAX_SIZE = "bob.bio.spear.feature_cache.max_size"
+RC_CODEC = "bob.bio.spear.feature_cache.codec"
+RC_AUDIO_DIRECTORY = "bob.bio.spear.audio_cache.directory"
+RC_AUDIO_MAX_SIZE = "bob.bio.spear.audio_cache.max_size"
+
+# Parameters that do not change the output of an estimator
+FINGERPRINT_EXCLUDED = (
+    "share_analysis",
+    "share_frames",
+    "storage_codec",
+    "max_batch_frames",
+)
+
+_SIZE_UNITS = {"": 1, "K": 2**10, "M": 2**20, "G": 2**30, "T": 2**40}
+
+
+def parse_size(size: Union[int, str, None]) -> Optional[int]:
+    """Returns a size in bytes given as a number or as a string like ``50G``."""
+    if size is None or isinstance(size, int):
+        return size
+    value = str(size).strip().upper().rstrip("B").rstrip("I")
+    unit = value[-1:] if value[-1:] in _SIZE_UNITS else ""
+    try:
+        return int(float(value[: len(value) - len(unit)]) * _SIZE_UNITS[unit])
+    except ValueError:
+        raise ValueError(f"Invalid size '{size}', expected e.g. 500M or 50G.")
+
+
+def _version():
+    try:
+        return importlib.metadata.version("bob.bio.spear")
+    except importlib.metadata.PackageNotFoundError:
+        return "unknown"
+
+
+def fingerprint(estimator) -> str:
+    """Returns a digest of the class and parameters of an estimator.
+
+    The parameters are inspected recursively (e.g. the steps of a pipeline or
+    the estimator of a wrapper), so that the fitted state and the private
+    attributes of the estimators do not change the digest. The parameters of
+    :py:data:`FINGERPRINT_EXCLUDED`, which only change how the output is
+    computed or stored, are ignored.
+    """
+
+    def description(value):
+        if hasattr(value, "get_params") and not isinstance(value, type):
+            return {
+                "class": f"{type(value).__module__}.{type(value).__qualname__}",
+                "params": {
+                    name: description(param)
+                    for name, param in sorted(
+                        value.get_params(deep=False).items()
+                    )
+                    if name not in FINGERPRINT_EXCLUDED
+                },
+            }
+        if isinstance(value, (list, tuple)):
+            return [description(v) for v in value]
+        return joblib.hash(value)
+
+    return hashlib.blake2b(
+        json.dumps(description(estimator), sort_keys=True).encode(),
+        digest_size=16,
+    ).hexdigest()
+
+
+def audio_digest(data: numpy.ndarray, rate: Optional[float] = None) -> str:
+    """Returns a digest of the content of an audio signal."""
+    data = numpy.ascontiguousarray(data)
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{data.dtype.str}{data.shape}{rate}".encode())
+    digest.update(data.view(numpy.uint8).reshape(-1))
+    return digest.hexdigest()
+
+
+def _audio_key(sample) -> Optional[str]:
+    """Returns a digest identifying the audio of a sample without loading it.
+
+    The audio of the samples of
+    :py:class:`~bob.bio.spear.transformer.PathToAudio` (or read from shards) is
+    identified by their ``audio_key`` attribute: the file (path, modification
+    time and size) and the parameters of the loader (rate, segment, ...).
+    Returns None for the other samples.
+    """
+    key = getattr(sample, "audio_key", None)
+    if key is None:
+        return None
+    return joblib.hash(key)
+
+
+def _entry_key(audio, frontend):
+    return hashlib.blake2b(
+        f"{audio}-{frontend}".encode(), digest_size=20
+    ).hexdigest()
+
+
+class Entry(NamedTuple):
+    """A file of the cache."""
+
+    path: Path
+    size: int
+    last_use: float
+    """Time of the last write or read (seconds since the epoch)."""
+
+
+class FeatureCache:
+    """A directory of features stored by key, with a least recently used limit.
+
+    Each entry is a ``.npy`` file (``.npz`` if encoded) in a sub-directory
+    named after the first characters of its key. The files are written atomically, so several
+    processes (e.g. dask workers) can share a cache. The time of the last use
+    of an entry is kept as the modification time of its file.
+
+    Parameters
+    ----------
+    directory:
+        The directory of the cache (created if needed).
+    max_size:
+        The maximum size of the cache in bytes (or as a string like ``50G``).
+        When it is exceeded, the least recently used entries are removed until
+        the cache is below 90% of this size. No limit if None. The size of the
+        cache is read from the disk once, then tracked by each process with its
+        own writes, so the entries written by other processes are only counted
+        at the next eviction.
+    codec:
+        The name of the codec storing the new entries in a compact form (e.g.
+        ``"float16"`` or ``"int8"``), or None to store them as they are.
+    """
+
+    low_watermark = 0.9
+
+    def __init__(self, directory, max_size=None, codec=None):
+        self.directory = Path(directory)
+        self.max_size = parse_size(max_size)
+        self.codec = get_codec(codec)
+        self._size = None
+
+    def path(self, key: str) -> Path:
+        """Returns the path of the file of an entry."""
+        suffix = ".npy" if self.codec is None else ".npz"
+        return self.directory / key[:2] / f"{key}{suffix}"
+
+    def _load(self, path):
+        if self.codec is None:
+            return numpy.load(path, mmap_mode="r")
+        with numpy.load(path) as f:
+            encoded = dict(f)
+        return get_codec(str(encoded.pop("codec"))).decode(encoded)
+
+    def get(self, key: str) -> Optional[numpy.ndarray]:
+        """Returns the features of a key, or None if missing."""
+        path = self.path(key)
+        try:
+            features = self._load(path)
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            logger.warning("Removing the invalid cache entry %s: %s", path, e)
+            path.unlink(missing_ok=True)
+            return None
+        return features
+
+    def put(self, key: str, features: numpy.ndarray):
+        """Stores the features of a key, evicting old entries if needed."""
+        path = self.path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=path.parent, suffix=".tmp", delete=False
+        ) as f:
+            if self.codec is None:
+                numpy.save(f, numpy.asarray(features), allow_pickle=False)
+            else:
+                numpy.savez(
+                    f, codec=self.codec.name, **self.codec.encode(features)
+                )
+        try:
+            replaced = path.stat().st_size
+        except FileNotFoundError:
+            replaced = 0
+        os.replace(f.name, path)
+
+        if self.max_size is None:
+            return
+        if self._size is None:
+            self._size = self.size()
+        else:
+            self._size += path.stat().st_size - replaced
+        if self._size > self.max_size:
+            self.evict(int(self.max_size * self.low_watermark))
+
+    def entries(self) -> "list[Entry]":
+        """Returns the entries of the cache, the least recently used first."""
+        entries = []
+        for path in self.directory.glob("*/*.np[yz]"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:  # removed by another process
+                continue
+            entries.append(Entry(path, stat.st_size, stat.st_mtime))
+        return sorted(entries, key=lambda entry: entry.last_use)
+
+    def size(self) -> int:
+        """Returns the total size of the entries in bytes."""
+        return sum(entry.size for entry in self.entries())
+
+    def evict(self, max_size: int = 0, older_than: Optional[float] = None):
+        """Removes the least recently used entries.
+
+        Parameters
+        ----------
+        max_size:
+            The size in bytes to bring the cache down to.
+        older_than:
+            If not None, also removes the entries not used for this number of
+            seconds.
+
+        Returns
+        -------
+        removed: list of Entry
+            The removed entries.
+        """
+        entries = self.entries()
+        size = sum(entry.size for entry in entries)
+        limit = time.time() - older_than if older_than is not None else None
+        removed = []
+        for entry in entries:
+            if size <= max_size and (limit is None or entry.last_use >= limit):
+                break
+            entry.path.unlink(missing_ok=True)
+            size -= entry.size
+            removed.append(entry)
+        self._size = size
+        logger.debug(
+            "Removed %d entries from the cache %s.",
+            len(removed),
+            self.directory,
+        )
+        return removed
+
+    def clear(self):
+        """Removes all the entries."""
+        for directory in self.directory.glob("??"):
+            shutil.rmtree(directory, ignore_errors=True)
+        self._size = 0
+
+
+class CachedFeatures(BaseEstimator, TransformerMixin):
+    """Serves the features of a front-end from a :py:class:`FeatureCache`.
+
+    The samples are transformed by ``transformer`` only when their features are
+    not in the cache. The key of a sample is a digest of its ``audio_key``
+    (given by :py:class:`~bob.bio.spear.transformer.PathToAudio`: the path,
+    modification time and size of its file and the parameters of its loading,
+    e.g. rate, segment and ``max_duration``), of the parameters of
+    ``transformer`` and of the version of this package, so the audio is not
+    decoded when its features are in the cache. The audio of the samples
+    without ``audio_key`` is identified by a digest of its data and rate
+    instead. The ``audio_key`` does not follow the transformations of the
+    audio, so the samples must be given as they are loaded.
+
+    >>> frontend = Pipeline(
+    ...     [
+    ...         ("annotator", wrap(["sample"], Energy_2Gauss())),
+    ...         ("extractor", wrap(["sample"], Cepstral())),
+    ...     ]
+    ... )
+    >>> cached = CachedFeatures(frontend, "features/", max_size="50G")
+
+    Parameters
+    ----------
+    transformer:
+        The front-end, transforming samples (e.g. a pipeline of sample-wrapped
+        transformers).
+    directory:
+        The directory of the cache.
+    max_size:
+        The maximum size of the cache (see :py:class:`FeatureCache`).
+    codec:
+        The codec of the cached features (see :py:class:`FeatureCache`).
+    """
+
+    def __init__(self, transformer, directory, max_size=None, codec=None):
+        super().__init__()
+        self.transformer = transformer
+        self.directory = directory
+        self.max_size = max_size
+        self.codec = codec
+
+    @property
+    def cache(self):
+        cache = getattr(self, "_cache", None)
+        if cache is None or (cache.directory, cache.max_size, cache.codec,) != (
+            Path(self.directory),
+            parse_size(self.max_size),
+            get_codec(self.codec),
+        ):
+            cache = self._cache = FeatureCache(
+                self.directory, self.max_size, self.codec
+            )
+        return cache
+
+    def transform(self, samples):
+        cache = self.cache
+        frontend = f"{fingerprint(self.transformer)}-{_version()}"
+        output, missing, keys = [], [], []
+        for sample in samples:
+            audio = _audio_key(sample)
+            if audio is None:
+                # Load the audio once, for the key and the front-end
+                sample = Sample(sample.data, parent=sample)
+                audio = audio_digest(sample.data, getattr(sample, "rate", None))
+            key = _entry_key(audio, frontend)
+            features = cache.get(key)
+            if features is None:
+                missing.append(len(output))
+                keys.append(key)
+                output.append(sample)
+            else:
+                output.append(Sample(features, parent=sample))
+
+        logger.debug(
+            "%d of %d samples found in the feature cache.",
+            len(output) - len(missing),
+            len(output),
+        )
+        if missing:
+            computed = self.transformer.transform([output[i] for i in missing])
+            for i, key, sample in zip(missing, keys, computed):
+                cache.put(key, sample.data)
+                output[i] = sample
+        return output
+
+    def fit(self, X, y=None):
+        if estimator_requires_fit(self.transformer):
+            self.transformer.fit(X, y)
+        return self
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_cache", None)
+        return state
+
+    def _more_tags(self):
+        return {
+            "requires_fit": estimator_requires_fit(self.transformer),
+        }
+
+
+def cached_frontend(steps):
+    """Caches the front-end steps of a pipeline, if a cache is configured.
+
+    Parameters
+    ----------
+    steps:
+        The ``(name, transformer)`` steps of the front-end, transforming
+        samples.
+
+    Returns
+    -------
+    steps:
+        ``steps`` if the ``bob.bio.spear.feature_cache.directory`` setting is
+        not set, or a single ``frontend`` step caching them.
+    """
+    from .database.utils import get_rc
+
+    directory = get_rc().get(RC_DIRECTORY)
+    if directory is None:
+        return steps
+    max_size, codec = get_rc().get(RC_MAX_SIZE), get_rc().get(RC_CODEC)
+    logger.info("Using the feature cache in %s.", directory)
+    return [
+        (
+            "frontend",
+            CachedFeatures(Pipeline(steps), directory, max_size, codec),
+        )
+    ]
+
+
+class AudioCache(FeatureCache):
+    """A :py:class:`FeatureCache` of decoded (and resampled) audio.
+
+    The signals are stored as int16 ``.npy`` files and read memory-mapped, so
+    only the frames of the requested segments are read from the disk. The key
+    of an entry is the path, modification time and size of the file, the
+    channel and the rate. The resampled signals are rounded (and clipped) to
+    int16.
+
+    Parameters
+    ----------
+    directory:
+        The directory of the cache (created if needed).
+    max_size:
+        The maximum size of the cache (see :py:class:`FeatureCache`).
+    """
+
+    def __init__(self, directory, max_size=None):
+        super().__init__(directory, max_size)
+
+    def __reduce__(self):
+        # Shares the cache (and its size count) of the process once unpickled
+        return get_audio_cache, (str(self.directory), self.max_size)
+
+    @staticmethod
+    def key(filename, channel=None, rate=None) -> str:
+        """Returns the key of a channel of a file, at a rate (None if native)."""
+        stat = os.stat(filename)
+        return hashlib.blake2b(
+            f"{os.path.abspath(filename)}-{stat.st_mtime_ns}-{stat.st_size}-"
+            f"{channel}-{rate}".encode(),
+            digest_size=20,
+        ).hexdigest()
+
+    def read(
+        self,
+        filename: str,
+        channel: Optional[int] = None,
+        force_sample_rate: Optional[int] = None,
+        backend: Optional[str] = None,
+        offset: Optional[float] = None,
+        duration: Optional[float] = None,
+        unit: str = "seconds",
+    ):
+        """Reads a file like :py:func:`bob.bio.spear.audio_processing.read`.
+
+        The whole channel is decoded and stored on a miss, and the segments
+        are cut from the stored signal (after resampling if any).
+        """
+        channel = 0 if channel is None else channel
+        key = self.key(filename, channel, force_sample_rate)
+        signal = self.get(key)
+        if signal is None:
+            data, _ = read_audio(filename, channel, force_sample_rate, backend)
+            numpy.clip(numpy.rint(data, out=data), -32768, 32767, out=data)
+            self.put(key, data.astype(numpy.int16))
+            signal = self.get(key)
+            if signal is None:  # evicted at once (cache smaller than the file)
+                signal = data
+
+        file_rate = audio_header(filename).sample_rate
+        rate = file_rate if force_sample_rate is None else force_sample_rate
+        if offset is not None or duration is not None:
+            start, n_frames = _frame_range(file_rate, offset, duration, unit)
+            start = int(round(start * rate / file_rate))
+            stop = (
+                None
+                if n_frames is None
+                else start + int(round(n_frames * rate / file_rate))
+            )
+            signal = signal[start:stop]
+        return numpy.array(signal, dtype=numpy.float32), rate
+
+
+@functools.lru_cache(maxsize=None)
+def _audio_cache(directory, max_size):
+    return AudioCache(directory, max_size)
+
+
+def get_audio_cache(directory, max_size=None) -> AudioCache:
+    """Returns the :py:class:`AudioCache` of a directory (one per process)."""
+    return _audio_cache(str(directory), parse_size(max_size))
+
+
+def _format_size(size):
+    for unit in ("", "K", "M", "G", "T"):
+        if size < 1024 or unit == "T":
+            return f"{size:.1f} {unit}iB" if unit else f"{size} B"
+        size /= 1024
+
+
+def _directory_option():
+    def callback(ctx, param, value):
+        if value is None:
+            from .database.utils import get_rc
+
+            value = get_rc().get(RC_DIRECTORY)
+        if value is None:
+            raise click.BadParameter(
+                f"No directory given and `{RC_DIRECTORY}` is not set."
+            )
+        return value
+
+    return click.option(
+        "--directory",
+        "-d",
+        callback=callback,
+        help=f"The cache directory (defaults to the `{RC_DIRECTORY}` setting).",
+    )
+
+
+@click.group()
+def feature_cache():
+    """Inspects and prunes the cache of the front-end features."""
+
+
+@feature_cache.command()
+@_directory_option()
+@verbosity_option(logger=logger, expose_value=False)
+def info(directory):
+    """Shows the number of entries and the size of the feature cache."""
+    entries = FeatureCache(directory).entries()
+    click.echo(f"Directory: {directory}")
+    click.echo(f"Entries: {len(entries)}")
+    click.echo(f"Size: {_format_size(sum(e.size for e in entries))}")
+    if entries:
+        for name, entry in (("Oldest", entries[0]), ("Newest", entries[-1])):
+            used = time.strftime(
+                "%Y-%m-%d %H:%M:%S", time.localtime(entry.last_use)
+            )
+            click.echo(f"{name} use: {used}")
+
+
+@feature_cache.command()
+@_directory_option()
+@click.option(
+    "--max-size",
+    "-s",
+    help="Removes the least recently used entries above this size (e.g. 50G).",
+)
+@click.option(
+    "--older-than",
+    "-o",
+    type=float,
+    help="Removes the entries not used for this number of days.",
+)
+@verbosity_option(logger=logger, expose_value=False)
+def prune(directory, max_size, older_than):
+    """Removes the least recently used entries of the feature cache."""
+    if max_size is None and older_than is None:
+        raise click.UsageError("Give --max-size and/or --older-than.")
+    cache = FeatureCache(directory)
+    max_size = parse_size(max_size) if max_size is not None else cache.size()
+    removed = cache.evict(
+        max_size, older_than * 86400 if older_than is not None else None
+    )
+    click.echo(
+        f"Removed {len(removed)} entries "
+        f"({_format_size(sum(e.size for e in removed))})."
+    )
+
+
+@feature_cache.command()
+@_directory_option()
+@click.confirmation_option(prompt="Remove all the cached features?")
+@verbosity_option(logger=logger, expose_value=False)
+def clear(directory):
+    """Removes all the entries of the feature cache."""
+    FeatureCache(directory).clear()
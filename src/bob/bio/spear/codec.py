@@ -0,0 +1,210 @@
+"""Compact storage of features and annotations.
+
+After normalization, the cepstral features are zero-mean and unit-variance, so
+they are stored with little loss in half precision (``"float16"``, 4x smaller
+than float64), or in 8 bits with a scale and offset per dimension and per
+utterance (``"int8"``, 8x smaller). The VAD labels are packed in bits
+(``"bits"``, lossless).
+
+The codecs are used for the checkpoints of the transformers by setting their
+``storage_codec`` parameter, and for the feature cache (see
+:py:mod:`bob.bio.spear.cache`). The checkpoints are decoded transparently by
+:py:func:`load`, which also reads the checkpoints written without codec.
+
+The reconstruction error of a codec on some features is given by
+:py:meth:`FeatureCodec.error` (and logged at the debug level when saving). On
+the normalized MFCC60 features, the RMS error is about 2e-4 with float16 and
+7e-3 with int8:
+
+>>> get_codec("int8").error(features)
+CodecError(max_abs=0.0166..., rms=0.0070..., relative_rms=0.0070...)
+"""
+
+import logging
+
+from typing import NamedTuple, Optional
+
+import h5py
+import numpy
+
+logger = logging.getLogger(__name__)
+
+
+class CodecError(NamedTuple):
+    """The reconstruction error of a codec on some features."""
+
+    max_abs: float
+    rms: float
+    relative_rms: float
+    """The RMS error divided by the RMS of the features."""
+
+
+class FeatureCodec:
+    """Encodes arrays in a compact form, in several named arrays."""
+
+    name = None
+
+    def encode(self, features: numpy.ndarray) -> "dict[str, numpy.ndarray]":
+        raise NotImplementedError
+
+    def decode(self, encoded: "dict[str, numpy.ndarray]") -> numpy.ndarray:
+        raise NotImplementedError
+
+    def error(self, features: numpy.ndarray) -> CodecError:
+        """Returns the error of encoding and decoding ``features``."""
+        features = numpy.asarray(features, dtype=numpy.float64)
+        if features.size == 0:
+            return CodecError(0.0, 0.0, 0.0)
+        difference = self.decode(self.encode(features)) - features
+        rms = float(numpy.sqrt(numpy.mean(difference**2)))
+        reference = float(numpy.sqrt(numpy.mean(features**2)))
+        return CodecError(
+            float(numpy.abs(difference).max()),
+            rms,
+            rms / reference if reference else 0.0,
+        )
+
+    def save(self, features, path):
+        """Writes encoded features in an HDF5 file, to be read by :py:func:`load`.
+
+        ``None`` (e.g. the annotations of an utterance without speech) is saved
+        too.
+        """
+        with h5py.File(path, "w") as f:
+            f.attrs["codec"] = self.name
+            if features is None:
+                f.attrs["none"] = True
+                return
+            for name, array in self.encode(features).items():
+                f[name] = array
+        if logger.isEnabledFor(logging.DEBUG) and self.name != "bits":
+            logger.debug("Saved %s with error %s.", path, self.error(features))
+
+
+class Float16Codec(FeatureCodec):
+    """Stores the features in half precision."""
+
+    name = "float16"
+
+    def encode(self, features):
+        features = numpy.asarray(features)
+        return {
+            "array": features.astype(numpy.float16),
+            "dtype": numpy.bytes_(features.dtype.str),
+        }
+
+    def decode(self, encoded):
+        return encoded["array"].astype(_dtype(encoded))
+
+
+class Int8Codec(FeatureCodec):
+    """Stores the features in 8 bits, with a scale and offset per dimension.
+
+    The values of each dimension (last axis) are mapped linearly from their
+    range in the utterance to ``[-127, 127]``. The values of a 1D array (e.g.
+    a score per frame) are a single dimension.
+    """
+
+    name = "int8"
+
+    def encode(self, features):
+        features = numpy.asarray(features)
+        # The values of a 1D array share their scale and offset
+        columns = features.reshape(-1, 1) if features.ndim < 2 else features
+        if features.size == 0:
+            minimum = maximum = numpy.zeros(columns.shape[-1:])
+        else:
+            axes = tuple(range(columns.ndim - 1))
+            minimum, maximum = columns.min(axis=axes), columns.max(axis=axes)
+        offset = (maximum + minimum) / 2
+        scale = (maximum - minimum) / 254
+        scale[scale == 0] = 1
+        quantized = numpy.rint((features - offset) / scale)
+        return {
+            "array": numpy.clip(quantized, -127, 127).astype(numpy.int8),
+            "scale": scale.astype(numpy.float64),
+            "offset": offset.astype(numpy.float64),
+            "dtype": numpy.bytes_(features.dtype.str),
+        }
+
+    def decode(self, encoded):
+        array = encoded["array"]
+        features = array * encoded["scale"] + encoded["offset"]
+        return features.reshape(array.shape).astype(_dtype(encoded), copy=False)
+
+
+class BitsCodec(FeatureCodec):
+    """Packs labels of 0 and 1 (e.g. VAD labels) in bits, without loss."""
+
+    name = "bits"
+
+    def encode(self, labels):
+        labels = numpy.asarray(labels)
+        if labels.size and not numpy.isin(labels, (0, 1)).all():
+            raise ValueError("The bits codec only stores labels of 0 and 1.")
+        return {
+            "array": numpy.packbits(labels.astype(bool).reshape(-1)),
+            "shape": numpy.array(labels.shape, dtype=numpy.int64),
+            "dtype": numpy.bytes_(labels.dtype.str),
+        }
+
+    def decode(self, encoded):
+        shape = tuple(encoded["shape"])
+        labels = numpy.unpackbits(
+            encoded["array"], count=int(numpy.prod(shape))
+        )
+        return labels.reshape(shape).astype(_dtype(encoded))
+
+
+def _dtype(encoded):
+    dtype = encoded["dtype"]
+    if isinstance(dtype, numpy.ndarray):
+        dtype = dtype.item()
+    if isinstance(dtype, bytes):
+        dtype = dtype.decode()
+    return numpy.dtype(dtype)
+
+
+CODECS = {
+    codec.name: codec for codec in (Float16Codec(), Int8Codec(), BitsCodec())
+}
+
+
+def get_codec(name: Optional[str]) -> Optional[FeatureCodec]:
+    """Returns the codec of a name (``"float16"``, ``"int8"`` or ``"bits"``).
+
+    Returns None if ``name`` is None.
+    """
+    if name is None:
+        return None
+    if name not in CODECS:
+        raise ValueError(
+            f"Unknown codec '{name}', expected one of {tuple(CODECS)}."
+        )
+    return CODECS[name]
+
+
+def load(path):
+    """Reads the features saved by :py:meth:`FeatureCodec.save`.
+
+    The HDF5 files without codec (e.g. written by :py:func:`bob.io.base.save`)
+    are read as is.
+    """
+    with h5py.File(path, "r") as f:
+        name = f.attrs.get("codec")
+        if name is None:
+            return f["array"][()]
+        if f.attrs.get("none", False):
+            return None
+        encoded = {key: f[key][()] for key in f.keys()}
+    return get_codec(name.decode() if isinstance(name, bytes) else name).decode(
+        encoded
+    )
+
+
+def checkpoint_tags(storage_codec: Optional[str]) -> dict:
+    """Returns the tags making the checkpoints of a transformer use a codec."""
+    codec = get_codec(storage_codec)
+    if codec is None:
+        return {}
+    return {"bob_features_save_fn": codec.save, "bob_features_load_fn": load}
@@ -37,6 +37,11 @@ subfolders:
     - ``nist_sre/SRE06``: used for training.
     - ``nist_sre/SRE08``: used for training.
     - ``nist_sre/SRE10``: used for training.
+
+The 8 kHz telephone files are resampled to 16 kHz. Set ``min_native_sample_rate``
+in a configuration file (e.g. to 8000 with ``Cepstral(reference_rate=16000)``,
+whose filter bank stops at 4 kHz) to compute the features at the rate of the
+files instead.
 """
 
 from bob.bio.spear.database import NistSRE04To16Database
@@ -44,4 +49,9 @@ from bob.bio.spear.database import NistSRE04To16Database
 if "protocol" not in locals():
     protocol = "core"
 
-database = NistSRE04To16Database(protocol=protocol)
+if "min_native_sample_rate" not in locals():
+    min_native_sample_rate = None
+
+database = NistSRE04To16Database(
+    protocol=protocol, min_native_sample_rate=min_native_sample_rate
+)
@@ -18,6 +18,7 @@ from sklearn.pipeline import Pipeline
 from bob.bio.base.algorithm import GMM
 from bob.bio.base.pipelines import PipelineSimple
 from bob.bio.spear.annotator import Energy_2Gauss
+from bob.bio.spear.cache import cached_frontend
 from bob.bio.spear.extractor import Cepstral
 from bob.learn.em import KMeansMachine
 from bob.pipelines import wrap
@@ -44,13 +45,16 @@ bioalgorithm = GMM(
     random_state=2,
 )
 
-# Transformer part of PipelineSimple
+# Transformer part of PipelineSimple (the front-end features are shared with
+# the other pipelines if `bob.bio.spear.feature_cache.directory` is set)
 transformer = Pipeline(
-    [
-        ("annotator", wrap(["sample"], Energy_2Gauss())),
-        ("extractor", wrap(["sample"], Cepstral())),
-        ("algorithm_trainer", wrap(["sample"], bioalgorithm)),
-    ]
+    cached_frontend(
+        [
+            ("annotator", wrap(["sample"], Energy_2Gauss(share_analysis=True))),
+            ("extractor", wrap(["sample"], Cepstral())),
+        ]
+    )
+    + [("algorithm_trainer", wrap(["sample"], bioalgorithm))]
 )
 
 
@@ -46,7 +46,7 @@ bioalgorithm = GMM(
 # Transformer part of PipelineSimple
 transformer = Pipeline(
     [
-        ("annotator", wrap(["sample"], Energy_2Gauss())),
+        ("annotator", wrap(["sample"], Energy_2Gauss(share_analysis=True))),
         ("extractor", wrap(["sample"], Cepstral())),
         ("algorithm_trainer", wrap(["sample"], bioalgorithm)),
     ]
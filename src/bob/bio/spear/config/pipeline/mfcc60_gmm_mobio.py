@@ -47,7 +47,7 @@ bioalgorithm = GMM(
 # Transformer part of PipelineSimple
 transformer = Pipeline(
     [
-        ("annotator", wrap(["sample"], Mod_4Hz())),
+        ("annotator", wrap(["sample"], Mod_4Hz(share_analysis=True))),
         ("extractor", wrap(["sample"], Cepstral())),
         ("algorithm_trainer", wrap(["sample"], bioalgorithm)),
     ]
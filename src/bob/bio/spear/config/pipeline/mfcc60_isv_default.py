@@ -7,6 +7,7 @@ from sklearn.pipeline import Pipeline
 from bob.bio.base.algorithm import GMM, ISV
 from bob.bio.base.pipelines import PipelineSimple
 from bob.bio.spear.annotator import Energy_2Gauss
+from bob.bio.spear.cache import cached_frontend
 from bob.bio.spear.extractor import Cepstral
 from bob.bio.spear.transformer import ReferenceIdEncoder
 from bob.learn.em import KMeansMachine
@@ -38,15 +39,20 @@ bioalgorithm = ISV(
     ubm=ubm,
 )
 
+# Transformer part of PipelineSimple (the front-end features are shared with
+# the other pipelines if `bob.bio.spear.feature_cache.directory` is set)
 transformer = Pipeline(
-    [
-        ("annotator", Energy_2Gauss()),
-        ("extractor", Cepstral()),
-        ("ubm", ubm),
-        ("template_id_encoder", ReferenceIdEncoder()),
-        ("isv", bioalgorithm),
+    cached_frontend(
+        [
+            ("annotator", wrap(["sample"], Energy_2Gauss(share_analysis=True))),
+            ("extractor", wrap(["sample"], Cepstral())),
+        ]
+    )
+    + [
+        ("ubm", wrap(["sample"], ubm)),
+        ("template_id_encoder", wrap(["sample"], ReferenceIdEncoder())),
+        ("isv", wrap(["sample"], bioalgorithm)),
     ]
 )
-transformer = wrap(["sample"], transformer)
 
 pipeline = PipelineSimple(transformer, bioalgorithm)
@@ -40,7 +40,7 @@ bioalgorithm = ISV(
 
 transformer = Pipeline(
     [
-        ("annotator", Energy_2Gauss()),
+        ("annotator", Energy_2Gauss(share_analysis=True)),
         ("extractor", Cepstral()),
         ("ubm", ubm),
         ("template_id_encoder", ReferenceIdEncoder()),
@@ -61,7 +61,7 @@ class LengthNorm(BaseEstimator):
 # Transformer part of PipelineSimple
 transformer = Pipeline(
     [
-        ("annotator", wrap(["sample"], Energy_2Gauss())),
+        ("annotator", wrap(["sample"], Energy_2Gauss(share_analysis=True))),
         ("extractor", wrap(["sample"], Cepstral())),
         ("ubm", wrap(["sample"], ubm)),
         ("ivector", wrap(["sample"], ivector_transformer)),
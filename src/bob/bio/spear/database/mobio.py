@@ -20,5 +20,6 @@ class MobioDatabase(CSVDatabase):
             protocol=protocol,
             transformer=create_sample_loader(
                 data_path=get_rc().get("bob.db.mobio.audio.directory", None),
+                shards_path=get_rc().get(f"bob.db.{self.name}.shards"),
             ),
         )
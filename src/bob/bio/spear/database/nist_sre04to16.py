@@ -3,7 +3,12 @@ from bob.bio.spear.database.utils import create_sample_loader, get_rc
 
 
 class NistSRE04To16Database(CSVDatabase):
-    """NIST-SRE (2004 - 2016) database definition."""
+    """NIST-SRE (2004 - 2016) database definition.
+
+    The files are resampled to 16 kHz, except those of ``min_native_sample_rate``
+    or higher if given (see
+    :py:func:`~bob.bio.spear.database.utils.create_sample_loader`).
+    """
 
     name = "nist_sre04to16"
     category = "spear"
@@ -14,7 +19,7 @@ class NistSRE04To16Database(CSVDatabase):
     ]
     dataset_protocols_hash = "8bebb8d3"
 
-    def __init__(self, protocol):
+    def __init__(self, protocol, min_native_sample_rate=None):
         super().__init__(
             name=self.name,
             protocol=protocol,
@@ -22,5 +27,7 @@ class NistSRE04To16Database(CSVDatabase):
                 data_path=get_rc()[f"bob.db.{self.name}.directory"],
                 data_ext=".sph",
                 force_sample_rate=16000,
+                min_native_sample_rate=min_native_sample_rate,
+                shards_path=get_rc().get(f"bob.db.{self.name}.shards"),
             ),
         )
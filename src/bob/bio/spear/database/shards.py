@@ -0,0 +1,256 @@
+"""Audio of a database packed in a few large shards.
+
+Reading millions of small files (e.g. VoxCeleb2 or NIST SRE) one by one makes
+the file system the bottleneck. The audio of a database can instead be decoded
+once and packed as int16 PCM in large shards, with the ``bob db pack-audio``
+command::
+
+    $ bob db pack-audio voxceleb /idiap/temp/voxceleb-shards/
+    $ bob config set bob.db.voxceleb.shards /idiap/temp/voxceleb-shards/
+
+The shards are a :py:class:`~bob.bio.spear.feature_store.FeatureStore` indexed by
+the keys of the samples, with their sample rate. When the ``shards`` setting of
+a database is set, its samples are read from the shards by
+:py:class:`PackedAudioLoader`, each with a single read of a contiguous byte
+range.
+"""
+
+import logging
+
+from pathlib import Path
+
+import click
+import numpy
+
+from clapper.click import verbosity_option
+from sklearn.base import BaseEstimator, TransformerMixin
+from tqdm import tqdm
+
+from bob.bio.spear import instrumentation
+from bob.bio.spear.audio_processing import resample
+from bob.bio.spear.cache import parse_size
+from bob.bio.spear.feature_store import FeatureStore
+from bob.bio.spear.transformer import PathToAudio
+from bob.pipelines import DelayedSample
+
+logger = logging.getLogger(__name__)
+
+
+def pack_audio(samples, directory, shard_size=2**30, flush_every=1000):
+    """Packs the audio of samples in the shards of a directory.
+
+    The samples already in the shards (by key) are skipped, so the packing
+    can be resumed, or extended with the samples of another protocol.
+
+    Parameters
+    ----------
+    samples:
+        Samples with the audio in ``data`` (in int16 range) and its ``rate``.
+    directory:
+        The directory of the shards.
+    shard_size:
+        The size of the shards in bytes.
+    flush_every:
+        The number of samples after which the index is written, so an
+        interrupted packing keeps the samples written so far.
+
+    Returns
+    -------
+    n_packed: int
+        The number of samples added to the shards.
+    """
+    store = FeatureStore(directory, shard_size)
+    n_packed = 0
+    for sample in samples:
+        if sample.key in store:
+            continue
+        data = numpy.clip(numpy.rint(sample.data), -32768, 32767)
+        store.append(
+            sample.key,
+            data.astype(numpy.int16).reshape(-1, 1),
+            {"rate": int(sample.rate)},
+        )
+        n_packed += 1
+        if n_packed % flush_every == 0:
+            store.flush()
+    store.close()
+    return n_packed
+
+
+class PackedAudio:
+    """Reads a signal from a shard (in one read), resampling it if needed."""
+
+    def __init__(self, path, offset, n_samples, native_rate, target_sr=None):
+        self.path = path
+        self.offset = offset
+        self.n_samples = n_samples
+        self.native_rate = native_rate
+        self.target_sr = target_sr
+
+    def audio_key(self) -> tuple:
+        """Identifies the signal (the shards are only appended to)."""
+        return (self.path, self.offset, self.n_samples, self.target_sr)
+
+    def data(self) -> numpy.ndarray:
+        with instrumentation.measure("PackedAudio") as stage:
+            data = numpy.fromfile(
+                self.path,
+                dtype=numpy.int16,
+                count=self.n_samples,
+                offset=self.offset * numpy.dtype(numpy.int16).itemsize,
+            ).astype(numpy.float32)
+            stage.set(audio_duration=len(data) / self.native_rate)
+            if self.target_sr is not None and len(data):
+                data = resample(data, self.native_rate, self.target_sr)
+        return data
+
+    def rate(self) -> int:
+        return self.native_rate if self.target_sr is None else self.target_sr
+
+
+class PackedAudioLoader(BaseEstimator, TransformerMixin):
+    """Loads the audio of samples from shards written by :py:func:`pack_audio`.
+
+    Replaces the loading of the files (e.g. ``FileSampleLoader`` followed by
+    :py:class:`~bob.bio.spear.transformer.PathToAudio`): the audio of each
+    sample is found by its key in the index of the shards.
+
+    Parameters
+    ----------
+    directory:
+        The directory of the shards.
+    forced_sr:
+        If not None, the audio is resampled to this rate.
+    min_native_sr:
+        If not None, the audio of this rate or higher is not resampled to
+        ``forced_sr`` (see :py:class:`~bob.bio.spear.transformer.PathToAudio`).
+    max_duration:
+        If not None, the audio is cropped to this duration in seconds (only
+        the samples of this duration are read).
+    """
+
+    def __init__(
+        self, directory, forced_sr=None, min_native_sr=None, max_duration=None
+    ):
+        super().__init__()
+        self.directory = directory
+        self.forced_sr = forced_sr
+        self.min_native_sr = min_native_sr
+        self.max_duration = max_duration
+
+    @property
+    def store(self):
+        store = getattr(self, "_store", None)
+        if store is None or store.directory != Path(self.directory):
+            store = self._store = FeatureStore(self.directory)
+        return store
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_store", None)
+        return state
+
+    def _target_sr(self, rate):
+        if self.min_native_sr is not None and rate >= self.min_native_sr:
+            return None
+        return self.forced_sr
+
+    def transform(self, samples):
+        store = self.store
+        output = []
+        for sample in samples:
+            try:
+                location = store.location(sample.key)
+            except KeyError:
+                raise ValueError(
+                    f"The sample '{sample.key}' is not in the shards of "
+                    f"{self.directory}."
+                )
+            rate = location.attributes["rate"]
+            n_samples = location.n_frames
+            if self.max_duration is not None:
+                n_samples = min(n_samples, int(round(self.max_duration * rate)))
+            loader = PackedAudio(
+                str(store.directory / location.shard),
+                location.offset,
+                n_samples,
+                rate,
+                self._target_sr(rate),
+            )
+            output.append(
+                DelayedSample(
+                    load=loader.data,
+                    parent=sample,
+                    delayed_attributes={
+                        "rate": loader.rate,
+                        "audio_key": loader.audio_key,
+                    },
+                )
+            )
+        return output
+
+    def fit(self, X, y=None):
+        return self
+
+    def _more_tags(self):
+        return {
+            "stateless": True,
+            "requires_fit": False,
+        }
+
+
+def _read_native_rate(database):
+    """Makes the loader of a database read the audio without resampling."""
+    for _, step in getattr(database.transformer, "steps", []):
+        if isinstance(step, (PathToAudio, PackedAudioLoader)):
+            step.forced_sr = None
+
+
+@click.command(
+    epilog="""Examples:
+
+\b
+    $ bob db pack-audio voxceleb ./voxceleb-shards/
+
+\b
+    $ bob db pack-audio nist-sre04to16 -g train --shard-size 4G ./nist-shards/
+    $ bob config set bob.db.nist_sre04to16.shards ./nist-shards/
+
+""",
+)
+@click.option(
+    "--groups",
+    "-g",
+    multiple=True,
+    help="The groups of samples to pack (all by default).",
+)
+@click.option(
+    "--shard-size",
+    "-s",
+    default="1G",
+    show_default=True,
+    help="The size of the shards (e.g. 500M or 4G).",
+)
+@click.argument("database")
+@click.argument("destination")
+@verbosity_option(logger=logger, expose_value=False)
+def pack_audio_command(database, destination, groups, shard_size):
+    """Packs the audio of a database in a few large shards.
+
+    The audio of the samples of DATABASE (a resource name or a configuration
+    file defining ``database``) is decoded at its native rate and appended to
+    the shards in DESTINATION. Set the ``bob.db.<name>.shards`` setting to
+    DESTINATION to read the samples of the database from the shards.
+    """
+    from bob.bio.base.utils import load_resource
+
+    database = load_resource(
+        database, "database", preferred_package="bob.bio.spear"
+    )
+    _read_native_rate(database)
+    samples = database.all_samples(list(groups) or None)
+    logger.info(f"Packing {len(samples)} samples in {destination}.")
+    n_packed = pack_audio(
+        tqdm(samples), destination, shard_size=parse_size(shard_size)
+    )
+    click.echo(f"Packed {n_packed} samples in {destination}.")
@@ -6,6 +6,8 @@ from clapper.rc import UserDefaults
 from sklearn.pipeline import Pipeline
 
 from bob.bio.base.database import AnnotationsLoader, FileSampleLoader
+from bob.bio.spear.cache import RC_AUDIO_DIRECTORY, RC_AUDIO_MAX_SIZE
+from bob.bio.spear.database.shards import PackedAudioLoader
 from bob.bio.spear.transformer import PathToAudio
 
 logger = logging.getLogger(__name__)
@@ -29,8 +31,34 @@ def create_sample_loader(
     annotations_ext: str = ".json",
     force_sample_rate: Union[int, None] = None,
     force_channel: Union[int, None] = None,
+    max_duration: Union[float, None] = None,
+    min_native_sample_rate: Union[float, None] = None,
+    shards_path: Union[str, None] = None,
 ):
-    """Defines the data loading transformers"""
+    """Defines the data loading transformers
+
+    The ``start`` and ``end`` columns of the CSV protocols (in seconds), if
+    present, define the segment of the file of each sample: only this segment
+    is decoded. ``max_duration`` (in seconds) crops each file or segment.
+
+    With ``force_sample_rate``, the files of ``min_native_sample_rate`` or
+    higher are not resampled, when the extractor computes equivalent features
+    at their native rate, e.g.:
+
+    >>> extractor = Cepstral(reference_rate=16000)
+    >>> create_sample_loader(
+    ...     force_sample_rate=16000,
+    ...     min_native_sample_rate=extractor.min_sample_rate,
+    ... )
+
+    The decoded audio is cached on disk if the
+    ``bob.bio.spear.audio_cache.directory`` setting is set (see
+    :py:class:`bob.bio.spear.cache.AudioCache`).
+
+    With ``shards_path``, the audio is read by key from the shards written by
+    ``bob db pack-audio`` (see :py:mod:`bob.bio.spear.database.shards`)
+    instead of from the files (cropped to ``max_duration`` too).
+    """
 
     # Load a path into the data of the sample
     sample_loader = FileSampleLoader(
@@ -41,28 +69,38 @@ def create_sample_loader(
 
     # Read the file at path and set the data and metadata of a sample
     path_to_sample = PathToAudio(
-        forced_channel=force_channel, forced_sr=force_sample_rate
+        forced_channel=force_channel,
+        forced_sr=force_sample_rate,
+        max_duration=max_duration,
+        min_native_sr=min_native_sample_rate,
+        audio_cache=get_rc().get(RC_AUDIO_DIRECTORY),
+        audio_cache_max_size=get_rc().get(RC_AUDIO_MAX_SIZE),
     )
 
     # Build the data loading pipeline
-    if annotations_path is None:
-        sample_loader = Pipeline(
-            [
-                ("db:reader_loader", sample_loader),
-                ("db:path_to_sample", path_to_sample),
-            ]
-        )
+    if shards_path is None:
+        steps = [
+            ("db:reader_loader", sample_loader),
+            ("db:path_to_sample", path_to_sample),
+        ]
     else:
+        steps = [
+            (
+                "db:shard_loader",
+                PackedAudioLoader(
+                    shards_path,
+                    forced_sr=force_sample_rate,
+                    min_native_sr=min_native_sample_rate,
+                    max_duration=max_duration,
+                ),
+            )
+        ]
+    if annotations_path is not None:
         annotations_transformer = AnnotationsLoader(
             annotation_directory=annotations_path,
             annotation_extension=annotations_ext,
         )
-        sample_loader = Pipeline(
-            [
-                ("db:reader_loader", sample_loader),
-                ("db:path_to_sample", path_to_sample),
-                ("db:annotations_loader", annotations_transformer),
-            ]
-        )
+        steps.append(("db:annotations_loader", annotations_transformer))
+    sample_loader = Pipeline(steps)
 
     return sample_loader
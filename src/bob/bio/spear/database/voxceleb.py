@@ -20,5 +20,6 @@ class VoxcelebDatabase(CSVDatabase):
             protocol=protocol,
             transformer=create_sample_loader(
                 data_path=get_rc()[f"bob.db.{self.name}.directory"],
+                shards_path=get_rc().get(f"bob.db.{self.name}.shards"),
             ),
         )
@@ -11,6 +11,7 @@ import numpy
 from sklearn.base import BaseEstimator, TransformerMixin
 
 from .. import audio_processing as ap
+from .. import codec, instrumentation
 
 logger = logging.getLogger(__name__)
 
@@ -27,6 +28,18 @@ class Cepstral(BaseEstimator, TransformerMixin):
     ...         ("sample_rate", "rate"), ("vad_labels", "annotations")
     ...     ]
     ... )
+
+    When the VAD labels carry the frame analysis of the annotator (see the
+    ``share_analysis`` option of the annotators), the frame energies (and
+    frames) are reused if the framing parameters match.
+
+    The windows are given in ms and the filter bank in Hz, so the features can
+    be computed at the native rate of the audio instead of resampling it, as
+    long as the rate covers the filter bank (see :py:attr:`min_sample_rate`).
+    With ``reference_rate``, the pre-emphasis is adapted to the rate too, so
+    e.g. the features of 8 kHz audio match those of the same audio resampled
+    to 16 kHz (see ``min_native_sample_rate`` of
+    :py:func:`bob.bio.spear.database.utils.create_sample_loader`).
     """
 
     def __init__(
@@ -46,6 +59,11 @@ class Cepstral(BaseEstimator, TransformerMixin):
         pre_emphasis_coef=0.95,
         features_mask=None,
         normalize_flag=True,
+        dtype="float64",
+        backend="numpy",
+        storage_codec=None,
+        reference_rate=None,
+        max_batch_frames=2**15,
         **kwargs,
     ):
         """Most parameters are passed to `ap.cepstral`.
@@ -56,6 +74,28 @@ class Cepstral(BaseEstimator, TransformerMixin):
             Indices of features to keep (only applied if VAD annotations are present).
         normalize_flag: bool
             Controls the normalization of the feature vectors after Cepstral.
+        dtype: str or numpy dtype
+            Floating point type of the computation and of the features. Use
+            ``"float32"`` to halve the size of the features in memory and on
+            disk; they match the float64 features within ``rtol=1e-4`` and
+            ``atol=1e-3`` before normalization.
+        backend: str
+            ``"numpy"`` or ``"torch"``, the implementation of `ap.cepstral` to use.
+        storage_codec: str or None
+            ``"float16"`` or ``"int8"`` to store the checkpointed features in
+            a compact form (see :py:mod:`bob.bio.spear.codec`), or None to
+            store them as they are.
+        reference_rate: int or None
+            The sample rate ``pre_emphasis_coef`` is set for. At other rates,
+            the coefficient is adapted to keep the same time constant
+            (``pre_emphasis_coef ** (reference_rate / rate)``). If None, the
+            coefficient is used at all rates.
+        max_batch_frames: int or None
+            The maximum number of frames computed at once by `transform`. The
+            utterances of a same rate are split in batches of at most this
+            many frames (an utterance longer than that is computed alone), to
+            bound the memory of the packed frames. If None, all the utterances
+            of a same rate are computed at once.
         """
 
         super().__init__(**kwargs)
@@ -74,6 +114,24 @@ class Cepstral(BaseEstimator, TransformerMixin):
         self.pre_emphasis_coef = pre_emphasis_coef
         self.features_mask = features_mask
         self.normalize_flag = normalize_flag
+        self.dtype = dtype
+        self.backend = backend
+        self.storage_codec = storage_codec
+        self.reference_rate = reference_rate
+        self.max_batch_frames = max_batch_frames
+
+    @property
+    def min_sample_rate(self) -> float:
+        """The lowest sample rate whose audio covers the whole filter bank.
+
+        Audio of this rate or higher can be used without resampling.
+        """
+        return 2 * self.f_max
+
+    def _pre_emphasis_coef(self, rate):
+        if self.reference_rate is None or rate == self.reference_rate:
+            return self.pre_emphasis_coef
+        return self.pre_emphasis_coef ** (self.reference_rate / rate)
 
     def normalize_features(self, params: numpy.ndarray):
         """Returns the features normalized along the columns.
@@ -91,24 +149,15 @@ class Cepstral(BaseEstimator, TransformerMixin):
         normalized_vector = (params - params.mean(axis=0)) / params.std(axis=0)
         return normalized_vector
 
-    def transform_one(
-        self,
-        wav_data: numpy.ndarray,
-        sample_rate: float,
-        vad_labels: numpy.ndarray,
-    ):
-        """Computes and returns cepstral features for one given audio signal."""
-        logger.debug("Cepstral transform.")
-
-        cepstral_features = ap.cepstral(
-            wav_data,
-            sample_rate,
+    def _cepstral_parameters(self, rate):
+        """Returns the arguments of `ap.cepstral` set in this extractor."""
+        return dict(
             win_length_ms=self.win_length_ms,
             win_shift_ms=self.win_shift_ms,
             n_filters=self.n_filters,
             f_min=self.f_min,
             f_max=self.f_max,
-            pre_emphasis_coef=self.pre_emphasis_coef,
+            pre_emphasis_coef=self._pre_emphasis_coef(rate),
             mel_scale=self.mel_scale,
             n_ceps=self.n_ceps,
             delta_win=self.delta_win,
@@ -116,8 +165,13 @@ class Cepstral(BaseEstimator, TransformerMixin):
             with_energy=self.with_energy,
             with_delta=self.with_delta,
             with_delta_delta=self.with_delta_delta,
+            dtype=self.dtype,
         )
 
+    def select_and_normalize(
+        self, cepstral_features: numpy.ndarray, vad_labels: numpy.ndarray
+    ):
+        """Keeps the speech frames of the features and normalizes them."""
         if vad_labels is not None:  # Don't apply VAD if labels are not present
             vad_labels = numpy.array(
                 vad_labels
@@ -139,20 +193,107 @@ class Cepstral(BaseEstimator, TransformerMixin):
             feature_length = (
                 len(self.features_mask) if self.features_mask else 60
             )
-            normalized_features = numpy.zeros((1, feature_length))
+            normalized_features = numpy.zeros(
+                (1, feature_length), dtype=self.dtype
+            )
         return normalized_features
 
+    def transform_one(
+        self,
+        wav_data: numpy.ndarray,
+        sample_rate: float,
+        vad_labels: numpy.ndarray,
+    ):
+        """Computes and returns cepstral features for one given audio signal."""
+        logger.debug("Cepstral transform.")
+
+        with instrumentation.measure(type(self).__name__) as stage:
+            cepstral_features = ap.cepstral(
+                wav_data,
+                sample_rate,
+                **self._cepstral_parameters(sample_rate),
+                backend=self.backend,
+                analysis=getattr(vad_labels, "frame_analysis", None),
+            )
+            features = self.select_and_normalize(cepstral_features, vad_labels)
+            stage.set(
+                audio_duration=len(wav_data) / sample_rate,
+                frames_in=len(cepstral_features),
+                frames_out=len(features),
+                speech_frames=len(features),
+            )
+        return features
+
+    def _batches(self, signals, indices, rate):
+        """Splits the indices of signals in batches of at most
+        ``max_batch_frames`` frames."""
+        if self.max_batch_frames is None:
+            yield indices
+            return
+        win_length, win_shift, _ = ap.frame_parameters(
+            rate, self.win_length_ms, self.win_shift_ms
+        )
+        batch, batch_frames = [], 0
+        for i in indices:
+            n_frames = max(
+                0, int(1 + (len(signals[i]) - win_length) / win_shift)
+            )
+            if batch and batch_frames + n_frames > self.max_batch_frames:
+                yield batch
+                batch, batch_frames = [], 0
+            batch.append(i)
+            batch_frames += n_frames
+        if batch:
+            yield batch
+
     def transform(
         self,
         wav_data_set: "list[numpy.ndarray]",
         sample_rate: "list[float]",
         vad_labels: "list[numpy.ndarray]",
     ):
-        results = []
-        for wav_data, rate, annotations in zip(
-            wav_data_set, sample_rate, vad_labels
-        ):
-            results.append(self.transform_one(wav_data, rate, annotations))
+        if self.backend != "numpy":
+            results = []
+            for wav_data, rate, annotations in zip(
+                wav_data_set, sample_rate, vad_labels
+            ):
+                results.append(self.transform_one(wav_data, rate, annotations))
+            return results
+
+        # Compute the features of all the utterances of a same rate at once
+        results = [None] * len(wav_data_set)
+        indices_per_rate = {}
+        for i, rate in enumerate(sample_rate):
+            indices_per_rate.setdefault(rate, []).append(i)
+
+        for rate, indices in indices_per_rate.items():
+            logger.debug("Cepstral transform of %d samples.", len(indices))
+            with instrumentation.measure(type(self).__name__) as stage:
+                frames_in = 0
+                for batch in self._batches(wav_data_set, indices, rate):
+                    cepstral_features = ap.cepstral_batch(
+                        [wav_data_set[i] for i in batch],
+                        rate,
+                        **self._cepstral_parameters(rate),
+                        analyses=[
+                            getattr(vad_labels[i], "frame_analysis", None)
+                            for i in batch
+                        ],
+                    )
+                    for i, features in zip(batch, cepstral_features):
+                        results[i] = self.select_and_normalize(
+                            features, vad_labels[i]
+                        )
+                    frames_in += sum(len(f) for f in cepstral_features)
+                frames_out = sum(len(results[i]) for i in indices)
+                stage.set(
+                    n_samples=len(indices),
+                    audio_duration=sum(len(wav_data_set[i]) for i in indices)
+                    / rate,
+                    frames_in=frames_in,
+                    frames_out=frames_out,
+                    speech_frames=frames_out,
+                )
         return results
 
     def fit(self, X, y=None, **fit_params):
@@ -165,4 +306,5 @@ class Cepstral(BaseEstimator, TransformerMixin):
                 ("sample_rate", "rate"),
                 ("vad_labels", "annotations"),
             ),
+            **codec.checkpoint_tags(self.storage_codec),
         }
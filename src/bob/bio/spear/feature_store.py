@@ -0,0 +1,424 @@
+"""Sharded storage of variable-length feature matrices.
+
+Checkpointing one file per sample produces millions of small files on large
+databases (e.g. VoxCeleb), and the training of the UBM opens all of them. A
+:py:class:`FeatureStore` instead appends the features of the utterances to a
+few large shards, and keeps an index of the location of each utterance
+(shard, offset and number of frames).
+
+The features are read as zero-copy :py:class:`numpy.memmap` views of the
+shards, and the frames can be streamed in chunks, without loading whole
+utterances, e.g. to train a UBM:
+
+>>> store = FeatureStore("features/")
+>>> ubm.fit(store.to_dask_array(chunk_frames=100_000))
+
+The features of a pipeline are stored with :py:class:`FeatureStoreWrapper`.
+"""
+
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from functools import partial
+from pathlib import Path
+from typing import Iterator, NamedTuple, Optional
+
+import numpy
+
+from sklearn.base import BaseEstimator, TransformerMixin
+
+from bob.pipelines import DelayedSample
+from bob.pipelines.wrappers import estimator_requires_fit
+
+logger = logging.getLogger(__name__)
+
+METADATA_FILE = "store.json"
+INDEX_SUFFIX = ".index.json"
+SHARD_SUFFIX = ".bin"
+
+
+class Location(NamedTuple):
+    """The location of the features of an utterance in a store."""
+
+    shard: str
+    offset: int
+    """Index of the first frame in the shard."""
+    n_frames: int
+    attributes: Optional[dict] = None
+    """Metadata stored with the features (e.g. the rate of an audio signal)."""
+
+
+def read_features(path, dtype, dim, offset, n_frames):
+    """Returns a memory-mapped view of ``n_frames`` frames of a shard."""
+    if n_frames == 0:
+        return numpy.empty((0, dim), dtype=dtype)
+    dtype = numpy.dtype(dtype)
+    return numpy.memmap(
+        path,
+        dtype=dtype,
+        mode="r",
+        offset=offset * dim * dtype.itemsize,
+        shape=(n_frames, dim),
+    )
+
+
+class FeatureStore:
+    """Features of utterances packed in large shards, with an offset index.
+
+    Each writing process appends to its own shards, so several processes (e.g.
+    dask workers) can fill a store at the same time. The index of a shard is
+    written next to it at each :py:meth:`flush`; the utterances are visible to
+    the readers once flushed.
+
+    A store can also be shared by the threads of a process (e.g. with the
+    threaded scheduler of dask): :py:meth:`append`, :py:meth:`flush`,
+    :py:meth:`close` and :py:meth:`reload` hold a lock, so the threads write
+    to the same shard one utterance at a time.
+
+    Parameters
+    ----------
+    directory:
+        The directory of the store (created if needed).
+    shard_size:
+        The size in bytes above which a new shard is started.
+    """
+
+    def __init__(self, directory, shard_size=2**30):
+        self.directory = Path(directory)
+        self.shard_size = shard_size
+        self._metadata = None
+        self._index = None
+        self._writer = None
+        self._lock = threading.RLock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(_index=None, _writer=None)
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.RLock()
+
+    @property
+    def dtype(self) -> Optional[numpy.dtype]:
+        """The type of the features (None if the store is empty)."""
+        metadata = self._read_metadata()
+        return None if metadata is None else numpy.dtype(metadata["dtype"])
+
+    @property
+    def dim(self) -> Optional[int]:
+        """The dimension of the features (None if the store is empty)."""
+        metadata = self._read_metadata()
+        return None if metadata is None else metadata["dim"]
+
+    def _read_metadata(self):
+        if self._metadata is None:
+            try:
+                with open(self.directory / METADATA_FILE) as f:
+                    self._metadata = json.load(f)
+            except FileNotFoundError:
+                return None
+        return self._metadata
+
+    def _check_features(self, features):
+        if features.ndim != 2:
+            raise ValueError(
+                "Only 2D arrays of features (frames, dim) can be stored, got "
+                f"an array of shape {features.shape}."
+            )
+        metadata = self._read_metadata()
+        if metadata is None:
+            metadata = {"dtype": features.dtype.str, "dim": features.shape[1]}
+            self.directory.mkdir(parents=True, exist_ok=True)
+            _write_json(self.directory / METADATA_FILE, metadata)
+            self._metadata = None
+            metadata = self._read_metadata()
+        if (features.dtype.str, features.shape[1]) != (
+            metadata["dtype"],
+            metadata["dim"],
+        ):
+            raise ValueError(
+                f"Features of type {features.dtype} and dimension "
+                f"{features.shape[1]} can not be stored with features of type "
+                f"{numpy.dtype(metadata['dtype'])} and dimension "
+                f"{metadata['dim']}."
+            )
+
+    @property
+    def index(self) -> "dict[str, Location]":
+        """The location of the features of each key."""
+        if self._index is None:
+            self.reload()
+        return self._index
+
+    def reload(self):
+        """Reads the index again, to see the utterances added by others."""
+        index = {}
+        for path in sorted(self.directory.glob(f"*{INDEX_SUFFIX}")):
+            shard = path.name[: -len(INDEX_SUFFIX)] + SHARD_SUFFIX
+            with open(path) as f:
+                for key, offset, n_frames, *attributes in json.load(f):
+                    index[key] = Location(shard, offset, n_frames, *attributes)
+        with self._lock:
+            if self._writer is not None:
+                index.update(self._writer.index)
+            self._index = index
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def keys(self):
+        return self.index.keys()
+
+    def location(self, key) -> Location:
+        """Returns the location of the features of a key."""
+        return self.index[key]
+
+    def loader(self, key):
+        """Returns a function reading the features of a key (picklable)."""
+        location = self.index[key]
+        return partial(
+            read_features,
+            str(self.directory / location.shard),
+            self.dtype.str,
+            self.dim,
+            location.offset,
+            location.n_frames,
+        )
+
+    def __getitem__(self, key) -> numpy.ndarray:
+        """Returns the features of a key as a memory-mapped view."""
+        return self.loader(key)()
+
+    def append(self, key, features, attributes=None):
+        """Appends the features of an utterance (visible after a flush).
+
+        ``attributes`` is an optional JSON-serializable dict stored in the index
+        with the features (see :py:attr:`Location.attributes`).
+        """
+        features = numpy.ascontiguousarray(features)
+        with self._lock:
+            self._check_features(features)
+            if self._writer is None:
+                self._writer = _ShardWriter(self.directory)
+            self._writer.write(key, features, attributes)
+            self.index[key] = self._writer.index[key]
+            if self._writer.size >= self.shard_size:
+                self.close()
+
+    def flush(self):
+        """Writes the data and index of the current shard."""
+        with self._lock:
+            if self._writer is not None:
+                self._writer.flush()
+
+    def close(self):
+        """Flushes the current shard; the next appends start a new shard."""
+        with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+
+    def _runs(self, keys):
+        """Returns the contiguous (shard, start, stop) frame ranges of keys."""
+        locations = sorted(
+            (
+                self.index.values()
+                if keys is None
+                else (self.index[key] for key in keys)
+            ),
+            key=lambda location: location[:3],
+        )
+        runs = []
+        for shard, offset, n_frames, _ in locations:
+            if runs and runs[-1][0] == shard and runs[-1][2] == offset:
+                runs[-1][2] += n_frames
+            elif n_frames:
+                runs.append([shard, offset, offset + n_frames])
+        return runs
+
+    def _chunks(self, keys, chunk_frames):
+        for shard, start, stop in self._runs(keys):
+            for offset in range(start, stop, chunk_frames):
+                n_frames = min(chunk_frames, stop - offset)
+                yield str(self.directory / shard), offset, n_frames
+
+    def frames(self, keys=None, chunk_frames=65536) -> Iterator[numpy.ndarray]:
+        """Iterates over the frames of some utterances in chunks.
+
+        Parameters
+        ----------
+        keys:
+            The utterances to read (all by default).
+        chunk_frames:
+            The maximum number of frames in a chunk.
+
+        Yields
+        ------
+        chunk: numpy.memmap
+            Views of at most ``chunk_frames`` consecutive frames. A chunk can
+            hold several utterances, and an utterance can span several chunks.
+        """
+        for path, offset, n_frames in self._chunks(keys, chunk_frames):
+            yield read_features(path, self.dtype, self.dim, offset, n_frames)
+
+    def n_frames(self, keys=None) -> int:
+        """Returns the number of frames of some utterances (all by default)."""
+        if keys is None:
+            return sum(location.n_frames for location in self.index.values())
+        return sum(self.index[key].n_frames for key in keys)
+
+    def to_dask_array(self, keys=None, chunk_frames=65536):
+        """Returns the frames of some utterances as a dask array.
+
+        Each chunk of the array is read from the shards only when computed,
+        so a UBM can be trained without loading all the features at once.
+        """
+        import dask
+        import dask.array
+
+        dtype, dim = self.dtype, self.dim
+        chunks = [
+            dask.array.from_delayed(
+                dask.delayed(read_features)(path, dtype, dim, offset, n),
+                shape=(n, dim),
+                dtype=dtype,
+            )
+            for path, offset, n in self._chunks(keys, chunk_frames)
+        ]
+        if not chunks:
+            return dask.array.empty((0, dim or 0), dtype=dtype or float)
+        return dask.array.concatenate(chunks)
+
+
+class _ShardWriter:
+    """Appends features to a new shard of a store (guarded by its lock)."""
+
+    def __init__(self, directory):
+        # Named after the creation time, so the shards sort in writing order
+        name = (
+            f"{time.time_ns():020d}-{socket.gethostname()}-{os.getpid()}-"
+            f"{uuid.uuid4().hex[:8]}"
+        )
+        self.shard = name + SHARD_SUFFIX
+        self.index_path = directory / (name + INDEX_SUFFIX)
+        self.file = open(directory / self.shard, "wb")
+        self.index = {}
+        self.size = 0
+        self.n_frames = 0
+
+    def write(self, key, features, attributes=None):
+        self.file.write(features.data)
+        self.index[key] = Location(
+            self.shard, self.n_frames, len(features), attributes
+        )
+        self.n_frames += len(features)
+        self.size += features.nbytes
+
+    def flush(self):
+        self.file.flush()
+        _write_json(
+            self.index_path,
+            [
+                [key, loc.offset, loc.n_frames]
+                + ([] if loc.attributes is None else [loc.attributes])
+                for key, loc in self.index.items()
+            ],
+        )
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+
+def _write_json(path, content):
+    """Writes a JSON file atomically."""
+    tmp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex[:8]}")
+    with open(tmp_path, "w") as f:
+        json.dump(content, f)
+    os.replace(tmp_path, path)
+
+
+class FeatureStoreWrapper(BaseEstimator, TransformerMixin):
+    """Stores the features of an estimator in a :py:class:`FeatureStore`.
+
+    Like the checkpointing of :py:mod:`bob.pipelines`, the samples whose key is
+    already in the store are not transformed again, but the features are packed
+    in shards instead of one file per sample.
+
+    >>> extractor = FeatureStoreWrapper(
+    ...     wrap(["sample"], Cepstral()), "features/"
+    ... )
+
+    Parameters
+    ----------
+    estimator:
+        The estimator transforming samples (e.g. a sample-wrapped extractor).
+    directory:
+        The directory of the store.
+    shard_size:
+        The size of the shards (see :py:class:`FeatureStore`).
+    """
+
+    def __init__(self, estimator, directory, shard_size=2**30):
+        super().__init__()
+        self.estimator = estimator
+        self.directory = directory
+        self.shard_size = shard_size
+
+    @property
+    def store(self):
+        store = getattr(self, "_store", None)
+        if store is None or store.directory != Path(self.directory):
+            store = self._store = FeatureStore(self.directory, self.shard_size)
+        return store
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop("_store", None)
+        return state
+
+    def transform(self, samples):
+        store = self.store
+        store.reload()
+        missing = [i for i, s in enumerate(samples) if s.key not in store]
+        logger.debug(
+            "%d of %d samples found in the feature store %s.",
+            len(samples) - len(missing),
+            len(samples),
+            self.directory,
+        )
+
+        output = list(samples)
+        if missing:
+            computed = self.estimator.transform([samples[i] for i in missing])
+            for i, sample in zip(missing, computed):
+                store.append(sample.key, sample.data)
+                output[i] = sample
+            store.flush()
+
+        missing = set(missing)
+        for i, sample in enumerate(samples):
+            if i not in missing:
+                output[i] = DelayedSample(
+                    store.loader(sample.key), parent=sample
+                )
+        return output
+
+    def fit(self, X, y=None):
+        if estimator_requires_fit(self.estimator):
+            self.estimator.fit(X, y)
+        return self
+
+    def _more_tags(self):
+        return {"requires_fit": estimator_requires_fit(self.estimator)}
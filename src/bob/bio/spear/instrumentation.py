@@ -0,0 +1,247 @@
+"""Timing of the processing stages of the spear transformers.
+
+The transformers (audio decoding of :py:class:`PathToAudio`, resampling, VAD
+annotators and feature extraction) report for each sample the wall time spent,
+the duration of the audio, the number of frames in and out, and the ratio of
+frames labeled as speech. The reports are aggregated per stage in each worker
+process, and can be exported as JSON or CSV, or received through callbacks.
+
+The instrumentation is disabled by default, and then only costs a check of a
+flag per sample. It is enabled with :py:func:`enable`, or by setting the
+``BOB_SPEAR_INSTRUMENTATION`` environment variable (e.g. on dask workers). If
+the variable is set to a directory instead of ``1``, each worker process
+writes its summary there as JSON when it exits.
+
+>>> from bob.bio.spear import instrumentation
+>>> instrumentation.enable()
+>>> pipeline.transform(samples)
+>>> instrumentation.write_csv("stages.csv")
+"""
+
+import atexit
+import csv
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import numpy
+
+logger = logging.getLogger(__name__)
+
+ENVIRONMENT_VARIABLE = "BOB_SPEAR_INSTRUMENTATION"
+
+SUMMARY_FIELDS = (
+    "stage",
+    "n_samples",
+    "wall_time",
+    "audio_duration",
+    "rtf",
+    "frames_in",
+    "frames_out",
+    "speech_ratio",
+)
+
+
+class Record(NamedTuple):
+    """The measures of one stage on one sample (or a batch of samples)."""
+
+    stage: str
+    wall_time: float
+    n_samples: int = 1
+    audio_duration: Optional[float] = None
+    frames_in: Optional[int] = None
+    frames_out: Optional[int] = None
+    speech_frames: Optional[int] = None
+    """Frames labeled as speech (out of ``frames_in``)."""
+
+
+_enabled = False
+_lock = threading.Lock()
+_stages = {}
+_callbacks = []
+
+
+def enable():
+    """Starts recording the measures of the transformers."""
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    """Stops recording the measures (the recorded ones are kept)."""
+    global _enabled
+    _enabled = False
+
+
+def is_enabled():
+    """Tells if the measures are recorded."""
+    return _enabled
+
+
+def reset():
+    """Forgets all the recorded measures."""
+    with _lock:
+        _stages.clear()
+
+
+def add_callback(callback):
+    """Calls ``callback`` with each new :py:class:`Record`."""
+    _callbacks.append(callback)
+
+
+def remove_callback(callback):
+    """Stops calling a callback given to :py:func:`add_callback`."""
+    _callbacks.remove(callback)
+
+
+def record(stage, wall_time, **measures):
+    """Adds the measures of a stage (see :py:class:`Record` for the fields)."""
+    new = Record(stage, wall_time, **measures)
+    with _lock:
+        totals = _stages.setdefault(stage, dict.fromkeys(Record._fields[1:], 0))
+        for field in Record._fields[1:]:
+            value = getattr(new, field)
+            if value is not None:
+                totals[field] += value
+    for callback in _callbacks:
+        callback(new)
+
+
+class _Measure:
+    """Times a block and records it with the measures given to :py:meth:`set`."""
+
+    __slots__ = ("stage", "measures", "start")
+
+    def __init__(self, stage):
+        self.stage = stage
+        self.measures = {}
+
+    def set(self, **measures):
+        """Sets measures of the :py:class:`Record` (e.g. ``frames_out``)."""
+        self.measures.update(measures)
+
+    def set_labels(self, labels, audio_duration):
+        """Sets the measures of the VAD ``labels`` of a signal."""
+        self.set(
+            audio_duration=audio_duration,
+            frames_in=len(labels),
+            frames_out=len(labels),
+            speech_frames=int(numpy.count_nonzero(labels)),
+        )
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            record(
+                self.stage, time.perf_counter() - self.start, **self.measures
+            )
+
+
+class _NoMeasure:
+    """Stands for :py:class:`_Measure` when the instrumentation is disabled."""
+
+    __slots__ = ()
+
+    def set(self, **measures):
+        pass
+
+    def set_labels(self, labels, audio_duration):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pass
+
+
+_NO_MEASURE = _NoMeasure()
+
+
+def measure(stage):
+    """Returns a context manager timing a stage on a sample.
+
+    Example
+    -------
+    >>> with measure("Cepstral") as m:
+    ...     features = compute(data)
+    ...     m.set(audio_duration=len(data) / rate, frames_out=len(features))
+    """
+    if not _enabled:
+        return _NO_MEASURE
+    return _Measure(stage)
+
+
+def worker_id():
+    """Identifies the worker process in the summaries."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def summary():
+    """Returns the measures aggregated per stage for this worker.
+
+    Returns
+    -------
+    summary: dict
+        The ``worker`` id and, in ``stages``, for each stage the number of
+        samples, the total wall time and audio duration (in seconds), the
+        real-time factor (``rtf``), the total frames in and out, and the
+        ratio of frames labeled as speech.
+    """
+    with _lock:
+        stages = {name: dict(totals) for name, totals in _stages.items()}
+    for totals in stages.values():
+        duration = totals["audio_duration"]
+        totals["rtf"] = totals["wall_time"] / duration if duration else None
+        speech_frames = totals.pop("speech_frames")
+        totals["speech_ratio"] = (
+            speech_frames / totals["frames_in"] if totals["frames_in"] else None
+        )
+    return {"worker": worker_id(), "stages": stages}
+
+
+def write_json(path):
+    """Writes the :py:func:`summary` of this worker in a JSON file."""
+    with open(path, "w") as f:
+        json.dump(summary(), f, indent=2)
+
+
+def write_csv(path):
+    """Writes the :py:func:`summary` of this worker as CSV, one stage a row."""
+    result = summary()
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=("worker",) + SUMMARY_FIELDS)
+        writer.writeheader()
+        for stage, totals in result["stages"].items():
+            writer.writerow(
+                {"worker": result["worker"], "stage": stage, **totals}
+            )
+
+
+def _write_at_exit(directory):
+    try:
+        name = worker_id().replace(":", "-")
+        write_json(Path(directory) / f"spear-stages-{name}.json")
+    except OSError as e:
+        logger.warning("Could not write the stage measures: %s", e)
+
+
+def _enable_from_environment():
+    value = os.environ.get(ENVIRONMENT_VARIABLE, "")
+    if value.lower() in ("", "0", "false"):
+        return
+    enable()
+    if value.lower() not in ("1", "true"):
+        atexit.register(_write_at_exit, value)
+
+
+_enable_from_environment()
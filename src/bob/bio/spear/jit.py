@@ -0,0 +1,243 @@
+"""Optional JIT-compiled kernels for the sequential loops of this package.
+
+Some routines (the VAD labels smoothing, the running mean of
+:py:meth:`~bob.bio.spear.annotator.Mod_4Hz.averaging` and the edge-clamped
+deltas) are loops over the frames that NumPy can not vectorize. When `numba`
+is installed, they are compiled and used instead of the pure NumPy
+implementations, with identical results.
+
+The implementation of each routine can be selected at runtime, to measure the
+gain of each stage:
+
+>>> from bob.bio.spear import jit
+>>> with jit.use_backend("numpy", ["smoothing"]):
+...     labels = annotator.transform_one(data, rate)
+"""
+
+import contextlib
+import logging
+
+import numpy
+
+try:
+    import numba
+except ImportError:  # numba is an optional dependency
+    numba = None
+
+logger = logging.getLogger(__name__)
+
+ROUTINES = ("smoothing", "averaging", "delta_features")
+BACKENDS = ("numpy", "numba")
+
+_selected = dict.fromkeys(ROUTINES, "numpy" if numba is None else "numba")
+
+
+def available():
+    """Tells if the compiled kernels are available (numba is installed)."""
+    return numba is not None
+
+
+def _check_routines(routines):
+    routines = ROUTINES if routines is None else tuple(routines)
+    for routine in routines:
+        if routine not in ROUTINES:
+            raise ValueError(
+                f"Unknown routine '{routine}', expected one of {ROUTINES}."
+            )
+    return routines
+
+
+def get_backend(routine):
+    """Returns the implementation (``"numpy"`` or ``"numba"``) of a routine."""
+    return _selected[_check_routines([routine])[0]]
+
+
+def set_backend(backend, routines=None):
+    """Selects the implementation of some routines.
+
+    Parameters
+    ----------
+    backend:
+        ``"numba"`` for the compiled kernels, or ``"numpy"``.
+    routines:
+        The names of the routines (see :py:data:`ROUTINES`) to change. All by
+        default.
+    """
+    if backend not in BACKENDS:
+        raise ValueError(
+            f"Unknown backend '{backend}', expected one of {BACKENDS}."
+        )
+    if backend == "numba" and numba is None:
+        raise ValueError("The numba backend requires numba to be installed.")
+    for routine in _check_routines(routines):
+        _selected[routine] = backend
+
+
+@contextlib.contextmanager
+def use_backend(backend, routines=None):
+    """Context manager selecting the implementation of some routines.
+
+    The previous selection is restored on exit. See :py:func:`set_backend`.
+    """
+    previous = dict(_selected)
+    set_backend(backend, routines)
+    try:
+        yield
+    finally:
+        _selected.update(previous)
+
+
+def use_numba(routine):
+    """Tells if the compiled kernel of ``routine`` must be used."""
+    return _selected[routine] == "numba"
+
+
+def _smoothing_loops(labels, smoothing_window):
+    """Loops of :py:func:`bob.bio.spear.utils.smoothing`, on an array."""
+    if labels.sum() < smoothing_window:
+        return labels
+
+    n = len(labels)
+    for k in range(1, n - 1):
+        if labels[k] == 0 and labels[k - 1] == 1 and labels[k + 1] == 1:
+            labels[k] = 1
+    for k in range(1, n - 1):
+        if labels[k] == 1 and labels[k - 1] == 0 and labels[k + 1] == 0:
+            labels[k] = 0
+
+    # Segments of consecutive equal labels
+    starts = numpy.zeros(n, dtype=numpy.int64)
+    lengths = numpy.zeros(n, dtype=numpy.int64)
+    n_segments = 1
+    for k in range(1, n):
+        if labels[k] != labels[k - 1]:
+            starts[n_segments] = k
+            n_segments += 1
+    for k in range(n_segments - 1):
+        lengths[k] = starts[k + 1] - starts[k]
+    lengths[n_segments - 1] = n - starts[n_segments - 1]
+
+    if n_segments < 2:
+        return labels
+
+    # Flips the labels of the short segments between longer ones
+    for k in range(n_segments):
+        if lengths[k] >= smoothing_window:
+            continue
+        if k > 0 and lengths[k - 1] <= smoothing_window:
+            continue
+        if k < n_segments - 1 and lengths[k + 1] <= smoothing_window:
+            continue
+        value = 0 if labels[starts[k]] == 1 else 1
+        for i in range(starts[k], starts[k] + lengths[k]):
+            labels[i] = value
+    return labels
+
+
+def _pairwise_sum(values, start, stop):
+    """Sums ``values[start:stop]`` in the order of numpy's pairwise sum."""
+    n = stop - start
+    if n < 8:
+        result = 0.0
+        for i in range(start, stop):
+            result += values[i]
+        return result
+    if n <= 128:
+        r = values[start : start + 8].copy()
+        i = 8
+        while i < n - (n % 8):
+            for j in range(8):
+                r[j] += values[start + i + j]
+            i += 8
+        result = ((r[0] + r[1]) + (r[2] + r[3])) + (
+            (r[4] + r[5]) + (r[6] + r[7])
+        )
+        for i in range(start + i, stop):
+            result += values[i]
+        return result
+    n2 = n // 2
+    n2 -= n2 % 8
+    return _pairwise_sum(values, start, start + n2) + _pairwise_sum(
+        values, start + n2, stop
+    )
+
+
+def _averaging_loops(values):
+    """Loops of :py:meth:`bob.bio.spear.annotator.Mod_4Hz.averaging`."""
+    n = len(values)
+    result = numpy.zeros(n, dtype=numpy.float64)
+    result[0] = values[0]
+    for j in range(2, min(n, 100)):
+        result[j - 1] = ((j - 1.0) / j) * result[j - 2] + (1.0 / j) * values[
+            j - 1
+        ]
+    for j in range(min(n, 100), n - 100 + 1):
+        result[j - 1] = _pairwise_sum(values, j - 100, j) / 100
+    result[n - 1] = values[n - 1]
+    for j in range(2, min(n, 100) + 1):
+        result[n - j] = ((j - 1.0) / j) * result[n + 1 - j] + (
+            1.0 / j
+        ) * values[n - j]
+    return result
+
+
+def _delta_loops(features, weights, first, last, out):
+    """Loops of :py:func:`bob.bio.spear.audio_processing.delta_features`.
+
+    ``features`` and ``out`` are of shape ``(n_batch, n_frames, dim)``, and
+    the deltas of frame ``t`` use the frames between ``first[t]`` and
+    ``last[t]``.
+    """
+    n_batch, n_frames, dim = features.shape
+    for b in range(n_batch):
+        for t in range(n_frames):
+            for d in range(dim):
+                out[b, t, d] = 0
+            for ll in range(1, len(weights) + 1):
+                right = min(t + ll, last[t])
+                left = max(t - ll, first[t])
+                for d in range(dim):
+                    out[b, t, d] += weights[ll - 1] * (
+                        features[b, right, d] - features[b, left, d]
+                    )
+    return out
+
+
+if numba is not None:
+    _pairwise_sum = numba.njit(cache=True)(_pairwise_sum)
+    _smoothing_kernel = numba.njit(cache=True)(_smoothing_loops)
+    _averaging_kernel = numba.njit(cache=True)(_averaging_loops)
+    _delta_kernel = numba.njit(cache=True)(_delta_loops)
+else:  # the (slow) interpreted loops
+    _smoothing_kernel = _smoothing_loops
+    _averaging_kernel = _averaging_loops
+    _delta_kernel = _delta_loops
+
+
+def smoothing(labels, smoothing_window):
+    """Compiled :py:func:`bob.bio.spear.utils.smoothing` (in-place)."""
+    return _smoothing_kernel(labels, smoothing_window)
+
+
+def averaging(values):
+    """Compiled :py:meth:`bob.bio.spear.annotator.Mod_4Hz.averaging`."""
+    return _averaging_kernel(numpy.asarray(values, dtype=numpy.float64))
+
+
+def delta_features(features, delta_win, first, last, out):
+    """Compiled edge-clamped deltas of
+    :py:func:`bob.bio.spear.audio_processing.delta_features`.
+
+    Parameters
+    ----------
+    features:
+        The features of shape ``(n_batch, n_frames, dim)``.
+    delta_win:
+        The number of frames on each side used to compute the deltas.
+    first, last:
+        The index of the first and last frame of the utterance of each frame.
+    out:
+        The array of the shape of ``features`` to fill.
+    """
+    weights = numpy.arange(1, delta_win + 1).astype(features.dtype)
+    return _delta_kernel(features, weights, first, last, out)
@@ -3,24 +3,47 @@
 # @date: Thu 01 Jul 2021 10:41:55 UTC+02
 
 import logging
+import os
+import threading
 
-from functools import partial
+from collections import OrderedDict
+from functools import lru_cache
 from typing import Optional
 
 import numpy
 
 from sklearn.base import BaseEstimator, TransformerMixin
 
+from bob.bio.spear import instrumentation
+from bob.bio.spear.audio_processing import AudioHeader, audio_header
 from bob.bio.spear.audio_processing import read as read_audio
+from bob.bio.spear.cache import get_audio_cache
 from bob.pipelines import DelayedSample
 
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=2**20)
+def _cached_audio_header(path: str, mtime_ns: int, size: int) -> AudioHeader:
+    return audio_header(path)
+
+
+def get_audio_header(path: str) -> AudioHeader:
+    """Returns the header of an audio file, cached per process.
+
+    The cache is keyed by the path, modification time and size of the file, so
+    a modified file is probed again.
+    """
+    stat = os.stat(path)
+    return _cached_audio_header(str(path), stat.st_mtime_ns, stat.st_size)
+
+
 def get_audio_sample_rate(path: str, forced_sr: Optional[int] = None) -> int:
-    """Returns the sample rate of the audio data."""
+    """Returns the sample rate of the audio data (without decoding it)."""
     return (
-        forced_sr if forced_sr is not None else read_audio(path, None, None)[1]
+        forced_sr
+        if forced_sr is not None
+        else get_audio_header(path).sample_rate
     )
 
 
@@ -28,15 +51,247 @@ def get_audio_data(
     path: str,
     channel: Optional[int] = None,
     forced_sr: Optional[int] = None,
+    offset: Optional[float] = None,
+    duration: Optional[float] = None,
+    unit: str = "seconds",
 ) -> numpy.ndarray:
-    """Returns the audio data from the given path."""
-    return read_audio(path, channel, forced_sr)[0]
+    """Returns the audio data (or a segment of it) from the given path.
+
+    See :py:func:`bob.bio.spear.audio_processing.read` for ``offset``,
+    ``duration`` and ``unit``.
+    """
+    return _decode(path, channel, forced_sr, offset, duration, unit)[0]
+
+
+def _decode(
+    path,
+    channel,
+    forced_sr,
+    offset=None,
+    duration=None,
+    unit=None,
+    cache=None,
+):
+    with instrumentation.measure("PathToAudio") as stage:
+        data, rate = read_audio(
+            path,
+            channel,
+            forced_sr,
+            offset=offset,
+            duration=duration,
+            unit=unit or "seconds",
+            cache=cache,
+        )
+        stage.set(audio_duration=data.shape[-1] / rate)
+    return data, rate
+
+
+class _DecodedAudio:
+    """The last decoded signals of this process, up to a total size in bytes."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key, data, rate):
+        with self._lock:
+            self._pop(key)
+            if data.nbytes > self.max_bytes:
+                return
+            self._entries[key] = (data, rate)
+            self._bytes += data.nbytes
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+    def pop(self, key):
+        with self._lock:
+            self._pop(key)
+
+    def _pop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._bytes -= entry[0].nbytes
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def resize(self, max_bytes):
+        with self._lock:
+            self.max_bytes = max_bytes
+            while self._bytes > self.max_bytes:
+                self._pop(next(iter(self._entries)))
+
+
+_decoded_audio = _DecodedAudio(max_bytes=2**29)
+
+
+def set_decoded_audio_size(max_bytes: int):
+    """Sets the size of the decoded signals kept for :py:class:`AudioLoader`.
+
+    0 disables the caching of the signals (they are decoded at each access).
+    """
+    _decoded_audio.resize(max_bytes)
+
+
+def clear_decoded_audio():
+    """Forgets all the decoded signals kept for :py:class:`AudioLoader`."""
+    _decoded_audio.clear()
+
+
+class AudioLoader:
+    """Decodes (and resamples) the audio of a sample once for its data and rate.
+
+    The decoded signals are kept in a least recently used cache of each
+    process, holding at most 2**29 bytes (512 MiB) of signals by default (see
+    :py:func:`set_decoded_audio_size`), so the transformers reading ``data``
+    and ``rate`` of a sample one after the other (e.g. an annotator then an
+    extractor) do not decode the file again. The signals are not kept per
+    sample: they are only pushed out by the signals decoded later (or
+    forgotten with :py:meth:`release` or :py:func:`clear_decoded_audio`).
+
+    The cached signal is read-only and shared by all the loaders of the same
+    file, but each call to :py:meth:`data` (i.e. each access to
+    ``sample.data``) returns a new writable copy of the whole signal, which the
+    caller can modify in place.
+
+    The rate is read from the decoded signal if available, or else from the
+    header of the file, so it never requires to decode the audio.
+
+    With ``offset`` or ``duration``, only a segment of the file is decoded (see
+    :py:func:`bob.bio.spear.audio_processing.read`). With ``min_native_sr``,
+    the files of at least this rate are not resampled to ``forced_sr``. With an
+    :py:class:`~bob.bio.spear.cache.AudioCache` as ``cache``, the decoded
+    signals are also stored on disk, for the next runs.
+    """
+
+    def __init__(
+        self,
+        path,
+        channel=None,
+        forced_sr=None,
+        offset=None,
+        duration=None,
+        unit="seconds",
+        min_native_sr=None,
+        cache=None,
+    ):
+        self.path = path
+        self.channel = channel
+        self.forced_sr = forced_sr
+        self.offset = offset
+        self.duration = duration
+        self.unit = unit
+        self.min_native_sr = min_native_sr
+        self.cache = cache
+
+    def target_sr(self) -> Optional[int]:
+        """Returns the rate the file is resampled to (None to keep its rate)."""
+        if self.forced_sr is None or self.min_native_sr is None:
+            return self.forced_sr
+        if get_audio_header(self.path).sample_rate >= self.min_native_sr:
+            return None
+        return self.forced_sr
+
+    def _file_version(self) -> Optional[tuple]:
+        """Returns the modification time and size of the file (None if missing)."""
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    @property
+    def _key(self):
+        return (
+            str(self.path),
+            self._file_version(),
+            self.channel,
+            self.target_sr(),
+            self.offset,
+            self.duration,
+            self.unit,
+        )
+
+    def audio_key(self) -> Optional[tuple]:
+        """Identifies the signal without decoding it.
+
+        Returns the path, modification time and size of the file and the
+        parameters of the decoding (e.g. to cache the features of the signal,
+        see :py:class:`~bob.bio.spear.cache.CachedFeatures`), or None if the
+        file can not be identified.
+        """
+        if self._file_version() is None:
+            return None
+        return self._key
+
+    def data(self) -> numpy.ndarray:
+        """Returns a writable copy of the signal, decoding it if needed."""
+        key = self._key
+        entry = _decoded_audio.get(key)
+        if entry is None:
+            data, rate = _decode(
+                self.path,
+                self.channel,
+                key[3],
+                self.offset,
+                self.duration,
+                self.unit,
+                self.cache,
+            )
+            data.flags.writeable = False
+            _decoded_audio.put(key, data, rate)
+        else:
+            data = entry[0]
+        return data.copy()
+
+    def rate(self) -> int:
+        """Returns the sample rate of the signal, without decoding it."""
+        target_sr = self.target_sr()
+        if target_sr is not None:
+            return target_sr
+        entry = _decoded_audio.get(self._key)
+        if entry is not None:
+            return entry[1]
+        return get_audio_sample_rate(self.path)
+
+    def release(self):
+        """Forgets the decoded signal."""
+        _decoded_audio.pop(self._key)
+
+
+def _segment_bound(value):
+    """Reads a bound of a segment (e.g. a CSV field, empty if not set)."""
+    if value is None or value == "":
+        return None
+    return float(value)
 
 
 class PathToAudio(BaseEstimator, TransformerMixin):
     """Transforms a Sample's data containing a path to an audio signal.
 
-    The Sample's metadata are updated (rate).
+    The Sample's metadata are updated (rate). The ``audio_key`` attribute of
+    the samples identifies their audio without decoding it (see
+    :py:meth:`AudioLoader.audio_key`).
+
+    If the samples have ``start`` and/or ``end`` attributes (e.g. columns of a
+    CSV protocol), only this segment of the file is decoded. ``max_duration``
+    crops the (segments of the) files, e.g. to limit the length of long probes.
+
+    With ``min_native_sr``, the files of a high enough rate are kept at their
+    rate instead of being resampled to ``forced_sr``, when the next
+    transformers handle any such rate (e.g.
+    :py:attr:`bob.bio.spear.extractor.Cepstral.min_sample_rate`).
 
     Note:
         audio processing functions expect int16 audio (range [-32768, 32767]), but in
@@ -48,6 +303,11 @@ class PathToAudio(BaseEstimator, TransformerMixin):
         self,
         forced_channel: Optional[int] = None,
         forced_sr: Optional[int] = None,
+        max_duration: Optional[float] = None,
+        segment_unit: str = "seconds",
+        min_native_sr: Optional[float] = None,
+        audio_cache: Optional[str] = None,
+        audio_cache_max_size: Optional[str] = None,
     ) -> None:
         """
         Parameters
@@ -59,30 +319,72 @@ class PathToAudio(BaseEstimator, TransformerMixin):
             Forces the loading of a specific channel for each audio file, if the samples
             don't have a ``channel`` attribute. If None and the samples don't have a
             ``channel`` attribute, all the channels will be loaded in a 2D array.
+        max_duration:
+            If not None, only this duration is read from the start of each file
+            (or segment).
+        segment_unit:
+            The unit of the ``start`` and ``end`` attributes of the samples and
+            of ``max_duration``: ``"seconds"``, or ``"samples"`` at the sample
+            rate of the files.
+        min_native_sr:
+            If not None, the files of this rate or higher are not resampled to
+            ``forced_sr``, and their samples keep the rate of the file.
+        audio_cache:
+            If not None, the directory of an
+            :py:class:`~bob.bio.spear.cache.AudioCache` keeping the decoded
+            (and resampled) audio of the files.
+        audio_cache_max_size:
+            The maximum size of the audio cache (e.g. ``"500G"``).
         """
         super().__init__()
         self.forced_channel = forced_channel
         self.forced_sr = forced_sr
+        self.max_duration = max_duration
+        self.segment_unit = segment_unit
+        self.min_native_sr = min_native_sr
+        self.audio_cache = audio_cache
+        self.audio_cache_max_size = audio_cache_max_size
+
+    def _segment(self, sample):
+        """Returns the offset and duration to read for a sample."""
+        start, end = (
+            _segment_bound(getattr(sample, name, None))
+            for name in ("start", "end")
+        )
+        duration = None if end is None else end - (start or 0)
+        if self.max_duration is not None:
+            duration = (
+                self.max_duration
+                if duration is None
+                else min(duration, self.max_duration)
+            )
+        return start, duration
 
     def transform(self, samples: list) -> list:
+        cache = None
+        if self.audio_cache is not None:
+            cache = get_audio_cache(self.audio_cache, self.audio_cache_max_size)
         output_samples = []
         for sample in samples:
             channel = getattr(sample, "channel", self.forced_channel)
-            load_fn = partial(
-                get_audio_data,
+            offset, duration = self._segment(sample)
+            loader = AudioLoader(
                 sample.data,
                 int(channel) if channel is not None else None,
                 self.forced_sr,
+                offset,
+                duration,
+                self.segment_unit,
+                self.min_native_sr,
+                cache,
             )
-            delayed_attrs = {
-                "rate": partial(
-                    get_audio_sample_rate, sample.data, self.forced_sr
-                )
-            }
             new_sample = DelayedSample(
-                load=load_fn,
+                load=loader.data,
                 parent=sample,
-                delayed_attributes=delayed_attrs,
+                delayed_attributes={
+                    "rate": loader.rate,
+                    "audio_key": loader.audio_key,
+                },
             )
             output_samples.append(new_sample)
         return output_samples
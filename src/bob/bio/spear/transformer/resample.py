@@ -10,7 +10,8 @@ import numpy
 
 from sklearn.base import BaseEstimator, TransformerMixin
 
-from bob.bio.spear.audio_processing import resample
+from bob.bio.spear import instrumentation
+from bob.bio.spear.audio_processing import resample, resample_batch
 
 logger = logging.getLogger(__name__)
 
@@ -18,22 +19,62 @@ logger = logging.getLogger(__name__)
 class Resample(BaseEstimator, TransformerMixin):
     """Transforms a Sample's audio data with a new sample rate."""
 
-    def __init__(self, target_sample_rate: Optional[int] = None) -> None:
+    def __init__(
+        self,
+        target_sample_rate: Optional[int] = None,
+        max_batch_samples: Optional[int] = None,
+    ) -> None:
         """
         Parameters
         ----------
         target_sample_rate:
             The target sample rate for the audio output.
+        max_batch_samples:
+            If not None, the utterances of a same rate are resampled in batches
+            of this many (padded) samples, see
+            :py:func:`~bob.bio.spear.audio_processing.resample_batch`. This
+            helps with many threads or on GPU, but not on a single core.
         """
         super().__init__()
         self.target_sample_rate = target_sample_rate
+        self.max_batch_samples = max_batch_samples
 
     def transform(
         self, audio_streams: List[numpy.ndarray], sample_rates: List[int]
     ) -> List[numpy.ndarray]:
-        output = []
-        for audio, sample_rate in zip(audio_streams, sample_rates):
-            output.append(resample(audio, sample_rate, self.target_sample_rate))
+        if self.max_batch_samples is None:
+            output = []
+            for audio, sample_rate in zip(audio_streams, sample_rates):
+                with instrumentation.measure("Resample") as stage:
+                    output.append(
+                        resample(audio, sample_rate, self.target_sample_rate)
+                    )
+                    stage.set(audio_duration=audio.shape[-1] / sample_rate)
+            return output
+
+        # Resample the utterances of a same rate together
+        output = [None] * len(audio_streams)
+        indices_per_rate = {}
+        for i, rate in enumerate(sample_rates):
+            indices_per_rate.setdefault(rate, []).append(i)
+
+        for rate, indices in indices_per_rate.items():
+            with instrumentation.measure("Resample") as stage:
+                resampled = resample_batch(
+                    [audio_streams[i] for i in indices],
+                    rate,
+                    self.target_sample_rate,
+                    max_batch_samples=self.max_batch_samples,
+                )
+                for i, audio in zip(indices, resampled):
+                    output[i] = audio
+                stage.set(
+                    n_samples=len(indices),
+                    audio_duration=sum(
+                        audio_streams[i].shape[-1] for i in indices
+                    )
+                    / rate,
+                )
         return output
 
     def fit(self, X, y=None):
@@ -1,5 +1,7 @@
 import numpy as np
 
+from . import jit
+
 
 def normalize_std_array(vector: np.ndarray):
     """Applies a unit mean and variance normalization to an arrayset"""
@@ -13,6 +15,10 @@ def normalize_std_array(vector: np.ndarray):
 def smoothing(labels, smoothing_window):
     """Applies a smoothing on VAD"""
 
+    if jit.use_numba("smoothing") and isinstance(labels, np.ndarray):
+        if len(labels) > 0:
+            return jit.smoothing(labels, smoothing_window)
+
     if np.sum(labels) < smoothing_window:
         return labels
 
@@ -83,5 +89,26 @@ def smoothing(labels, smoothing_window):
     return labels
 
 
+class VADLabels(list):
+    """Speech (1) and non-speech (0) labels of the frames of a signal.
+
+    Returned by the annotators when they share their frame analysis: the
+    labels are a list carrying the
+    :py:class:`~bob.bio.spear.audio_processing.FrameAnalysis` of the signal in
+    ``frame_analysis``, which the Cepstral extractor reuses.
+
+    The analysis is pickled with the labels (e.g. when they are sent to a dask
+    worker or checkpointed). The log energies are one float per frame, but the
+    frames (``share_frames`` of the annotators) are a float64 matrix of
+    ``n_frames`` by the FFT size (e.g. 250 MB for 10 minutes at 16 kHz, three
+    times the size of the float64 signal), kept in memory, pickled and written
+    with each checkpoint of the labels.
+    """
+
+    def __init__(self, labels, frame_analysis=None):
+        super().__init__(np.asarray(labels).tolist())
+        self.frame_analysis = frame_analysis
+
+
 # gets sphinx autodoc done right - don't remove it
 __all__ = [_ for _ in dir() if not _.startswith("_")]
@@ -17,6 +17,8 @@
 # You should have received a copy of the GNU General Public License
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
+import pickle
+
 from pathlib import Path
 
 import h5py
@@ -158,3 +160,43 @@ def test_mute_audio():
         # test VAD returns None
         data = annotator.transform_one(wav, rate)
         assert data is None, (annotator, data)
+
+
+def test_shared_frame_analysis():
+    """Annotators attaching their frame analysis for the Cepstral extractor."""
+    rate, wav = _wav()
+    for annotator in [
+        bob.bio.spear.annotator.Energy_Thr(share_analysis=True),
+        bob.bio.spear.annotator.Mod_4Hz(share_frames=True),
+    ]:
+        labels = annotator.transform_one(wav, sample_rate=rate)
+        assert isinstance(labels, bob.bio.spear.utils.VADLabels)
+        assert labels.frame_analysis.matches(rate, 320, 160, len(labels))
+
+        # The analysis is kept when the labels are sent to another process
+        labels = pickle.loads(pickle.dumps(labels))
+        assert labels.frame_analysis is not None
+
+        extractor = bob.bio.spear.extractor.Cepstral()
+        np.testing.assert_allclose(
+            extractor.transform([wav], [rate], [labels])[0],
+            extractor.transform_one(wav, rate, list(labels)),
+        )
+
+    # An analysis with another framing is not used
+    ap = bob.bio.spear.audio_processing
+    np.testing.assert_allclose(
+        ap.cepstral(
+            wav, rate, analysis=ap.frame_analysis(wav, rate, win_length_ms=25)
+        ),
+        ap.cepstral(wav, rate),
+    )
+
+    # Nor the analysis of another signal of the same length
+    other = wav[::-1].copy()
+    analysis = ap.frame_analysis(wav, rate, keep_frames=True)
+    assert analysis.matches(rate, 320, 160, len(analysis.log_energy), wav)
+    assert not analysis.matches(rate, 320, 160, len(analysis.log_energy), other)
+    np.testing.assert_allclose(
+        ap.cepstral(other, rate, analysis=analysis), ap.cepstral(other, rate)
+    )
@@ -2,14 +2,35 @@ import os
 
 import numpy as np
 import pkg_resources
+import pytest
+import soundfile
 
 from h5py import File as HDF5File
 
 from bob.bio.spear.audio_processing import (
+    AnalysisWorkspace,
+    CepstralStream,
+    analysis_kernels,
     cepstral,
+    cepstral_batch,
+    clear_kernel_cache,
+    delta_features,
     energy,
+    frame_signal,
+    frames_log_filter_bank,
+    frames_spectrum,
+    init_filterbank_matrix,
+    init_freqfilter,
+    kernel_cache_info,
+    log_filter_bank,
+    log_triangular_bank,
+    pre_emphasis,
+    pre_emphasis_frames,
     read,
     resample,
+    resample_batch,
+    resampler,
+    resampler_cache_info,
     spectrogram,
 )
 
@@ -38,6 +59,55 @@ def test_read():
     assert sr == 8000
 
 
+def test_read_backends(tmp_path):
+    for args in ((), (0, 8000)):
+        data, sr = read(WAV_PATH, *args, backend="soundfile")
+        reference, reference_sr = read(WAV_PATH, *args, backend="torchaudio")
+        assert sr == reference_sr
+        np.testing.assert_array_equal(data, reference)
+
+    # Only the requested channel of a multi-channel file is returned
+    path = tmp_path / "channels.flac"
+    channels = np.arange(-3000, 3000, dtype=np.int16).reshape(-1, 3)
+    soundfile.write(path, channels, 8000)
+    for channel in (None, 1, -1):
+        data, _ = read(path, channel, backend="soundfile")
+        expected = channels[:, 0 if channel is None else channel]
+        np.testing.assert_array_equal(data, expected)
+        np.testing.assert_array_equal(
+            read(path, channel, backend="torchaudio")[0], data
+        )
+    with pytest.raises(IndexError):
+        read(path, 3)
+    with pytest.raises(ValueError):
+        read(path, backend="sox")
+
+
+def test_read_segment(tmp_path):
+    full, rate = read(WAV_PATH)
+    for backend in ("soundfile", "torchaudio"):
+        data, _ = read(WAV_PATH, offset=0.5, duration=1.25, backend=backend)
+        np.testing.assert_array_equal(data, full[8000:28000])
+        data, _ = read(
+            WAV_PATH, offset=100, duration=50, unit="samples", backend=backend
+        )
+        np.testing.assert_array_equal(data, full[100:150])
+        # Cropped at the end of the file
+        data, _ = read(WAV_PATH, offset=4.5, duration=10, backend=backend)
+        np.testing.assert_array_equal(data, full[72000:])
+
+    path = tmp_path / "channels.flac"
+    channels = np.arange(-3000, 3000, dtype=np.int16).reshape(-1, 3)
+    soundfile.write(path, channels, 8000)
+    data, _ = read(path, 2, offset=10, duration=20, unit="samples")
+    np.testing.assert_array_equal(data, channels[10:30, 2])
+
+    with pytest.raises(ValueError):
+        read(WAV_PATH, offset=-1)
+    with pytest.raises(ValueError):
+        read(WAV_PATH, offset=1, unit="frames")
+
+
 def test_resample():
     resampled = resample(DATA, RATE, 41100)
     assert isinstance(resampled, np.ndarray)
@@ -45,6 +115,29 @@ def test_resample():
     assert resampled.dtype == np.float32
 
 
+def test_resampler_cache_and_batch():
+    assert resampler(RATE, 8000) is resampler(RATE, 8000)
+    assert resampler(RATE, 8000) is not resampler(RATE, 8000, rolloff=0.9)
+    hits = resampler_cache_info().hits
+    resample(DATA, RATE, 8000)
+    assert resampler_cache_info().hits == hits + 1
+
+    shared = DATA.copy()
+    shared.setflags(write=False)
+    audios = [DATA[:1000], shared, DATA[500:20001]]
+    for max_batch_samples in (2**24, 30000):
+        resampled = resample_batch(
+            audios, RATE, 8000, max_batch_samples=max_batch_samples
+        )
+        for audio, result in zip(audios, resampled):
+            np.testing.assert_allclose(
+                result, resample(audio, RATE, 8000), rtol=1e-5, atol=1e-3
+            )
+            assert result.shape == resample(audio, RATE, 8000).shape
+    assert resample_batch(audios, RATE, RATE)[1] is audios[1]
+    assert resample_batch([DATA[:0]], RATE, 8000)[0].shape == (0,)
+
+
 def _assert_allclose(actual, reference, **kwargs):
     rtol = kwargs.pop("rtol", 1e-07)
     atol = kwargs.pop("atol", 1e-05)
@@ -117,3 +210,238 @@ def test_cepstral():
     ref = np.load(ref_path)
 
     _assert_allclose(cep, ref)
+
+
+def test_cepstral_float32():
+    cep = cepstral(
+        DATA,
+        RATE,
+        win_length_ms=20,
+        win_shift_ms=10,
+        n_filters=20,
+        f_min=0.0,
+        f_max=4000.0,
+        pre_emphasis_coef=1.0,
+        mel_scale=True,
+        n_ceps=20,
+        delta_win=2,
+        dct_norm=True,
+        with_energy=True,
+        with_delta=True,
+        with_delta_delta=True,
+        dtype=np.float32,
+    )
+    assert cep.dtype == np.float32
+
+    ref = np.load(os.path.join(TEST_DATA_FOLDER, "sample_cepstral.npy"))
+    _assert_allclose(cep, ref, rtol=1e-4, atol=1e-3)
+
+    spec = spectrogram(DATA, RATE, dtype=np.float32)
+    assert spec.dtype == np.float32
+    assert energy(DATA, RATE, dtype=np.float32).dtype == np.float32
+
+
+def test_torch_backend_parity():
+    kwargs = dict(n_filters=24, n_ceps=19, dct_norm=False)
+    for dtype, tolerance in ((np.float64, {}), (np.float32, {"atol": 1e-3})):
+        _assert_allclose(
+            energy(DATA, RATE, dtype=dtype, backend="torch"),
+            energy(DATA, RATE, dtype=dtype),
+            **tolerance,
+        )
+        # The spectrum magnitude is in the int16 range
+        _assert_allclose(
+            spectrogram(DATA, RATE, dtype=dtype, backend="torch"),
+            spectrogram(DATA, RATE, dtype=dtype),
+            rtol=1e-4,
+            atol=1.0,
+        )
+        cep = cepstral(DATA, RATE, dtype=dtype, backend="torch", **kwargs)
+        assert cep.dtype == dtype
+        _assert_allclose(
+            cep, cepstral(DATA, RATE, dtype=dtype, **kwargs), **tolerance
+        )
+
+    # Signal shorter than a frame
+    assert cepstral(DATA[:100], RATE, backend="torch").shape == (0, 60)
+
+
+def test_cepstral_stream():
+    kwargs = dict(n_filters=24, n_ceps=19, dct_norm=False, delta_win=2)
+    for data in (DATA, DATA[:1000]):
+        reference = cepstral(data, RATE, **kwargs)
+        stream = CepstralStream(RATE, **kwargs)
+        for chunk_size in (1000, 16000):
+            blocks = [
+                stream.process(data[i : i + chunk_size])
+                for i in range(0, len(data), chunk_size)
+            ]
+            blocks.append(stream.flush())
+            _assert_allclose(np.concatenate(blocks), reference)
+
+    # Without delta-deltas, the frames are returned with less delay
+    stream = CepstralStream(RATE, with_delta_delta=False, **kwargs)
+    assert stream.process(DATA[:16000]).shape == (97, 40)
+    assert stream.flush().shape == (2, 40)
+
+
+def test_cepstral_batch():
+    kwargs = dict(n_filters=24, n_ceps=19, dct_norm=False, delta_win=2)
+    signals = [DATA, DATA[:1000], DATA[:100], DATA[5000:9000]]
+    results = cepstral_batch(signals, RATE, **kwargs)
+    assert len(results) == len(signals)
+    for signal, result in zip(signals, results):
+        _assert_allclose(result, cepstral(signal, RATE, **kwargs))
+    assert cepstral_batch([], RATE) == []
+
+
+def test_frame_signal():
+    frames = frame_signal(DATA, 320, 160)
+    assert frames.shape == (485, 320)
+    assert np.shares_memory(frames, DATA)
+    np.testing.assert_array_equal(frames[3], DATA[480:800])
+
+    # Signal shorter than a frame
+    assert frame_signal(DATA[:100], 320, 160).shape == (0, 320)
+
+
+def test_pre_emphasis_frames():
+    frames = np.array(frame_signal(DATA[:2000], 320, 160), dtype=np.float64)
+    expected = []
+    last_frame_elem = 0
+    for frame in frames:
+        frame, last_frame_elem = pre_emphasis(frame, 160, 0.95, last_frame_elem)
+        expected.append(frame)
+
+    result, last_element = pre_emphasis_frames(frames, 160, 0.95)
+    np.testing.assert_allclose(result, expected)
+    assert last_element == last_frame_elem
+
+
+def test_frames_spectrum():
+    frames = np.zeros((4, 512))
+    frames[:, :320] = frame_signal(DATA[16000:18000], 320, 160)[:4]
+
+    p_index = init_freqfilter(RATE, 512, True, 20, 0.0, 4000.0)
+
+    spectrum = frames_spectrum(frames, 512, energy_filter=True)
+    assert spectrum.shape == (4, 257)
+    for frame, spec_row in zip(frames, spectrum):
+        _, expected = log_filter_bank(frame.copy(), 20, p_index, 512, True)
+        np.testing.assert_allclose(spec_row, expected[:257])
+
+    spectrum_32 = frames_spectrum(frames, 512, True, dtype=np.float32)
+    assert spectrum_32.dtype == np.float32
+    np.testing.assert_allclose(spectrum_32, spectrum, rtol=1e-4)
+
+
+def test_filterbank_matrix():
+    # 60 filters at 8kHz contain overlapping triangles (li == ri)
+    for rate, n_filters, mel_scale in ((16000, 24, True), (8000, 60, True)):
+        win_size = 512 if rate == 16000 else 256
+        p_index = init_freqfilter(
+            rate, win_size, mel_scale, n_filters, 0.0, 4000.0
+        )
+        filterbank = init_filterbank_matrix(
+            p_index, n_filters, win_size // 2 + 1
+        )
+        assert filterbank.shape == (win_size // 2 + 1, n_filters)
+
+        spectrum = np.abs(np.random.default_rng(0).normal(size=(8, win_size)))
+        expected = [
+            log_triangular_bank(frame, n_filters, p_index) for frame in spectrum
+        ]
+        filters = frames_log_filter_bank(
+            spectrum[:, : win_size // 2 + 1], filterbank
+        )
+        np.testing.assert_allclose(filters, expected)
+
+
+def test_delta_features():
+    features = np.random.default_rng(0).normal(size=(3, 7, 4))
+
+    # Reference with the edge clamping done by hand
+    n_frames = features.shape[1]
+    expected = np.zeros_like(features)
+    for i in range(n_frames):
+        for ll in range(1, 3):
+            p_ind = min(i + ll, n_frames - 1)
+            n_ind = max(i - ll, 0)
+            expected[:, i] += ll * (features[:, p_ind] - features[:, n_ind])
+
+    np.testing.assert_allclose(delta_features(features, 2), expected)
+    np.testing.assert_allclose(delta_features(features[1], 2), expected[1])
+
+    # Single frame and empty utterances
+    np.testing.assert_array_equal(delta_features(features[0, :1], 2), 0)
+    assert delta_features(features[0, :0], 2).shape == (0, 4)
+
+
+def test_analysis_kernels_cache():
+    clear_kernel_cache()
+    kernels = analysis_kernels(16000, 320, 512, 24, 0.0, 4000.0, True, 19)
+    assert kernels.hamming_kernel.shape == (320,)
+    assert kernels.filterbank.shape == (257, 24)
+    assert kernels.dct_kernel.shape == (19, 24)
+    assert not kernels.filterbank.flags.writeable
+    assert kernel_cache_info().misses == 1
+
+    # Same configuration
+    again = analysis_kernels(16000, 320, 512, 24, 0.0, 4000.0, True, 19)
+    assert again.filterbank is kernels.filterbank
+    assert kernel_cache_info().hits == 1
+
+    # Other sample rate
+    analysis_kernels(8000, 160, 256, 24, 0.0, 4000.0, True, 19)
+    info = kernel_cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 2, 2)
+
+    # The cepstral front-end uses the cache
+    cepstral(DATA[:8000], RATE, n_filters=24, n_ceps=19, dct_norm=True)
+    cepstral(DATA[8000:16000], RATE, n_filters=24, n_ceps=19, dct_norm=True)
+    assert kernel_cache_info().hits == 3
+
+
+def test_analysis_workspace():
+    kwargs = dict(n_filters=24, n_ceps=19, dct_norm=False, delta_win=2)
+    workspace = AnalysisWorkspace()
+    reference = cepstral(DATA, RATE, **kwargs)
+    np.testing.assert_array_equal(
+        cepstral(DATA, RATE, workspace=workspace, **kwargs), reference
+    )
+    nbytes = workspace.nbytes
+    assert nbytes > 0
+
+    # Shorter signals reuse the buffers
+    for signal in (DATA[:1000], DATA[5000:9000], DATA):
+        out = np.empty_like(cepstral(signal, RATE, **kwargs))
+        result = cepstral(signal, RATE, workspace=workspace, out=out, **kwargs)
+        assert result is out
+        np.testing.assert_array_equal(result, cepstral(signal, RATE, **kwargs))
+    assert workspace.nbytes == nbytes
+
+    np.testing.assert_array_equal(
+        energy(DATA, RATE, workspace=workspace), energy(DATA, RATE)
+    )
+    results = cepstral_batch(
+        [DATA[:1000], DATA], RATE, workspace=workspace, **kwargs
+    )
+    _assert_allclose(results[1], reference)
+
+    workspace.clear()
+    assert workspace.nbytes == 0
+
+    # Preallocated buffers are not grown for smaller signals
+    workspace = AnalysisWorkspace(max_frames=1000, n_filters=24)
+    nbytes = workspace.nbytes
+    cepstral(DATA, RATE, workspace=workspace, **kwargs)
+    assert workspace.nbytes == nbytes
+
+
+def test_pre_emphasis_in_place():
+    frame = np.array(DATA[:320], dtype=np.float64)
+    expected, last_element = pre_emphasis(frame, 160, 0.95, 12.0)
+    result, _ = pre_emphasis(frame, 160, 0.95, 12.0, out=frame)
+    assert result is frame
+    np.testing.assert_allclose(result, expected)
+    assert last_element == DATA[159]
@@ -0,0 +1,275 @@
+import os
+import pickle
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+import soundfile
+
+from click.testing import CliRunner
+from sklearn.base import BaseEstimator, TransformerMixin
+from sklearn.pipeline import Pipeline
+
+from bob.bio.spear import cache as spear_cache
+from bob.bio.spear.annotator import Energy_Thr
+from bob.bio.spear.audio_processing import read
+from bob.bio.spear.cache import (
+    AudioCache,
+    CachedFeatures,
+    FeatureCache,
+    feature_cache,
+    fingerprint,
+    get_audio_cache,
+    parse_size,
+)
+from bob.bio.spear.extractor import Cepstral
+from bob.bio.spear.transformer import PathToAudio
+from bob.bio.spear.transformer.path_to_audio import clear_decoded_audio
+from bob.pipelines import Sample, wrap
+
+DATA_PATH = Path(__file__).parent / "data"
+
+
+class CountingTransformer(BaseEstimator, TransformerMixin):
+    """Doubles the data, counting the transformed samples."""
+
+    def __init__(self, factor=2):
+        self.factor = factor
+        self.count = 0
+
+    def transform(self, X):
+        self.count += len(X)
+        return [x * self.factor for x in X]
+
+    def _more_tags(self):
+        return {"requires_fit": False}
+
+
+def test_parse_size():
+    assert parse_size(None) is None
+    assert parse_size(1000) == 1000
+    assert parse_size("1000") == 1000
+    assert parse_size("2K") == 2048
+    assert parse_size("1.5G") == 3 * 2**29
+    assert parse_size("50GiB") == 50 * 2**30
+    with pytest.raises(ValueError):
+        parse_size("a lot")
+
+
+def test_feature_cache_lru(tmp_path):
+    cache = FeatureCache(tmp_path)
+    assert cache.get("00aa") is None
+    features = np.arange(12, dtype="float32").reshape(3, 4)
+    cache.put("00aa", features)
+    cached = cache.get("00aa")
+    assert isinstance(cached, np.memmap)
+    np.testing.assert_array_equal(cached, features)
+
+    # Entries of 128 + 48 bytes, used in the order of their keys
+    for i, key in enumerate(("01", "02", "03")):
+        cache.put(key, features)
+        os.utime(cache.path(key), (i, i))
+    os.utime(cache.path("00aa"), (10, 10))
+    assert [e.path.stem for e in cache.entries()] == ["01", "02", "03", "00aa"]
+    assert cache.size() == 4 * 176
+
+    # Using an entry makes it the most recent one
+    cache.get("01")
+    cache = FeatureCache(tmp_path, max_size=4 * 176)
+    cache.put("04", features)
+    # Down to 90% of the maximum size: the 2 least recently used are removed
+    assert {e.path.stem for e in cache.entries()} == {"00aa", "01", "04"}
+
+    # Overwriting an entry does not count it twice
+    cache.put("04", features)
+    assert cache._size == cache.size()
+
+    cache.clear()
+    assert cache.entries() == []
+
+
+def test_cached_features(tmp_path):
+    samples = [
+        Sample(np.arange(10.0) + i, rate=8000, key=str(i)) for i in range(3)
+    ]
+    frontend = wrap(["sample"], CountingTransformer())
+    cached = CachedFeatures(frontend, tmp_path)
+
+    results = cached.transform(samples[:2])
+    assert frontend.estimator.count == 2
+    results = cached.transform(samples)
+    assert frontend.estimator.count == 3
+    for sample, result in zip(samples, results):
+        np.testing.assert_array_equal(result.data, sample.data * 2)
+        assert result.key == sample.key
+    assert isinstance(results[0].data, np.memmap)
+
+    # Other parameters or another rate give other features
+    frontend.estimator.factor = 3
+    results = cached.transform(samples[:1])
+    np.testing.assert_array_equal(results[0].data, samples[0].data * 3)
+    samples[0].rate = 16000
+    cached.transform(samples[:1])
+    assert frontend.estimator.count == 5
+
+
+def test_cached_frontend(tmp_path):
+    data, rate = read(DATA_PATH / "sample.wav")
+    samples = [Sample(data, rate=rate, key="sample")]
+    frontend = Pipeline(
+        [
+            ("annotator", wrap(["sample"], Energy_Thr(share_analysis=True))),
+            ("extractor", wrap(["sample"], Cepstral())),
+        ]
+    )
+    expected = frontend.transform(samples)[0].data
+    cached = CachedFeatures(frontend, tmp_path)
+    cached.transform(samples)
+    np.testing.assert_array_equal(cached.transform(samples)[0].data, expected)
+
+    # The fitted state of the estimators is not part of the key
+    same_frontend = Pipeline(
+        [
+            ("annotator", wrap(["sample"], Energy_Thr(share_analysis=True))),
+            ("extractor", wrap(["sample"], Cepstral())),
+        ]
+    )
+    assert fingerprint(same_frontend) == fingerprint(frontend)
+    assert fingerprint(same_frontend) != fingerprint(
+        Pipeline([("annotator", wrap(["sample"], Energy_Thr()))])
+    )
+
+    # Nor the parameters that do not change the features
+    assert fingerprint(Energy_Thr(share_analysis=True)) == fingerprint(
+        Energy_Thr(share_frames=True)
+    )
+    assert fingerprint(Cepstral(storage_codec="int8")) == fingerprint(
+        Cepstral(max_batch_frames=None)
+    )
+    assert fingerprint(Cepstral(n_ceps=12)) != fingerprint(Cepstral())
+
+
+def test_cached_features_from_files(monkeypatch, tmp_path):
+    """The audio files are not decoded when their features are cached."""
+    from bob.bio.spear.transformer import path_to_audio
+
+    decoded = []
+
+    def counting_read(*args, **kwargs):
+        decoded.append(args)
+        return read_audio(*args, **kwargs)
+
+    read_audio = path_to_audio.read_audio
+    monkeypatch.setattr(path_to_audio, "read_audio", counting_read)
+    path = tmp_path / "sample.wav"
+    path.write_bytes((DATA_PATH / "sample.wav").read_bytes())
+    frontend = wrap(["sample"], CountingTransformer())
+    cached = CachedFeatures(frontend, tmp_path / "cache")
+
+    def transform(**kwargs):
+        clear_decoded_audio()
+        samples = PathToAudio(**kwargs).transform([Sample(path, key="s")])
+        return cached.transform(samples)[0].data
+
+    expected = transform(forced_sr=8000)
+    assert (frontend.estimator.count, len(decoded)) == (1, 1)
+    np.testing.assert_array_equal(transform(forced_sr=8000), expected)
+    assert (frontend.estimator.count, len(decoded)) == (1, 1)
+
+    # Other loading parameters, or a modified file, give other features
+    transform(forced_sr=8000, max_duration=1)
+    assert frontend.estimator.count == 2
+    os.utime(path, ns=(0, 0))
+    transform(forced_sr=8000)
+    assert (frontend.estimator.count, len(decoded)) == (3, 3)
+
+    # Files that can not be identified have no audio key
+    assert PathToAudio().transform([Sample(path)])[0].audio_key is not None
+    missing = PathToAudio().transform([Sample(tmp_path / "missing.wav")])
+    assert missing[0].audio_key is None
+
+
+def test_feature_cache_cli(tmp_path):
+    cache = FeatureCache(tmp_path)
+    for key in ("01", "02", "03"):
+        cache.put(key, np.zeros(100))
+    os.utime(cache.path("01"), (0, 0))
+
+    runner = CliRunner()
+    result = runner.invoke(feature_cache, ["info", "-d", str(tmp_path)])
+    assert result.exit_code == 0, result.output
+    assert "Entries: 3" in result.output
+
+    result = runner.invoke(
+        feature_cache, ["prune", "-d", str(tmp_path), "--older-than", "1"]
+    )
+    assert result.exit_code == 0, result.output
+    assert "Removed 1 entries" in result.output
+    assert not cache.path("01").exists()
+
+    result = runner.invoke(
+        feature_cache, ["prune", "-d", str(tmp_path), "--max-size", "1K"]
+    )
+    assert result.exit_code == 0, result.output
+    assert len(cache.entries()) == 1
+
+    result = runner.invoke(
+        feature_cache, ["clear", "-d", str(tmp_path), "--yes"]
+    )
+    assert result.exit_code == 0, result.output
+    assert cache.entries() == []
+
+
+def test_audio_cache(monkeypatch, tmp_path):
+    path = tmp_path / "channels.flac"
+    channels = np.arange(-3000, 3000, dtype=np.int16).reshape(-1, 2)
+    soundfile.write(path, channels, 8000)
+    decoded = []
+
+    def counting_read(*args, **kwargs):
+        decoded.append(args)
+        return read(*args, **kwargs)
+
+    monkeypatch.setattr(spear_cache, "read_audio", counting_read)
+    cache = AudioCache(tmp_path / "cache")
+    for _ in range(2):
+        data, rate = cache.read(path, 1)
+        assert rate == 8000 and data.dtype == np.float32
+        np.testing.assert_array_equal(data, channels[:, 1])
+        data, _ = cache.read(path, 1, offset=10, duration=20, unit="samples")
+        np.testing.assert_array_equal(data, channels[10:30, 1])
+    assert len(decoded) == 1
+
+    # Resampled signals are stored apart, rounded to int16
+    data, rate = read(path, 1, force_sample_rate=16000, cache=cache)
+    assert rate == 16000
+    expected, _ = read(path, 1, force_sample_rate=16000)
+    np.testing.assert_allclose(data, expected, atol=0.5)
+    data, _ = cache.read(path, 1, 16000, offset=0.1, duration=0.05)
+    np.testing.assert_array_equal(data, np.rint(expected[1600:2400]))
+    assert len(decoded) == 2 and len(cache.entries()) == 2
+
+    # A modified file is decoded again
+    soundfile.write(path, channels[::-1], 8000)
+    np.testing.assert_array_equal(cache.read(path, 1)[0], channels[::-1, 1])
+    assert len(decoded) == 3
+
+    cache = get_audio_cache(tmp_path / "cache")
+    assert pickle.loads(pickle.dumps(cache)) is cache
+
+
+def test_path_to_audio_cache(tmp_path):
+    transformer = PathToAudio(forced_sr=8000, audio_cache=tmp_path)
+    samples = [Sample(DATA_PATH / "sample.wav", key="sample")]
+    expected = PathToAudio(forced_sr=8000).transform(samples)[0].data
+    clear_decoded_audio()
+    for _ in range(2):
+        sample = transformer.transform(samples)[0]
+        assert sample.rate == 8000
+        np.testing.assert_allclose(
+            sample.data, np.clip(expected, -32768, 32767), atol=0.5
+        )
+        # The in-memory signal is used after the first decoding
+        sample.data
+    assert len(AudioCache(tmp_path).entries()) == 1
@@ -0,0 +1,109 @@
+import numpy as np
+import pytest
+
+import bob.io.base
+
+from bob.bio.spear.cache import FeatureCache
+from bob.bio.spear.codec import get_codec, load
+from bob.bio.spear.extractor import Cepstral
+from bob.pipelines import Sample, wrap
+
+
+def _features(seed=0):
+    rng = np.random.default_rng(seed)
+    return rng.standard_normal((200, 60))
+
+
+@pytest.mark.parametrize("name, tolerance", [("float16", 2e-3), ("int8", 4e-2)])
+def test_feature_codecs(name, tolerance, tmp_path):
+    features = _features()
+    codec = get_codec(name)
+    decoded = codec.decode(codec.encode(features))
+    assert decoded.dtype == features.dtype
+    np.testing.assert_allclose(decoded, features, atol=tolerance)
+    error = codec.error(features)
+    assert 0 < error.rms <= error.max_abs <= tolerance
+
+    path = tmp_path / "features.h5"
+    codec.save(features, path)
+    np.testing.assert_array_equal(load(path), decoded)
+
+    codec.save(features.astype("float32"), path)
+    assert load(path).dtype == np.float32
+
+
+def test_int8_constant_dimension():
+    features = _features()
+    features[:, 3] = 5.0
+    codec = get_codec("int8")
+    decoded = codec.decode(codec.encode(features))
+    np.testing.assert_array_equal(decoded[:, 3], 5.0)
+
+
+def test_int8_1d():
+    """The values of a 1D array are quantized as a single dimension."""
+    scores = _features()[:, 0]
+    codec = get_codec("int8")
+    encoded = codec.encode(scores)
+    assert encoded["array"].shape == scores.shape
+    assert encoded["scale"].shape == encoded["offset"].shape == (1,)
+    decoded = codec.decode(encoded)
+    assert decoded.shape == scores.shape
+    np.testing.assert_allclose(decoded, scores, atol=4e-2)
+    assert len(np.unique(encoded["array"])) > 100
+
+
+def test_bits_codec(tmp_path):
+    labels = (np.random.default_rng(0).uniform(size=123) > 0.5).astype("int16")
+    codec = get_codec("bits")
+    path = tmp_path / "labels.h5"
+    codec.save(labels, path)
+    loaded = load(path)
+    np.testing.assert_array_equal(loaded, labels)
+    assert loaded.dtype == labels.dtype
+
+    codec.save(None, path)
+    assert load(path) is None
+    with pytest.raises(ValueError):
+        codec.encode([0, 1, 2])
+    with pytest.raises(ValueError):
+        get_codec("mp3")
+
+
+def test_load_without_codec(tmp_path):
+    features = _features()
+    bob.io.base.save(features, tmp_path / "features.h5")
+    np.testing.assert_array_equal(load(tmp_path / "features.h5"), features)
+
+
+def test_checkpoint_with_codec(tmp_path):
+    rng = np.random.default_rng(0)
+    samples = [
+        Sample(
+            rng.standard_normal(8000) * 1000,
+            key=f"sample{i}",
+            rate=8000,
+            annotations=None,
+        )
+        for i in range(2)
+    ]
+    reference = wrap(["sample"], Cepstral()).transform(samples)
+    extractor = wrap(
+        ["sample", "checkpoint"],
+        Cepstral(storage_codec="float16"),
+        features_dir=tmp_path,
+    )
+    extractor.transform(samples)
+    # Loaded from the checkpoints
+    for sample, expected in zip(extractor.transform(samples), reference):
+        np.testing.assert_allclose(sample.data, expected.data, atol=2e-2)
+    assert len(list(tmp_path.glob("**/*.h5"))) == 2
+
+
+def test_feature_cache_codec(tmp_path):
+    features = _features()
+    cache = FeatureCache(tmp_path, codec="int8")
+    cache.put("0a", features)
+    assert cache.path("0a").suffix == ".npz"
+    np.testing.assert_allclose(cache.get("0a"), features, atol=4e-2)
+    assert cache.size() < features.nbytes / 6
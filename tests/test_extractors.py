@@ -18,6 +18,9 @@
 # along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
+from pathlib import Path
+
+import h5py
 import numpy
 
 import bob.bio.base
@@ -30,6 +33,8 @@ import bob.bio.spear
 
 regenerate_refs = False
 
+DATA_PATH = Path(__file__).parent / "data"
+
 
 def _compare(
     data,
@@ -87,3 +92,103 @@ def test_mfcc():
 #         extractor.write_feature,
 #         extractor.read_feature,
 #     )
+
+
+def test_cepstral_options():
+    with h5py.File(DATA_PATH / "sample.hdf5", "r") as f:
+        wav, rate = f["data"][()], f["rate"][()]
+    annotations = bob.bio.spear.annotator.Energy_Thr().transform_one(wav, rate)
+
+    features = bob.bio.spear.extractor.Cepstral().transform_one(
+        wav, rate, annotations
+    )
+    assert features.dtype == numpy.float64
+    assert features.shape[1] == 60
+
+    features_32 = bob.bio.spear.extractor.Cepstral(
+        dtype="float32"
+    ).transform_one(wav, rate, annotations)
+    assert features_32.dtype == numpy.float32
+    numpy.testing.assert_allclose(features_32, features, rtol=1e-4, atol=1e-3)
+
+    features_torch = bob.bio.spear.extractor.Cepstral(
+        backend="torch"
+    ).transform_one(wav, rate, annotations)
+    numpy.testing.assert_allclose(features_torch, features, atol=1e-5)
+
+
+def test_cepstral_batch_transform():
+    with h5py.File(DATA_PATH / "sample.hdf5", "r") as f:
+        wav, rate = f["data"][()], f["rate"][()]
+    wavs = [wav, wav[:8000], wav[::2]]
+    rates = [rate, rate, rate // 2]
+    annotator = bob.bio.spear.annotator.Energy_Thr()
+    annotations = [annotator.transform_one(w, r) for w, r in zip(wavs, rates)]
+
+    extractor = bob.bio.spear.extractor.Cepstral()
+    results = extractor.transform(wavs, rates, annotations)
+    assert len(results) == len(wavs)
+    for result, w, r, a in zip(results, wavs, rates, annotations):
+        numpy.testing.assert_allclose(result, extractor.transform_one(w, r, a))
+
+    # Batches smaller than one utterance give the same features
+    for max_batch_frames in (100, None):
+        capped = bob.bio.spear.extractor.Cepstral(
+            max_batch_frames=max_batch_frames
+        ).transform(wavs, rates, annotations)
+        for result, expected in zip(capped, results):
+            numpy.testing.assert_allclose(result, expected)
+
+
+def test_cepstral_native_rate():
+    """Features of 8 kHz audio match those of the audio resampled to 16 kHz."""
+    ap = bob.bio.spear.audio_processing
+    wav, _ = ap.read(DATA_PATH / "sample.wav", force_sample_rate=8000)
+    upsampled = ap.resample(wav, 8000, 16000)
+
+    extractor = bob.bio.spear.extractor.Cepstral(reference_rate=16000)
+    assert extractor.min_sample_rate == 8000
+    reference = extractor.transform_one(upsampled, 16000, None)
+    native = extractor.transform_one(wav, 8000, None)
+    assert native.shape == reference.shape
+    error = numpy.abs(native - reference).mean()
+    assert error < 0.03
+
+    # The adapted pre-emphasis halves the difference
+    not_adapted = bob.bio.spear.extractor.Cepstral().transform_one(
+        wav, 8000, None
+    )
+    assert error < numpy.abs(not_adapted - reference).mean() / 2
+
+
+def test_speechbrain_embeddings_path_to_audio():
+    """The signals of PathToAudio can be modified in place by torch models."""
+    import warnings
+
+    import torch
+
+    from bob.bio.spear.extractor.speechbrain_embeddings import (
+        SpeechbrainEmbeddings,
+    )
+    from bob.bio.spear.transformer import PathToAudio
+    from bob.pipelines import Sample
+
+    class Model:
+        # Normalizes the signal in place, as the speechbrain models do
+        def encode_batch(self, wavs, normalize=False):
+            wavs -= wavs.mean()
+            return wavs[None, None, :4]
+
+    # Without downloading the pretrained model
+    extractor = SpeechbrainEmbeddings.__new__(SpeechbrainEmbeddings)
+    extractor.model = Model()
+    sample = PathToAudio(forced_sr=16000).transform(
+        [Sample(data=DATA_PATH / "sample.wav")]
+    )[0]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", UserWarning)
+        embeddings = extractor.transform([sample.data, sample.data])
+    assert embeddings.shape == (2, 1, 4)
+    # The signal read by the next transformers is not modified
+    numpy.testing.assert_array_equal(embeddings[0], embeddings[1])
+    assert torch.from_numpy(sample.data).mean() != 0
@@ -0,0 +1,104 @@
+import pickle
+
+import numpy as np
+import pytest
+
+from bob.bio.spear.feature_store import FeatureStore, FeatureStoreWrapper
+from bob.pipelines import Sample, wrap
+
+from .test_cache import CountingTransformer
+
+
+def _features(n_utterances=5, dim=3, seed=0):
+    rng = np.random.default_rng(seed)
+    return {
+        f"utt{i}": rng.standard_normal((int(rng.integers(1, 50)), dim))
+        for i in range(n_utterances)
+    }
+
+
+def test_feature_store(tmp_path):
+    features = _features()
+    store = FeatureStore(tmp_path, shard_size=1000)
+    for key, value in features.items():
+        store.append(key, value)
+    store.close()
+    assert len(list(tmp_path.glob("*.bin"))) > 1
+
+    # Another reader sees the flushed utterances
+    reader = pickle.loads(pickle.dumps(FeatureStore(tmp_path)))
+    assert set(reader.keys()) == set(features)
+    assert reader.dim == 3 and reader.dtype == np.float64
+    for key, value in features.items():
+        view = reader[key]
+        assert isinstance(view, np.memmap)
+        np.testing.assert_array_equal(view, value)
+
+    with pytest.raises(ValueError):
+        store.append("bad", np.zeros((2, 4)))
+    with pytest.raises(ValueError):
+        store.append("bad", np.zeros((2, 3), dtype="float32"))
+
+
+def test_feature_store_threads(tmp_path):
+    """Several threads can append to the same store."""
+    from concurrent.futures import ThreadPoolExecutor
+
+    features = _features(n_utterances=200)
+    store = FeatureStore(tmp_path, shard_size=10_000)
+    with ThreadPoolExecutor(4) as executor:
+        list(executor.map(lambda item: store.append(*item), features.items()))
+    store.close()
+
+    reader = FeatureStore(tmp_path)
+    assert set(reader.keys()) == set(features)
+    for key, value in features.items():
+        np.testing.assert_array_equal(reader[key], value)
+
+
+def test_feature_store_frames(tmp_path):
+    features = _features(n_utterances=8)
+    store = FeatureStore(tmp_path, shard_size=2000)
+    for key, value in features.items():
+        store.append(key, value)
+    store.flush()
+
+    all_frames = np.vstack(list(features.values()))
+    chunks = list(store.frames(chunk_frames=16))
+    assert max(len(chunk) for chunk in chunks) <= 16
+    np.testing.assert_array_equal(np.vstack(chunks), all_frames)
+    assert store.n_frames() == len(all_frames)
+
+    keys = ["utt5", "utt1", "utt2"]
+    np.testing.assert_array_equal(
+        np.vstack(list(store.frames(keys, chunk_frames=7))),
+        np.vstack([features[k] for k in sorted(keys)]),
+    )
+    array = store.to_dask_array(keys, chunk_frames=7)
+    assert array.shape == (store.n_frames(keys), 3)
+    np.testing.assert_array_equal(
+        array.compute(), np.vstack([features[k] for k in sorted(keys)])
+    )
+
+
+def test_feature_store_wrapper(tmp_path):
+    samples = [
+        Sample(np.arange(12.0).reshape(4, 3) + i, key=f"utt{i}")
+        for i in range(3)
+    ]
+    extractor = wrap(["sample"], CountingTransformer())
+    stored = FeatureStoreWrapper(extractor, tmp_path)
+
+    stored.transform(samples[:2])
+    assert extractor.estimator.count == 2
+    results = stored.transform(samples)
+    assert extractor.estimator.count == 3
+    for sample, result in zip(samples, results):
+        np.testing.assert_array_equal(result.data, sample.data * 2)
+        assert result.key == sample.key
+    assert isinstance(results[0].data, np.memmap)
+
+    # Another process of the same pipeline reuses the stored features
+    stored = pickle.loads(pickle.dumps(stored))
+    stored.transform(samples)
+    assert stored.estimator.estimator.count == 3
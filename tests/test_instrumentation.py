@@ -0,0 +1,77 @@
+import csv
+import json
+
+from pathlib import Path
+
+import pytest
+
+from bob.bio.spear import instrumentation
+from bob.bio.spear.annotator import Energy_Thr
+from bob.bio.spear.audio_processing import read
+from bob.bio.spear.extractor import Cepstral
+from bob.bio.spear.transformer import PathToAudio
+from bob.bio.spear.transformer.path_to_audio import clear_decoded_audio
+from bob.pipelines import Sample
+
+DATA_PATH = Path(__file__).parent / "data"
+
+
+@pytest.fixture
+def enabled():
+    instrumentation.reset()
+    instrumentation.enable()
+    clear_decoded_audio()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+def test_disabled():
+    instrumentation.reset()
+    assert not instrumentation.is_enabled()
+    data, rate = read(DATA_PATH / "sample.wav")
+    Energy_Thr().transform_one(data, rate)
+    assert instrumentation.summary()["stages"] == {}
+
+
+def test_stages(enabled, tmp_path):
+    records = []
+    instrumentation.add_callback(records.append)
+    try:
+        samples = PathToAudio().transform(
+            [Sample(data=DATA_PATH / "sample.wav")]
+        )
+        data, rate = samples[0].data, samples[0].rate
+        labels = Energy_Thr().transform_one(data, rate)
+        features = Cepstral().transform_one(data, rate, labels)
+    finally:
+        instrumentation.remove_callback(records.append)
+
+    assert [r.stage for r in records] == [
+        "PathToAudio",
+        "Energy_Thr",
+        "Cepstral",
+    ]
+    stages = instrumentation.summary()["stages"]
+    assert set(stages) == {"PathToAudio", "Energy_Thr", "Cepstral"}
+    duration = len(data) / rate
+    for totals in stages.values():
+        assert totals["n_samples"] == 1
+        assert totals["audio_duration"] == pytest.approx(duration)
+        assert totals["rtf"] == pytest.approx(totals["wall_time"] / duration)
+
+    vad = stages["Energy_Thr"]
+    assert vad["frames_in"] == len(labels)
+    assert vad["speech_ratio"] == pytest.approx(sum(labels) / len(labels))
+    cepstral = stages["Cepstral"]
+    assert cepstral["frames_in"] == len(labels)
+    assert cepstral["frames_out"] == len(features) == sum(labels)
+
+    instrumentation.write_json(tmp_path / "stages.json")
+    with open(tmp_path / "stages.json") as f:
+        assert json.load(f)["stages"].keys() == stages.keys()
+    instrumentation.write_csv(tmp_path / "stages.csv")
+    with open(tmp_path / "stages.csv", newline="") as f:
+        rows = list(csv.DictReader(f))
+    assert [row["stage"] for row in rows] == list(stages)
+    assert rows[0]["worker"] == instrumentation.worker_id()
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from bob.bio.spear import jit, utils
+from bob.bio.spear.annotator import Mod_4Hz
+from bob.bio.spear.audio_processing import delta_features
+
+
+def test_smoothing_kernel():
+    rng = np.random.default_rng(0)
+    for _ in range(50):
+        labels = (rng.uniform(size=rng.integers(1, 300)) < 0.6).astype("int16")
+        window = int(rng.integers(1, 20))
+        with jit.use_backend("numpy"):
+            expected = utils.smoothing(labels.copy(), window)
+        np.testing.assert_array_equal(jit.smoothing(labels, window), expected)
+
+
+def test_averaging_kernel():
+    rng = np.random.default_rng(1)
+    annotator = Mod_4Hz()
+    for n in (1, 50, 100, 150, 250, 1000):
+        values = rng.standard_normal(n)
+        with jit.use_backend("numpy"):
+            expected = annotator.averaging(values)
+        np.testing.assert_array_equal(jit.averaging(values), expected)
+
+
+def test_delta_kernel():
+    rng = np.random.default_rng(2)
+    features = rng.standard_normal((120, 5)).astype("float32")
+    offsets = np.array([0, 50, 51, 120])
+    with jit.use_backend("numpy"):
+        expected = delta_features(features, 2, offsets)
+    lengths = np.diff(offsets)
+    result = jit.delta_features(
+        features[None],
+        2,
+        np.repeat(offsets[:-1], lengths),
+        np.repeat(offsets[1:] - 1, lengths),
+        np.empty_like(features)[None],
+    )
+    np.testing.assert_array_equal(result[0], expected)
+
+
+def test_backend_selection():
+    with jit.use_backend("numpy", ["smoothing"]):
+        assert jit.get_backend("smoothing") == "numpy"
+    assert jit.get_backend("smoothing") == (
+        "numba" if jit.available() else "numpy"
+    )
+
+    with pytest.raises(ValueError):
+        jit.set_backend("cython")
+    with pytest.raises(ValueError):
+        jit.get_backend("unknown")
+    if not jit.available():
+        with pytest.raises(ValueError):
+            jit.set_backend("numba")
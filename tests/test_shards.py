@@ -0,0 +1,120 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+import soundfile
+
+from click.testing import CliRunner
+
+from bob.bio.spear.database.shards import (
+    PackedAudioLoader,
+    pack_audio,
+    pack_audio_command,
+)
+from bob.bio.spear.database.utils import create_sample_loader
+from bob.bio.spear.transformer import PathToAudio
+from bob.pipelines import Sample
+
+DATA_PATH = Path(__file__).parent / "data"
+
+
+def _samples(tmp_path):
+    data = np.arange(-4000, 4000, 3, dtype=np.int16)
+    soundfile.write(tmp_path / "short.flac", data, 8000)
+    return [
+        Sample(str(DATA_PATH / "sample"), key="sample", path="sample"),
+        Sample(str(tmp_path / "short"), key="short", path="short"),
+    ]
+
+
+def _read_files(samples, **kwargs):
+    return PathToAudio(**kwargs).transform(
+        [
+            Sample(
+                f"{s.data}.wav" if s.key == "sample" else f"{s.data}.flac",
+                parent=s,
+            )
+            for s in samples
+        ]
+    )
+
+
+def test_pack_audio(tmp_path):
+    samples = _samples(tmp_path)
+    audio = _read_files(samples)
+    assert pack_audio(audio, tmp_path / "shards", shard_size=1000) == 2
+    # Already packed samples are skipped
+    assert pack_audio(audio, tmp_path / "shards") == 0
+
+    loaded = PackedAudioLoader(tmp_path / "shards").transform(samples)
+    for sample, expected in zip(loaded, audio):
+        assert sample.rate == expected.rate
+        assert sample.data.dtype == np.float32
+        np.testing.assert_array_equal(sample.data, expected.data)
+        assert sample.key == expected.key
+
+    loaded = PackedAudioLoader(
+        tmp_path / "shards", forced_sr=16000, min_native_sr=16000
+    ).transform(samples)
+    resampled = _read_files(samples, forced_sr=16000)
+    for sample, expected in zip(loaded, resampled):
+        assert sample.rate == 16000
+        np.testing.assert_allclose(sample.data, expected.data, atol=1e-2)
+
+    with pytest.raises(ValueError):
+        PackedAudioLoader(tmp_path / "shards").transform(
+            [Sample(None, key="missing")]
+        )
+
+
+def test_sample_loader_from_shards(tmp_path):
+    samples = _samples(tmp_path)
+    pack_audio(_read_files(samples), tmp_path / "shards")
+    loader = create_sample_loader(shards_path=str(tmp_path / "shards"))
+    loaded = loader.transform([Sample(None, key="short", path="short")])
+    assert loaded[0].rate == 8000
+    assert len(loaded[0].data) == len(np.arange(-4000, 4000, 3))
+
+    # Cropped like the files
+    loader = create_sample_loader(
+        shards_path=str(tmp_path / "shards"), max_duration=0.1
+    )
+    loaded = loader.transform([Sample(None, key="short", path="short")])
+    expected = _read_files(samples[1:], max_duration=0.1)
+    np.testing.assert_array_equal(loaded[0].data, expected[0].data)
+
+
+def test_pack_audio_command(tmp_path):
+    _samples(tmp_path)
+    config = tmp_path / "database.py"
+    config.write_text(
+        f"""
+from bob.bio.spear.database.utils import create_sample_loader
+from bob.pipelines import Sample
+
+
+class Database:
+    transformer = create_sample_loader(
+        data_path="{tmp_path}", data_ext=".flac", force_sample_rate=16000
+    )
+
+    def all_samples(self, groups=None):
+        return self.transformer.transform(
+            [Sample(None, key="short", path="short")]
+        )
+
+
+database = Database()
+"""
+    )
+    runner = CliRunner()
+    result = runner.invoke(
+        pack_audio_command, [str(config), str(tmp_path / "shards")]
+    )
+    assert result.exit_code == 0, result.output
+    assert "Packed 1 samples" in result.output
+    loaded = PackedAudioLoader(tmp_path / "shards").transform(
+        [Sample(None, key="short")]
+    )
+    # Packed at the native rate
+    assert loaded[0].rate == 8000
@@ -5,6 +5,7 @@
 from pathlib import Path
 
 import numpy as np
+import soundfile
 
 from sklearn.pipeline import make_pipeline
 
@@ -50,3 +51,121 @@ def test_resample():
     )
     results = pipeline.transform([sample])[0]
     assert results.data.shape == (audio_n_samples // 2,), results.data.shape
+
+    # Same rate utterances resampled in batches
+    pipeline = make_pipeline(
+        PathToAudio(),
+        wrap(
+            ["sample"],
+            Resample(audio_sample_rate // 2, max_batch_samples=2**20),
+        ),
+    )
+    batched = pipeline.transform([sample, sample])
+    for result in batched:
+        np.testing.assert_allclose(result.data, results.data, atol=1e-3)
+
+
+def test_path_to_audio_rate_from_header(monkeypatch, tmp_path):
+    """The rate is read from the header of the file, without decoding it."""
+    from bob.bio.spear.transformer import path_to_audio
+
+    audio_path = tmp_path / "sample.wav"
+    audio_path.write_bytes((DATA_PATH / "sample.wav").read_bytes())
+
+    def no_decoding(*args, **kwargs):
+        raise AssertionError("The audio was decoded.")
+
+    monkeypatch.setattr(path_to_audio, "read_audio", no_decoding)
+    sample = PathToAudio().transform([Sample(data=str(audio_path))])[0]
+    assert sample.rate == 16000
+    header = path_to_audio.get_audio_header(str(audio_path))
+    assert header == (16000, 77760, 1)
+
+    # A modified file is probed again
+    data = np.zeros(800, dtype=np.int16)
+    soundfile.write(audio_path, data, 8000)
+    assert sample.rate == 8000
+
+
+def test_path_to_audio_single_decode(monkeypatch):
+    """The data and rate of a sample are read with one decoding of the file."""
+    from bob.bio.spear.transformer import path_to_audio
+
+    path_to_audio.clear_decoded_audio()
+    decoded = []
+
+    def counting_read(*args, **kwargs):
+        decoded.append(args)
+        return read_audio(*args, **kwargs)
+
+    read_audio = path_to_audio.read_audio
+    monkeypatch.setattr(path_to_audio, "read_audio", counting_read)
+    sample = PathToAudio(forced_sr=8000).transform(
+        [Sample(data=DATA_PATH / "sample.wav")]
+    )[0]
+    assert sample.rate == 8000
+    # e.g. read by an annotator, then by an extractor
+    data = sample.data
+    assert sample.rate == 8000
+    # Each reader gets its own copy, which it can modify
+    assert sample.data is not data
+    assert data.shape == (77760 // 2,)
+    assert data.flags.writeable
+    expected = data.copy()
+    data[:] = 0
+    np.testing.assert_array_equal(sample.data, expected)
+    assert len(decoded) == 1
+
+    # The signal is decoded again once released
+    path_to_audio.AudioLoader(DATA_PATH / "sample.wav", None, 8000).release()
+    np.testing.assert_array_equal(sample.data, expected)
+    assert len(decoded) == 2
+
+    # Unless the signals are not kept
+    path_to_audio.set_decoded_audio_size(0)
+    try:
+        sample.data, sample.data
+        assert len(decoded) == 4
+    finally:
+        path_to_audio.set_decoded_audio_size(2**29)
+
+
+def test_path_to_audio_segments():
+    """Only the segment given by the start and end of a sample is read."""
+    full = PathToAudio().transform([Sample(data=DATA_PATH / "sample.wav")])
+    full = full[0].data
+    samples = [
+        Sample(data=DATA_PATH / "sample.wav", start="1.5", end="2"),
+        Sample(data=DATA_PATH / "sample.wav", start="", end="0.25"),
+        Sample(data=DATA_PATH / "sample.wav", start=4),
+    ]
+    results = PathToAudio().transform(samples)
+    np.testing.assert_array_equal(results[0].data, full[24000:32000])
+    np.testing.assert_array_equal(results[1].data, full[:4000])
+    np.testing.assert_array_equal(results[2].data, full[64000:])
+    assert results[0].rate == 16000
+
+    # Long files or segments are cropped
+    results = PathToAudio(max_duration=1).transform(samples)
+    assert [len(r.data) for r in results] == [8000, 4000, 13760]
+    results = PathToAudio(max_duration=800, segment_unit="samples").transform(
+        [Sample(data=DATA_PATH / "sample.wav", start=100)]
+    )
+    np.testing.assert_array_equal(results[0].data, full[100:900])
+
+
+def test_path_to_audio_native_rate(tmp_path):
+    """The files of a high enough rate are not resampled."""
+    data = (np.random.default_rng(0).uniform(-1, 1, 4000) * 3000).astype(
+        np.int16
+    )
+    for rate in (8000, 6000):
+        soundfile.write(tmp_path / f"{rate}.wav", data, rate)
+    samples = [Sample(data=tmp_path / f"{rate}.wav") for rate in (8000, 6000)]
+
+    transformer = PathToAudio(forced_sr=16000, min_native_sr=8000)
+    native, resampled = transformer.transform(samples)
+    assert native.rate == 8000
+    np.testing.assert_array_equal(native.data, data)
+    assert resampled.rate == 16000
+    assert resampled.data.shape == (4000 * 16000 // 6000 + 1,)